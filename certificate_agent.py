@@ -1,20 +1,30 @@
 from argparse import ArgumentParser, RawTextHelpFormatter
+import collections
 import logging.config
 import json
+import multiprocessing
+import multiprocessing.util
 import sys
 import os
+import signal
 import time
+import traceback
 import settings
-from openedx_certificates.queue_xqueue import XQueuePullManager
-from gen_cert import CertificateGen
+from openedx_certificates.cache import LRUCache
+from openedx_certificates.poll_scheduler import PollScheduler
+from openedx_certificates.queue_xqueue import XQueuePullManager, XQueueReplySender
+from gen_cert import CertificateGen, FONT_SELECTIONS, get_storage
 from gen_pok_cert import PokCertificateGen
 
 logging.config.dictConfig(settings.LOGGING)
 log = logging.getLogger('certificates: ' + __name__)
 
+# CertificateGen instances owned by this process, keyed by everything
+# their constructor is given. Each pool worker gets its own copy.
+CERT_GENERATORS = LRUCache(settings.CERT_GENERATOR_CACHE_SIZE, settings.CERT_GENERATOR_CACHE_BYTES)
 
-# how long to wait in seconds after an xqueue poll
-SLEEP_TIME = 5
+# Whether this process is a pool worker, set by init_worker
+IN_WORKER = False
 
 
 def parse_args(args=sys.argv[1:]):
@@ -36,6 +46,16 @@ def parse_args(args=sys.argv[1:]):
     post a result back to the LMS indicating there
     was a problem.
 
+    Results are posted from a background thread;
+    results that can't be posted by the time the
+    agent stops are journaled and posted when it
+    starts again.
+
+    With --workers N, requests are pulled into a
+    bounded queue and generated by N processes;
+    results are still posted back from the main
+    process.
+
     """, formatter_class=RawTextHelpFormatter)
 
     parser.add_argument(
@@ -48,149 +68,335 @@ def parse_args(args=sys.argv[1:]):
         default=settings.CERT_AWS_KEY,
         help='AWS KEY for write access to the S3 bucket',
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=settings.CERT_WORKERS,
+        help='Number of certificate generation processes (default: generate in the main process)',
+    )
     return parser.parse_args()
 
 
-def main():
+def parse_submission(certdata):
+    """
+    Unpack an xqueue submission into the fields needed to process it
 
-    manager = XQueuePullManager(settings.QUEUE_URL, settings.QUEUE_NAME,
-                                settings.QUEUE_AUTH_USER,
-                                settings.QUEUE_AUTH_PASS,
-                                settings.QUEUE_USER, settings.QUEUE_PASS)
-    last_course = None  # The last course_id we generated for
-    cert = None  # A CertificateGen instance for a particular course
+    Raises TypeError, ValueError or KeyError if the submission is malformed.
+    """
+    xqueue_body = json.loads(certdata['xqueue_body'])
+    xqueue_header = json.loads(certdata['xqueue_header'])
+    submission = {
+        'xqueue_header': xqueue_header,
+        'action': xqueue_body['action'],
+        'username': xqueue_body['username'],
+        'course_id': xqueue_body['course_id'],
+        'course_name': xqueue_body['course_name'],
+        'name': xqueue_body['name'],
+        'template_pdf': xqueue_body.get('template_pdf', None),
+        'grade': xqueue_body.get('grade', None),
+        'issued_date': xqueue_body.get('issued_date', None),
+        'designation': xqueue_body.get('designation', None),
+    }
+    if submission['action'] in ['remove', 'regen']:
+        submission['delete_download_uuid'] = xqueue_body['delete_download_uuid']
+        submission['delete_verify_uuid'] = xqueue_body['delete_verify_uuid']
+    return submission
 
-    while True:
 
-        if manager.get_length() == 0:
-            log.debug("{0} has no jobs".format(str(manager)))
-            time.sleep(SLEEP_TIME)
-            continue
+def get_generator(submission):
+    """Return the CertificateGen for the submission's course, creating it if needed"""
+    key = (
+        submission['course_id'],
+        submission['template_pdf'],
+        submission['issued_date'],
+        submission['course_name'],
+    )
+    cert = CERT_GENERATORS.get(key)
+    if cert is None:
+        cert = PokCertificateGen(
+            submission['course_id'],
+            submission['template_pdf'],
+            aws_id=args.aws_id,
+            aws_key=args.aws_key,
+            long_course=submission['course_name'].encode('utf-8'),
+            issued_date=submission['issued_date'],
+        )
+        CERT_GENERATORS.put(key, cert, cert.approximate_size())
+        log.info("Created certificate generator for {0}, generator cache: {1}, font selections: {2}".format(
+            submission['course_id'], CERT_GENERATORS.stats(), FONT_SELECTIONS.stats()))
+    return cert
+
+
+def process_submission(submission, respond):
+    """
+    Generate the certificate for a parsed submission
+
+    respond is called with the xqueue reply that should be posted back to
+    the LMS, if any. Nothing is posted for 'remove' actions or for
+    submissions that can't be handled at all.
+    """
+    username = submission['username']
+    course_id = submission['course_id']
+    name = submission['name']
+    grade = submission['grade']
+    action = submission['action']
+
+    try:
+        cert = get_generator(submission)
+        if action in ['remove', 'regen']:
+            cert.delete_certificate(submission['delete_download_uuid'],
+                                    submission['delete_verify_uuid'])
+            if IN_WORKER:
+                # Publishing files only cancels the deletes queued in the same
+                # process, and another worker may publish this certificate
+                # again (under the same paths, with CERT_DETERMINISTIC_IDS)
+                # before a queued delete is made
+                flush_deletes()
+            if action in ['remove']:
+                return
+
+    except (TypeError, ValueError, KeyError, IOError) as e:
+        log.critical('Unable to parse queue submission ({0}) : {1}'.format(e, submission))
+        if settings.DEBUG:
+            raise
         else:
-            log.debug('queue length: {0}'.format(manager.get_length()))
-
-        xqueue_body = {}
-        xqueue_header = ''
-        action = ''
-        username = ''
-        grade = None
-        course_id = ''
-        course_name = ''
-        template_pdf = None
-        name = ''
-
-        certdata = manager.get_submission()
-        log.debug('xqueue response: {0}'.format(certdata))
-        try:
-            xqueue_body = json.loads(certdata['xqueue_body'])
-            xqueue_header = json.loads(certdata['xqueue_header'])
-            action = xqueue_body['action']
-            username = xqueue_body['username']
-            course_id = xqueue_body['course_id']
-            course_name = xqueue_body['course_name']
-            name = xqueue_body['name']
-            template_pdf = xqueue_body.get('template_pdf', None)
-            grade = xqueue_body.get('grade', None)
-            issued_date = xqueue_body.get('issued_date', None)
-            designation = xqueue_body.get('designation', None)
-            if last_course != course_id:
-                cert = PokCertificateGen(
-                    course_id,
-                    template_pdf,
-                    aws_id=args.aws_id,
-                    aws_key=args.aws_key,
-                    long_course=course_name.encode('utf-8'),
-                    issued_date=issued_date,
-                )
-                last_course = course_id
-            if action in ['remove', 'regen']:
-                cert.delete_certificate(xqueue_body['delete_download_uuid'],
-                                        xqueue_body['delete_verify_uuid'])
-                if action in ['remove']:
-                    continue
-
-        except (TypeError, ValueError, KeyError, IOError) as e:
-            log.critical('Unable to parse queue submission ({0}) : {1}'.format(e, certdata))
-            if settings.DEBUG:
-                raise
-            else:
-                continue
+            return
 
-        try:
-            log.info(
-                "Generating certificate for {username} ({name}), "
-                "in {course_id}, with grade {grade}".format(
-                    username=username.encode('utf-8'),
-                    name=name.encode('utf-8'),
-                    course_id=course_id.encode('utf-8'),
-                    grade=grade,
-                )
-            )
-            (download_uuid,
-             verify_uuid,
-             download_url) = cert.create_and_upload(name.encode('utf-8'), grade=grade, designation=designation)
-
-        except Exception as e:
-            # global exception handler, if anything goes wrong
-            # during the generation of the pdf we will let the LMS
-            # know so it can be re-submitted, the LMS will update
-            # the state to error
-
-            # get as much info as possible about the exception
-            # for the post back to the LMS
-
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-            error_reason = (
-                "({username} {course_id}) "
-                "{exception_type}: {exception}: "
-                "{file_name}:{line_number}".format(
-                    username=username,
-                    course_id=course_id,
-                    exception_type=exc_type,
-                    exception=e,
-                    file_name=fname,
-                    line_number=exc_tb.tb_lineno,
-                )
+    try:
+        log.info(
+            "Generating certificate for {username} ({name}), "
+            "in {course_id}, with grade {grade}".format(
+                username=username.encode('utf-8'),
+                name=name.encode('utf-8'),
+                course_id=course_id.encode('utf-8'),
+                grade=grade,
             )
+        )
+        (download_uuid,
+         verify_uuid,
+         download_url) = cert.create_and_upload(name.encode('utf-8'), grade=grade,
+                                                designation=submission['designation'],
+                                                username=username)
+
+    except Exception as e:
+        # global exception handler, if anything goes wrong
+        # during the generation of the pdf we will let the LMS
+        # know so it can be re-submitted, the LMS will update
+        # the state to error
 
-            log.critical(
-                'An error occurred during certificate generation {reason}'.format(
-                    reason=error_reason,
-                )
+        # get as much info as possible about the exception
+        # for the post back to the LMS
+
+        exc_type, exc_obj, exc_tb = sys.exc_info()
+        fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+        error_reason = (
+            "({username} {course_id}) "
+            "{exception_type}: {exception}: "
+            "{file_name}:{line_number}".format(
+                username=username,
+                course_id=course_id,
+                exception_type=exc_type,
+                exception=e,
+                file_name=fname,
+                line_number=exc_tb.tb_lineno,
             )
+        )
 
-            xqueue_reply = {
-                'xqueue_header': json.dumps(xqueue_header),
-                'xqueue_body': json.dumps({
-                    'error': 'There was an error processing the certificate request: {error}'.format(
-                        error=e,
-                    ),
-                    'username': username,
-                    'course_id': course_id,
-                    'error_reason': error_reason,
-                }),
-            }
-            manager.respond(xqueue_reply)
-            if settings.DEBUG:
-                raise
-            else:
-                continue
+        log.critical(
+            'An error occurred during certificate generation {reason}'.format(
+                reason=error_reason,
+            )
+        )
 
-        # post result back to the LMS
         xqueue_reply = {
-            'xqueue_header': json.dumps(xqueue_header),
+            'xqueue_header': json.dumps(submission['xqueue_header']),
             'xqueue_body': json.dumps({
-                'action': action,
-                'download_uuid': download_uuid,
-                'verify_uuid': verify_uuid,
+                'error': 'There was an error processing the certificate request: {error}'.format(
+                    error=e,
+                ),
                 'username': username,
                 'course_id': course_id,
-                'url': download_url,
+                'error_reason': error_reason,
             }),
         }
-        log.info("Posting result to the LMS: {0}".format(xqueue_reply))
-        manager.respond(xqueue_reply)
+        respond(xqueue_reply)
+        if settings.DEBUG:
+            raise
+        else:
+            return
+
+    # post result back to the LMS
+    xqueue_reply = {
+        'xqueue_header': json.dumps(submission['xqueue_header']),
+        'xqueue_body': json.dumps({
+            'action': action,
+            'download_uuid': download_uuid,
+            'verify_uuid': verify_uuid,
+            'username': username,
+            'course_id': course_id,
+            'url': download_url,
+        }),
+    }
+    log.info("Posting result to the LMS: {0}".format(xqueue_reply))
+    respond(xqueue_reply)
+
+
+def flush_deletes():
+    """Make the deletes of removed certificates this process has queued"""
+    get_storage().flush_deletes()
+
+
+def init_worker():
+    """
+    Set up a pool worker process
+
+    Shutting down is left to the main process, which lets the workers
+    finish their submissions and exit; as they exit they make the
+    deletes they still have queued.
+    """
+    global IN_WORKER
+    IN_WORKER = True
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    multiprocessing.util.Finalize(None, flush_deletes, exitpriority=10)
+
+
+def pool_process_submission(submission):
+    """
+    Run process_submission in a pool worker
+
+    Returns the replies to post and, if generation raised (which only
+    happens when settings.DEBUG is set), the formatted traceback.
+    """
+    replies = []
+    try:
+        process_submission(submission, replies.append)
+    except Exception:
+        return (replies, traceback.format_exc())
+    return (replies, None)
+
+
+def read_submission(certdata):
+    """Parse a pulled submission, returning None if it is unusable"""
+    log.debug('xqueue response: {0}'.format(certdata))
+    try:
+        return parse_submission(certdata)
+    except (TypeError, ValueError, KeyError) as e:
+        log.critical('Unable to parse queue submission ({0}) : {1}'.format(e, certdata))
+        if settings.DEBUG:
+            raise
+        return None
+
+
+def post_replies(respond, pending, block=False):
+    """
+    Post the replies of finished pool jobs, oldest first
+
+    If block is set, wait for at least the oldest job to finish.
+    """
+    while pending and (block or pending[0].ready()):
+        (replies, error) = pending.popleft().get()
+        for xqueue_reply in replies:
+            respond(xqueue_reply)
+        if error:
+            log.critical('Certificate worker failed: {0}'.format(error))
+            raise RuntimeError(error)
+        block = False
+
+
+def run_pool(scheduler, respond, pool, workers):
+    """
+    Keep up to two submissions per worker in flight in the process pool
+    of workers, posting the replies from this process as they complete.
+    """
+    pending = collections.deque()
+    max_pending = workers * 2
+
+    try:
+        while True:
+            post_replies(respond, pending, block=len(pending) >= max_pending)
+            if len(pending) >= max_pending:
+                continue
+
+            certdata = scheduler.get_submission()
+            if certdata is None:
+                if pending:
+                    pending[0].wait(scheduler.delay())
+                else:
+                    time.sleep(scheduler.delay())
+                continue
+
+            submission = read_submission(certdata)
+            if submission is not None:
+                pending.append(pool.apply_async(pool_process_submission, (submission,)))
+    finally:
+        # Not terminate(): the workers are let finish, so that they make
+        # their queued deletes, and the replies they make are posted
+        pool.close()
+        pool.join()
+        post_replies(respond, pending)
+
+
+def main():
+
+    manager = XQueuePullManager(settings.QUEUE_URL, settings.QUEUE_NAME,
+                                settings.QUEUE_AUTH_USER,
+                                settings.QUEUE_AUTH_PASS,
+                                settings.QUEUE_USER, settings.QUEUE_PASS,
+                                pool_size=settings.QUEUE_POOL_SIZE,
+                                keep_alive=settings.QUEUE_KEEP_ALIVE,
+                                connect_timeout=settings.QUEUE_CONNECT_TIMEOUT,
+                                read_timeout=settings.QUEUE_READ_TIMEOUT)
+    scheduler = PollScheduler(manager, settings.QUEUE_POLL_MIN_INTERVAL,
+                              settings.QUEUE_POLL_MAX_INTERVAL)
+    sender = XQueueReplySender(manager, settings.QUEUE_REPLY_JOURNAL,
+                               outbox_size=settings.QUEUE_REPLY_OUTBOX_SIZE,
+                               retries=settings.QUEUE_REPLY_RETRIES)
+
+    # Make sure a plain kill still journals the replies we haven't posted
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # Fork the workers before the sender thread starts, so that none of
+    # them inherits a lock (logging's, requests') the thread holds
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker)
+    try:
+        sender.replay()
+        sender.start()
+        run(scheduler, sender.send, pool)
+    finally:
+        if pool is not None:
+            # The workers ignore SIGTERM, so they must be let exit
+            pool.close()
+            pool.join()
+        # Make the deletes of removed certificates still queued in this process
+        flush_deletes()
+        sender.close()
+
+
+def run(scheduler, respond, pool=None):
+    """
+    Generate certificates for submissions as they come in, forever,
+    in pool's worker processes if there is a pool
+    """
+
+    if pool is not None:
+        # Keep a batch of submissions buffered so the workers never wait on xqueue
+        scheduler.prefetch = settings.QUEUE_PREFETCH or args.workers
+        scheduler.prefetch_timeout = settings.QUEUE_PREFETCH_TIMEOUT
+        run_pool(scheduler, respond, pool, args.workers)
+        return
+
+    while True:
+
+        certdata = scheduler.get_submission()
+        if certdata is None:
+            time.sleep(scheduler.delay())
+            continue
+
+        submission = read_submission(certdata)
+        if submission is not None:
+            process_submission(submission, respond)
 
 
 if __name__ == '__main__':
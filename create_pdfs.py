@@ -6,7 +6,10 @@ PDFs by default will be dropped in TMP_GEN_DIR for review
 """
 from argparse import ArgumentParser, RawTextHelpFormatter
 import csv
+import itertools
 import logging
+import math
+import multiprocessing
 import os
 import random
 import shutil
@@ -21,6 +24,10 @@ from tests.test_data import NAMES
 logging.config.dictConfig(settings.LOGGING)
 LOG = logging.getLogger('certificates.create_pdfs')
 
+# PokCertificateGen instances owned by this process, by course. With --jobs,
+# each worker process makes its own as it is given work for a course.
+CERT_GENERATORS = {}
+
 description = """
   Sample certificate generator
 """
@@ -67,16 +74,76 @@ def parse_args(args=sys.argv[1:]):
     )
     parser.add_argument('-G', '--grade-text', help='optional grading label to apply')
     parser.add_argument('-U', '--no-upload', help='skip s3 upload step', default=False, action="store_true")
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        help='number of processes to generate certificates with; each course\'s names are split between them',
+        type=int,
+        default=1,
+    )
 
     return parser.parse_args()
 
 
+def get_generator(course, pdf_dir):
+    """Return this process's certificate generator for course, creating it if needed"""
+    cert = CERT_GENERATORS.get(course)
+    if cert is None:
+        cert = CERT_GENERATORS[course] = PokCertificateGen(
+            course,
+            args.template_file,
+            aws_id=settings.CERT_AWS_ID,
+            aws_key=settings.CERT_AWS_KEY,
+            dir_prefix=pdf_dir,
+            long_org=args.long_org,
+            long_course=args.long_course,
+            issued_date=args.issued_date,
+        )
+    return cert
+
+
+def generate_chunk(work):
+    """
+    Generate the certificates for a (course, records, pdf_dir, copy_dir,
+    upload_files) unit of work, copying each one out into copy_dir
+
+    Returns the report rows of the records, in order.
+    """
+    (course, records, pdf_dir, copy_dir, upload_files) = work
+    cert = get_generator(course, pdf_dir)
+    certificate_data = []
+    results = cert.create_and_upload_many(records, upload=upload_files, copy_to_webroot=False, cleanup=False)
+    for record, (download_uuid, verify_uuid, download_url) in itertools.izip(records, results):
+        name = record['name']
+        certificate_data.append((name, course, args.long_org, args.long_course, download_url))
+        gen_dir = os.path.join(cert.dir_prefix, S3_CERT_PATH, download_uuid)
+        copy_dest = '{copy_dir}/{course}-{name}.pdf'.format(
+            copy_dir=copy_dir,
+            name=name.replace(" ", "-").replace("/", "-"),
+            course=course.replace("/", "-"))
+
+        try:
+            shutil.copyfile('{0}/{1}'.format(gen_dir, TARGET_FILENAME),
+                            unicode(copy_dest.decode('utf-8')))
+        except Exception, msg:
+            # Sometimes we have problems finding or creating the files to be copied;
+            # the following lines help us debug this case
+            print msg
+            print "%s\n%s\n%s\n%s\n%s\n%s" % (name, download_uuid, verify_uuid, download_uuid, gen_dir, copy_dest)
+            raise
+        print "Created {0}".format(copy_dest)
+    return certificate_data
+
+
 def main():
     """
     Generates some pfds using each template
     for different names for review in a pdf
     viewer.
     Will copy out the pdfs into the certs/ dir
+
+    With --jobs N, each course's names are split into N chunks, which a
+    pool of N processes generates; the report keeps the input order.
     """
     pdf_dir = TMP_GEN_DIR
     copy_dir = TMP_GEN_DIR + "+copy"
@@ -97,7 +164,9 @@ def main():
         course_list = settings.CERT_DATA.keys()
 
     upload_files = not args.no_upload
+    jobs = max(args.jobs, 1)
 
+    work = []
     for course in course_list:
         if args.name:
             name_list = [args.name]
@@ -107,44 +176,30 @@ def main():
         else:
             name_list = NAMES
 
+        records = []
         for name in name_list:
-            cert = PokCertificateGen(
-                course,
-                args.template_file,
-                aws_id=settings.CERT_AWS_ID,
-                aws_key=settings.CERT_AWS_KEY,
-                dir_prefix=pdf_dir,
-                long_org=args.long_org,
-                long_course=args.long_course,
-                issued_date=args.issued_date,
-            )
             title = None
             if args.assign_title:
                 title = random.choice(stanford_cme_titles)[0]
                 print "assigning random title", name, title
-            grade = None
-            if args.grade_text:
-                grade = args.grade_text
-            (download_uuid, verify_uuid,
-                download_url) = cert.create_and_upload(name, upload=upload_files, copy_to_webroot=False,
-                                                       cleanup=False, designation=title, grade=grade)
-            certificate_data.append((name, course, args.long_org, args.long_course, download_url))
-            gen_dir = os.path.join(cert.dir_prefix, S3_CERT_PATH, download_uuid)
-            copy_dest = '{copy_dir}/{course}-{name}.pdf'.format(
-                copy_dir=copy_dir,
-                name=name.replace(" ", "-").replace("/", "-"),
-                course=course.replace("/", "-"))
-
-            try:
-                shutil.copyfile('{0}/{1}'.format(gen_dir, TARGET_FILENAME),
-                                unicode(copy_dest.decode('utf-8')))
-            except Exception, msg:
-                # Sometimes we have problems finding or creating the files to be copied;
-                # the following lines help us debug this case
-                print msg
-                print "%s\n%s\n%s\n%s\n%s\n%s" % (name, download_uuid, verify_uuid, download_uuid, gen_dir, copy_dest)
-                raise
-            print "Created {0}".format(copy_dest)
+            records.append({'name': name, 'grade': args.grade_text or None, 'designation': title})
+
+        chunk_size = max(int(math.ceil(len(records) / float(jobs))), 1)
+        for start in xrange(0, len(records), chunk_size):
+            work.append((course, records[start:start + chunk_size], pdf_dir, copy_dir, upload_files))
+
+    if jobs > 1:
+        pool = multiprocessing.Pool(jobs)
+        try:
+            # imap hands back each chunk's rows in the order the work was given
+            for rows in pool.imap(generate_chunk, work):
+                certificate_data.extend(rows)
+        finally:
+            pool.terminate()
+            pool.join()
+    else:
+        for unit in work:
+            certificate_data.extend(generate_chunk(unit))
 
     should_write_report_to_stdout = not args.no_report
     if args.report_file:
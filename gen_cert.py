@@ -1,28 +1,28 @@
 # -*- coding: utf-8 -*-
 
-import copy
 import datetime
-import gnupg
+import hashlib
+import json
 import math
 import os
 import re
 import shutil
 import StringIO
+import cStringIO
+import sys
 import uuid
 
 from reportlab.platypus import Paragraph
+from reportlab.platypus.paragraph import split as split_words
 from PyPDF2 import PdfFileWriter, PdfFileReader
+from PyPDF2.generic import ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject, NameObject
+from PyPDF2.pdf import PageObject
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.lib.fonts import addMapping
 from reportlab.lib.pagesizes import A4, letter, landscape
-from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase.pdfmetrics import stringWidth
-from glob import glob
 from HTMLParser import HTMLParser
 
 import settings
@@ -31,17 +31,26 @@ import itertools
 import logging.config
 import reportlab.rl_config
 import tempfile
-import boto.s3
-from boto.s3.key import Key
 from bidi.algorithm import get_display
 import arabic_reshaper
 
 from opaque_keys.edx.keys import CourseKey
+from openedx_certificates import signing
+from openedx_certificates.cache import LRUCache
+from openedx_certificates.fonts import FontRegistry
+from openedx_certificates import manifest
+from openedx_certificates import merkle
+from openedx_certificates import storage
+from openedx_certificates.styles import derive, paragraph_style
+from openedx_certificates.page_template import load_template
 
 reportlab.rl_config.warnOnMissingFontGlyphs = 0
 
 
 RE_ISODATES = re.compile("(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})")
+RE_HEX_UUID = re.compile("^[0-9a-f]{32}$")
+# An HTML entity that ReportLab left as it was
+RE_ENTITY = re.compile("&#?\w+;")
 TEMPLATE_DIR = settings.TEMPLATE_DIR
 BUCKET = settings.CERT_BUCKET
 CERT_KEY_ID = settings.CERT_KEY_ID
@@ -53,30 +62,76 @@ TARGET_FILENAME = getattr(settings, 'CERT_FILENAME', 'Certificate.pdf')
 TMP_GEN_DIR = getattr(settings, 'TMP_GEN_DIR', '/var/tmp/generated_certs')
 CERTS_ARE_CALLED = getattr(settings, 'CERTS_ARE_CALLED', 'certificate')
 CERTS_ARE_CALLED_PLURAL = getattr(settings, 'CERTS_ARE_CALLED_PLURAL', 'certificates')
+# How the overlay is combined with the template, set per course as PDF_ENGINE
+# in cert-data.yml: 'pypdf2' merges the content streams with PyPDF2's
+# mergePage, 'xobject' draws both as Form XObjects without parsing them.
+PDF_ENGINES = ('pypdf2', 'xobject')
+# How certificates are signed, as CERT_SIGNATURE_MODE: 'detached' gives each
+# one a .sig, 'merkle' signs a batch at once and gives each one a .proof
+SIGNATURE_MODES = ('detached', 'merkle')
+# The namespace of the UUIDs certificate_uuids() derives
+CERT_ID_NAMESPACE = uuid.UUID('6d1f3f0e-4b7c-5a8e-9c2d-0b8f5e3a7c41')
 
 # reduce logging level for gnupg
 l = logging.getLogger('gnupg')
 l.setLevel('WARNING')
 
-# Register all fonts in the fonts/ dir; there are likely more fonts here than
-# we need, but the performance hit is minimal -- especially since we only do
-# this at import time.
-#
-# While registering fonts, build a table of the Unicode code points in each
-# for use in font_for_string().
-FONT_CHARACTER_TABLES = {}
-for font_file in glob('{0}/fonts/*.ttf'.format(TEMPLATE_DIR)):
-    font_name = os.path.basename(os.path.splitext(font_file)[0])
-    ttf = TTFont(font_name, font_file)
-    FONT_CHARACTER_TABLES[font_name] = ttf.face.charToGlyph.keys()
-    pdfmetrics.registerFont(TTFont(font_name, font_file))
+# Fonts in the fonts/ dir are registered with reportlab the first time a
+# style or string width refers to them, so only the fonts a course actually
+# uses are ever parsed. Their code point coverage, for covers() and
+# font_for_string(), is kept in FONT_COVERAGE_INDEX across runs.
+FONTS = FontRegistry('{0}/fonts'.format(TEMPLATE_DIR), settings.FONT_COVERAGE_INDEX)
+FONTS.install()
+
+# The fonts that <b> and <i> switch to in each template version, as
+# (family, bold, italic, font name). A version's mappings are added once per
+# process, the first time a certificate is made with it.
+FONT_MAPPINGS = {
+    1: (
+        ('OpenSans-Light', 0, 0, 'OpenSans-Light'),
+        ('OpenSans-Light', 0, 1, 'OpenSans-LightItalic'),
+        ('OpenSans-Light', 1, 0, 'OpenSans-Bold'),
+        ('OpenSans-Regular', 0, 0, 'OpenSans-Regular'),
+        ('OpenSans-Regular', 0, 1, 'OpenSans-Italic'),
+        ('OpenSans-Regular', 1, 0, 'OpenSans-Bold'),
+        ('OpenSans-Regular', 1, 1, 'OpenSans-BoldItalic'),
+    ),
+    2: (
+        ('AvenirNext-Regular', 0, 0, 'AvenirNext-Regular'),
+        ('AvenirNext-DemiBold', 1, 0, 'AvenirNext-DemiBold'),
+    ),
+    'stanford': (
+        ('OpenSans-Light', 0, 0, 'OpenSans-Light'),
+        ('OpenSans-Regular', 1, 0, 'OpenSans-Bold'),
+        ('SourceSansPro-Light', 0, 0, 'SourceSansPro-Light'),
+        ('SourceSansPro-Light', 1, 1, 'SourceSansPro-SemiboldItalic'),
+        ('SourceSansPro-Regular', 0, 0, 'SourceSansPro-Regular'),
+    ),
+    'stanford_cme': (
+        ('OpenSans-Light', 0, 0, 'OpenSans-Light'),
+        ('OpenSans-Light', 0, 1, 'OpenSans-LightItalic'),
+        ('OpenSans-Light', 1, 0, 'OpenSans-Bold'),
+        ('DroidSerif', 0, 0, 'DroidSerif'),
+        ('DroidSerif', 0, 1, 'DroidSerif-Italic'),
+        ('DroidSerif', 1, 0, 'DroidSerif-Bold'),
+        ('DroidSerif', 1, 1, 'DroidSerif-BoldItalic'),
+    ),
+    '3_dynamic': (
+        ('OpenSans-Light', 0, 0, 'OpenSans-Light'),
+        ('OpenSans-Light', 1, 0, 'OpenSans-Bold'),
+        ('SourceSansPro-Regular', 0, 0, 'SourceSansPro-Regular'),
+        ('SourceSansPro-Regular', 1, 0, 'SourceSansPro-Bold'),
+        ('SourceSansPro-Regular', 1, 1, 'SourceSansPro-BoldItalic'),
+    ),
+}
 
 # These are small, so let's just load them at import time and keep them around
-# so we don't have to keep doing the file I/o
+# so we don't have to keep doing the file I/o. Each certificate generator parses
+# its own copy, since merging onto a page modifies it.
 BLANK_PDFS = {
-    'landscape-A4': PdfFileReader(file("{0}/blank.pdf".format(TEMPLATE_DIR), "rb")),
-    'landscape-letter': PdfFileReader(file("{0}/blank-letter.pdf".format(TEMPLATE_DIR), "rb")),
-    'portrait-A4': PdfFileReader(file("{0}/blank-portrait-A4.pdf".format(TEMPLATE_DIR), "rb")),
+    'landscape-A4': file("{0}/blank.pdf".format(TEMPLATE_DIR), "rb").read(),
+    'landscape-letter': file("{0}/blank-letter.pdf".format(TEMPLATE_DIR), "rb").read(),
+    'portrait-A4': file("{0}/blank-portrait-A4.pdf".format(TEMPLATE_DIR), "rb").read(),
 }
 
 
@@ -116,6 +171,70 @@ def get_cert_date(calling_date_parameter, configured_date_parameter):
     return date_string
 
 
+def certificate_paths(download_uuid, verify_uuid):
+    """
+    Return the paths, relative to the storage root, of every file a
+    certificate with download_uuid and verify_uuid can be published with
+    """
+    paths = []
+    if download_uuid:
+        paths.append('/'.join([S3_CERT_PATH, _checked_uuid(download_uuid), TARGET_FILENAME]))
+    if verify_uuid:
+        verify_dir = '/'.join([S3_VERIFY_PATH, _checked_uuid(verify_uuid)])
+        for filename in [TARGET_FILENAME + '.sig', TARGET_FILENAME + '.proof', 'valid.html', 'verify.html']:
+            paths.append('/'.join([verify_dir, filename]))
+    return paths
+
+
+def _checked_uuid(value):
+    """Return value if it is a hex UUID, so that it can't point outside its directory"""
+    if not RE_HEX_UUID.match(value):
+        raise ValueError("Invalid certificate UUID {0!r}".format(value))
+    return value
+
+
+def certificate_uuids(course_id, username, salt):
+    """
+    Return the deterministic (download_uuid, verify_uuid) of username's
+    certificate in course_id
+
+    They are version 5 UUIDs of the course, username and salt, so the same
+    student in the same course always gets the same ones; the salt is what
+    keeps them from being guessed.
+    """
+    name = u'{0}\n{1}\n{2}'.format(course_id, username, salt).encode('utf-8')
+    return (
+        uuid.uuid5(CERT_ID_NAMESPACE, 'download\n' + name).hex,
+        uuid.uuid5(CERT_ID_NAMESPACE, 'verify\n' + name).hex,
+    )
+
+
+# Fonts for the 3_dynamic template, ordered by preference; cf. font_for_string()
+V3_FONTLIST = [
+    ('SourceSansPro-Regular', 'SourceSansPro-Regular.ttf', None),
+    ('OpenSans-Light', 'OpenSans-Light.ttf', None),
+    ('Arial Unicode', 'Arial Unicode.ttf', None),
+]
+V3_COMPLETED_TEXT = u"has successfully completed a free online offering of"
+
+# Memo of font_for_string: (font tags, string) -> index of the font to use
+FONT_SELECTIONS = LRUCache(settings.FONT_SELECTION_CACHE_SIZE)
+
+
+# Memo of autoscale_text: (string, style, box) -> steps down to the size that fits
+AUTOSCALE_FITS = LRUCache(1024)
+
+
+def covers(fontname, ustring):
+    """Return the first character of ustring that fontname has no glyph for, or None if it has them all"""
+    codepoints = FONTS.coverage(fontname)
+    if codepoints.issuperset(map(ord, ustring)):
+        return None
+    for c in ustring:
+        if ord(c) not in codepoints:
+            return c
+
+
 def font_for_string(fontlist, ustring):
     """Determine the best font to render a string.
 
@@ -128,16 +247,28 @@ def font_for_string(fontlist, ustring):
     human-readable font name, the on-disk filename, and one or more ignored
     fields, e.g.:
       [('font name', 'filename.ttf', 'ignored value', [...]), ...]
+
+    Selections are remembered in FONT_SELECTIONS, keyed by the font names
+    and the string.
     """
     # TODO: There's probably a way to do this by consulting reportlab that
     #       doesn't require re-loading the font files at all
     ustring = unicode(ustring)
     if fontlist and not ustring:
         return fontlist[0]
-    for fonttuple in fontlist:
+    key = (tuple(fonttuple[0] for fonttuple in fontlist), ustring)
+    index = FONT_SELECTIONS.get(key)
+    if index is None:
+        index = _select_font(fontlist, ustring)
+        FONT_SELECTIONS.put(key, index)
+    return fontlist[index]
+
+
+def _select_font(fontlist, ustring):
+    """Return the index in fontlist of the first font that covers ustring, for font_for_string"""
+    for index, fonttuple in enumerate(fontlist):
         fonttag = fonttuple[0]
-        codepoints = FONT_CHARACTER_TABLES.get(fonttag, [])
-        if not codepoints:
+        if not FONTS.coverage(fonttag):
             warnstring = "Missing or invalid font specification {fonttag} " \
                          "rendering string '{ustring}'.\nFontlist: {fontlist}".format(
                              fonttag=fonttag,
@@ -146,9 +277,8 @@ def font_for_string(fontlist, ustring):
                             )
             log.warning(warnstring)
             continue
-        OK = reduce(lambda x, y: x and y, (ord(c) in codepoints for c in ustring))
-        if OK:
-            return fonttuple
+        if covers(fonttag, ustring) is None:
+            return index
     # No font we tested supports this string, throw an exception.
     # Then a human can and should install better fonts
     raise ValueError("Nothing in fontlist supports string '{0}'. Fontlist: {1}".format(
@@ -157,28 +287,201 @@ def font_for_string(fontlist, ustring):
     ))
 
 
-def autoscale_text(page, string, max_fontsize, max_leading, max_height, max_width, style):
+def autoscale_text(page, string, max_fontsize, max_leading, max_height, max_width, style, step=1):
     """Calculate font size and text placement given some base values
 
-    These values passed by reference are modified in this function, and not passed back:
-        - style.fontSize
-        - style.leading
+    Finds the largest font size, going down from max_fontsize in steps of
+    step points (which may be fractional) with the leading lowered to match,
+    at which string fits in max_width x max_height. The size is found with a
+    binary search, starting above the sizes its width says can't possibly
+    fit, and remembered in AUTOSCALE_FITS for the same string, style and box.
+
+    Returns a Paragraph of string in a style derived from style with that
+    fontSize and leading; style itself is left as it is.
     """
-    width = max_width + 1
-    height = max_height + 1
-    fontsize = max_fontsize
-    leading = max_leading
+    key = (string, max_fontsize, max_leading, max_height, max_width, step, _style_key(style))
+    steps = AUTOSCALE_FITS.get(key)
+    if steps is None:
+        steps = _autoscale_steps(page, string, max_fontsize, max_leading, max_height, max_width, style, step)
+        AUTOSCALE_FITS.put(key, steps)
+    return Paragraph(string, derive(style, fontSize=max_fontsize - steps * step, leading=max_leading - steps * step))
+
+
+def _autoscale_steps(page, string, max_fontsize, max_leading, max_height, max_width, style, step):
+    """Return how many steps down from max_fontsize string first fits, for autoscale_text"""
+    def fits(steps):
+        sized_style = derive(style, fontSize=max_fontsize - steps * step, leading=max_leading - steps * step)
+        width, height = Paragraph(string, sized_style).wrapOn(page, max_width, max_height)
+        return width <= max_width and height <= max_height
+
+    last = max(int(math.ceil(float(max_fontsize) / step)) - 1, 0)
+    low = min(_autoscale_lower_bound(string, max_fontsize, max_leading, max_height, max_width, style, step), last)
+    if fits(low):
+        return low
+    # Smallest number of steps that fits is in (low, last]
+    high = last
+    while high - low > 1:
+        middle = (low + high) // 2
+        if fits(middle):
+            high = middle
+        else:
+            low = middle
+    return high
 
-    # Loop while size of text bigger than max allowed size as passed through
-    while width > max_width or height > max_height:
-        style.fontSize = fontsize
-        style.leading = leading
-        paragraph = Paragraph(string, style)
-        width, height = paragraph.wrapOn(page, max_width, max_height)
-        fontsize -= 1
-        leading -= 1
 
-    return paragraph
+def _autoscale_lower_bound(string, max_fontsize, max_leading, max_height, max_width, style, step):
+    """
+    Return the number of steps down from max_fontsize below which string
+    can't fit, judging by its width alone
+
+    Unless one of its words is wider than a line (and overflows it),
+    string needs at least as many lines as the width of its words laid end
+    to end takes up, and each line takes a leading. The words are measured
+    as ReportLab parses and splits them, in the fonts of their markup and
+    with their entities decoded.
+    """
+    try:
+        frags = Paragraph(string, style).frags
+    except ValueError:
+        return 0
+    texts = [(getattr(frag, 'text', u''), frag) for frag in frags]
+    if any(RE_ENTITY.search(text) or frag.fontSize != style.fontSize for (text, frag) in texts):
+        # Text we can't be sure how wide ReportLab will make; just search every size
+        return 0
+    unit_width = 0.0
+    word_widths = [0.0]
+    try:
+        for (text, frag) in texts:
+            # The x's show whether text starts a new word, and ends its last one
+            words = split_words(u'x{0}x'.format(text))
+            words[0] = words[0][1:]
+            words[-1] = words[-1][:-1]
+            for index, word in enumerate(words):
+                if index:
+                    word_widths.append(0.0)
+                width = stringWidth(word, frag.fontName, 1)
+                word_widths[-1] += width
+                unit_width += width
+    except KeyError:
+        # Not a font we can measure; just search every size
+        return 0
+    widest = max(word_widths)
+    steps = 0
+    while max_fontsize - steps * step > step:
+        fontsize = max_fontsize - steps * step
+        leading = max_leading - steps * step
+        if widest * fontsize > max_width:
+            break
+        lines = math.ceil(unit_width * fontsize / max_width)
+        if lines * leading <= max_height:
+            break
+        steps += 1
+    return steps
+
+
+def _style_key(style):
+    """Return the style's settings, other than its size and leading, as something hashable"""
+    return tuple(sorted(
+        (name, value) for name, value in style.__dict__.items() if name not in ('fontSize', 'leading')
+    ))
+
+
+# Verification page fields for each template_type
+CERT_TYPES = {
+    'verified': {'type': 'idverified', 'type_name': 'Verified'},
+    'honor': {'type': 'honorcode', 'type_name': 'Honor Code'},
+}
+
+CERT_TYPES['verified']['explanation'] = (
+    "An ID verified certificate signifies that an edX user has "
+    "agreed to abide by edX's honor code and completed all of the "
+    "required tasks of this course under its guidelines, as well "
+    "as having their photo ID checked to verify their identity."
+)
+CERT_TYPES['verified']['img'] = '''
+            <div class="wrapper--img">
+                <img
+                    class="img--idverified"
+                    src="/v2/static/images/logo-idverified.png"
+                    alt="ID Verified Certificate Logo"
+                />
+            </div>
+        '''
+CERT_TYPES['honor']['explanation'] = (
+    "An honor code certificate signifies that an edX user has "
+    "agreed to abide by edX's honor code and completed all of the "
+    "required tasks of this course under its guidelines."
+)
+CERT_TYPES['honor']['img'] = ""
+
+
+_signer = None
+_signer_pid = None
+
+
+def get_signer():
+    """
+    Return this process's certificate signer, creating it on first use
+
+    The signer is long-lived, so its GPG handle and keyring are shared by
+    every certificate; a forked worker process makes its own.
+    """
+    global _signer, _signer_pid
+    if _signer is None or _signer_pid != os.getpid():
+        _signer = signing.make_signer(
+            settings.CERT_SIGNER,
+            homedir=settings.CERT_GPG_DIR,
+            key_id=CERT_KEY_ID,
+            use_agent=settings.CERT_SIGNER_USE_AGENT,
+            workers=settings.CERT_SIGNER_WORKERS,
+        )
+        _signer_pid = os.getpid()
+    return _signer
+
+
+_storage = None
+
+
+def get_storage():
+    """Return the storage certificates are published to, as set by CERT_STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        options = {
+            'concurrency': settings.CERT_STORAGE_CONCURRENCY,
+            'delete_batch_size': settings.CERT_DELETE_BATCH_SIZE,
+            'delete_delay': settings.CERT_DELETE_DELAY,
+        }
+        if settings.CERT_STORAGE_BACKEND == 's3':
+            options.update(bucket=BUCKET, aws_id=settings.CERT_AWS_ID, aws_key=settings.CERT_AWS_KEY)
+        elif settings.CERT_STORAGE_BACKEND == 'local':
+            options.update(root=settings.CERT_STORAGE_ROOT)
+        _storage = storage.make_storage(settings.CERT_STORAGE_BACKEND, **options)
+    return _storage
+
+
+def _form_xobject(page, bbox):
+    """
+    Wrap the content of a PyPDF2 page as a Form XObject, without decoding it
+
+    Streams keep their encoded bytes and filters, so nothing is parsed or
+    recompressed; only pages split over several content streams are joined.
+    """
+    contents = page['/Contents'].getObject()
+    if isinstance(contents, ArrayObject):
+        form = DecodedStreamObject()
+        form.setData('\n'.join(stream.getObject().getData() for stream in contents))
+    else:
+        form = EncodedStreamObject() if '/Filter' in contents else DecodedStreamObject()
+        # PyPDF2 has no public accessor for the still-encoded stream data
+        form._data = contents._data
+        for key in ('/Filter', '/DecodeParms'):
+            if key in contents:
+                form[NameObject(key)] = contents[key]
+    form[NameObject('/Type')] = NameObject('/XObject')
+    form[NameObject('/Subtype')] = NameObject('/Form')
+    form[NameObject('/BBox')] = bbox
+    form[NameObject('/Resources')] = page.get('/Resources', DictionaryObject())
+    return form
 
 
 class CertificateGen(object):
@@ -217,6 +520,7 @@ class CertificateGen(object):
         self.aws_id = str(aws_id)
         self.aws_key = str(aws_key)
 
+        self.course_id = course_id
         cert_data = settings.CERT_DATA.get(course_id, {})
         self.cert_data = cert_data
 
@@ -258,6 +562,40 @@ class CertificateGen(object):
             template_pdf_filename = "{0}/{1}".format(template_prefix, template_pdf)
             if 'verified' in template_pdf:
                 self.template_type = 'verified'
+        self.template_pdf_filename = template_pdf_filename
+        # Blank page + template merges, rendered once per blank page size
+        self.course_layers = {}
+        # Laid out text that is the same on every certificate, as (static_key, [(paragraph, x, y)])
+        self.course_text = None
+        # Verification page templates with this course's fields filled in
+        self.verification_templates = {}
+        # Contents of the files generated for the current certificate, by
+        # path under dir_prefix; they are also written there if keep_files
+        self.artifacts = collections.OrderedDict()
+        # storage.file_digests() of the artifacts they are known for, by path
+        self.digests = {}
+        # With merkle signatures, the arguments to _save_verification_files
+        # for the current certificate, until its batch is signed
+        self.pending_verification = None
+        self.signature_mode = settings.CERT_SIGNATURE_MODE
+        if self.signature_mode not in SIGNATURE_MODES:
+            raise ValueError("Unknown CERT_SIGNATURE_MODE {0}".format(self.signature_mode))
+        # With deterministic IDs, the certificate_uuids() of the current
+        # certificate, and the manifest of those already published
+        self.uuids = None
+        self.id_salt = None
+        self.manifest = None
+        if settings.CERT_DETERMINISTIC_IDS:
+            self.id_salt = cert_data.get('ID_SALT', settings.CERT_ID_SALT)
+            if not self.id_salt:
+                raise ValueError("CERT_DETERMINISTIC_IDS needs a CERT_ID_SALT or ID_SALT for {0}".format(course_id))
+            if settings.CERT_MANIFEST_DIR:
+                self.manifest = manifest.Manifest(settings.CERT_MANIFEST_DIR)
+        self.template_digest = None
+        self.keep_files = True
+        self.pdf_engine = cert_data.get('PDF_ENGINE', 'pypdf2')
+        if self.pdf_engine not in PDF_ENGINES:
+            raise ValueError("Unknown PDF_ENGINE {0} for {1}".format(self.pdf_engine, course_id))
         try:
             self.template_pdf = PdfFileReader(file(template_pdf_filename, "rb"))
         except IOError as e:
@@ -268,9 +606,29 @@ class CertificateGen(object):
         self.cert_label_plural = cert_data.get('CERTS_ARE_CALLED_PLURAL', CERTS_ARE_CALLED_PLURAL)
         self.course_association_text = cert_data.get('COURSE_ASSOCIATION_TEXT', 'a course of study')
 
+        if self.template_version == '3_dynamic':
+            self._select_course_fonts()
+
+    def approximate_size(self):
+        """Rough number of bytes held by this generator, mostly the parsed template"""
+        return os.path.getsize(self.template_pdf_filename) + sum(len(layer) for layer in self.course_layers.values())
+
     def delete_certificate(self, delete_download_uuid, delete_verify_uuid):
-        # TODO remove/archive an existing certificate
-        raise NotImplementedError
+        """
+        Remove the published files of the certificate with delete_download_uuid
+        and delete_verify_uuid, either of which may be empty
+
+        Deletes from storage are queued, so that those of many submissions
+        are made in a few batched requests; publishing the same files again
+        in the meantime keeps them. Copies in the web root are removed at once.
+        """
+        paths = certificate_paths(delete_download_uuid, delete_verify_uuid)
+        if self.manifest is not None and delete_download_uuid:
+            self.manifest.remove(delete_download_uuid)
+        if settings.S3_UPLOAD:
+            get_storage().queue_delete(paths)
+        if settings.COPY_TO_WEB_ROOT:
+            storage.LocalStorage(settings.CERT_WEB_ROOT).delete_many(paths)
 
     def create_and_upload(
         self,
@@ -281,10 +639,13 @@ class CertificateGen(object):
         cert_web_root=settings.CERT_WEB_ROOT,
         grade=None,
         designation=None,
+        username=None,
     ):
         """
         name - Full name that will be on the certificate
         upload - Upload to S3 (defaults to True)
+        username - (optional) the student's username, which the certificate's
+                   UUIDs are derived from if CERT_DETERMINISTIC_IDS is set
 
         set upload to False if you do not want to upload to S3,
         this will also keep temporary files that are created.
@@ -298,62 +659,167 @@ class CertificateGen(object):
         verify_uuid will be None if there is no verification signature
 
         """
-        download_uuid = None
-        verify_uuid = None
-        download_url = None
-        s3_conn = None
-        bucket = None
-
+        record = {'name': name, 'grade': grade, 'designation': designation, 'username': username}
+        return next(self.create_and_upload_many(
+            [record],
+            upload=upload,
+            cleanup=cleanup,
+            copy_to_webroot=copy_to_webroot,
+            cert_web_root=cert_web_root,
+        ))
+
+    def create_and_upload_many(
+        self,
+        records,
+        upload=settings.S3_UPLOAD,
+        cleanup=True,
+        copy_to_webroot=settings.COPY_TO_WEB_ROOT,
+        cert_web_root=settings.CERT_WEB_ROOT,
+    ):
+        """
+        Generate and publish a certificate for each of records
+
+        records - iterable of dicts with a 'name' and optionally a 'grade',
+                  'designation' and 'username', as for create_and_upload
+
+        This is a generator yielding (download_uuid, verify_uuid, download_url)
+        for each record in order, as soon as it has been published. The
+        template, fonts, GPG handle and S3 bucket are set up once and shared
+        by the whole batch. Certificates are signed and published in batches:
+        CERT_SIGNER_WORKERS at a time, their signatures made in parallel, or
+        CERT_MERKLE_BATCH_SIZE at a time with a single merkle signature.
+        If a record fails, the certificates made before it are published and
+        yielded before its exception is raised.
+
+        With CERT_DETERMINISTIC_IDS, a record with a username whose
+        certificate was already published, to the same places and from the
+        same inputs, and is still there, isn't made again: its manifest entry
+        is yielded instead.
+        """
         certificates_path = os.path.join(self.dir_prefix, S3_CERT_PATH)
         verify_path = os.path.join(self.dir_prefix, S3_VERIFY_PATH)
+        # Only write the certificate files under dir_prefix if they are kept
+        self.keep_files = not cleanup
+
+        batch_size = max(settings.CERT_SIGNER_WORKERS, 1)
+        if self.signature_mode == 'merkle':
+            batch_size = settings.CERT_MERKLE_BATCH_SIZE
+        # Where the certificates are published to, as part of their fingerprint
+        targets = (upload, copy_to_webroot and cert_web_root)
+        records = iter(records)
+        while True:
+            batch = []
+            failure = None
+            for record in itertools.islice(records, batch_size):
+                try:
+                    batch.append(self._make_batch_item(record, targets, cleanup, certificates_path, verify_path))
+                except Exception:
+                    # Publish the certificates made before this one, then fail
+                    failure = sys.exc_info()
+                    break
+            if not batch and failure is None:
+                break
+            if batch:
+                self._sign_batch(batch)
+
+            for (uuids, artifacts, digests, pending_verification, fingerprint) in batch:
+                # upload generated certificate and verification files to S3,
+                # or copy them to the web root. Or both.
+                files = [
+                    (os.path.relpath(local_path, start=self.dir_prefix), data, digests.get(local_path))
+                    for local_path, data in artifacts.items()
+                ]
+                if upload:
+                    get_storage().put_many(files)
+
+                if copy_to_webroot:
+                    storage.LocalStorage(cert_web_root).put_many(files)
+
+                if fingerprint is not None:
+                    self.manifest.put(uuids[0], {'fingerprint': fingerprint, 'result': uuids})
+                yield uuids
+            if failure is not None:
+                raise failure[0], failure[1], failure[2]
+
+    def _make_batch_item(self, record, targets, cleanup, certificates_path, verify_path):
+        """
+        Make the certificate for record, unless the manifest says it is
+        already published, for create_and_upload_many to sign and publish
 
-        (download_uuid, verify_uuid, download_url) = self._generate_certificate(student_name=name,
-                                                                                download_dir=certificates_path,
-                                                                                verify_dir=verify_path,
-                                                                                grade=grade,
-                                                                                designation=designation,)
-
-        # upload generated certificate and verification files to S3,
-        # or copy them to the web root. Or both.
-        my_certs_path = os.path.join(certificates_path, download_uuid)
-        my_verify_path = os.path.join(verify_path, verify_uuid)
-        if upload:
-            s3_conn = boto.connect_s3(settings.CERT_AWS_ID, settings.CERT_AWS_KEY)
-            bucket = s3_conn.get_bucket(BUCKET)
-        if upload or copy_to_webroot:
-            for subtree in (my_certs_path, my_verify_path):
-                for dirpath, dirnames, filenames in os.walk(subtree):
-                    for filename in filenames:
-                        local_path = os.path.join(dirpath, filename)
-                        dest_path = os.path.relpath(local_path, start=self.dir_prefix)
-                        publish_dest = os.path.join(cert_web_root, dest_path)
-
-                        if upload:
-                            try:
-                                key = Key(bucket, name=dest_path)
-                                key.set_contents_from_filename(local_path, policy='public-read')
-                            except:
-                                raise
-                            else:
-                                log.info("uploaded {local} to {s3path}".format(local=local_path, s3path=dest_path))
-
-                        if copy_to_webroot:
-                            try:
-                                dirname = os.path.dirname(publish_dest)
-                                if not os.path.exists(dirname):
-                                    os.makedirs(dirname)
-                                shutil.copy(local_path, publish_dest)
-                            except:
-                                raise
-                            else:
-                                log.info("published {local} to {web}".format(local=local_path, web=publish_dest))
-
-        if cleanup:
-            for working_dir in (certificates_path, verify_path):
-                if os.path.exists(working_dir):
-                    shutil.rmtree(working_dir)
+        Returns (uuids, artifacts, digests, pending_verification, fingerprint).
+        """
+        self.artifacts = collections.OrderedDict()
+        self.digests = {}
+        self.pending_verification = None
+        self.uuids = None
+        fingerprint = None
+        if self.id_salt and record.get('username') is not None:
+            self.uuids = certificate_uuids(self.course_id, record['username'], self.id_salt)
+            if self.manifest is not None and cleanup:
+                fingerprint = self._fingerprint(record, targets)
+                entry = self.manifest.get(self.uuids[0])
+                if (entry is not None and entry['fingerprint'] == fingerprint and
+                        self._is_published(entry['result'], targets)):
+                    log.info("Certificate {0} is already published, skipping it".format(self.uuids[0]))
+                    return (tuple(entry['result']), {}, {}, None, None)
+        uuids = self._generate_certificate(
+            student_name=record['name'],
+            download_dir=certificates_path,
+            verify_dir=verify_path,
+            grade=record.get('grade'),
+            designation=record.get('designation'),
+        )
+        return (uuids, self.artifacts, self.digests, self.pending_verification, fingerprint)
 
-        return (download_uuid, verify_uuid, download_url)
+    def _is_published(self, uuids, targets):
+        """
+        Return whether the certificate with uuids is still published to
+        each of targets: the manifest only knows about this host's deletes
+        """
+        (upload, cert_web_root) = targets
+        path = certificate_paths(uuids[0], None)[0]
+        if upload and not get_storage().exists(path):
+            return False
+        if cert_web_root and not storage.LocalStorage(cert_web_root).exists(path):
+            return False
+        return True
+
+    def _certificate_uuids(self):
+        """Return the (download_uuid, verify_uuid) of the certificate being generated"""
+        if self.uuids is not None:
+            return self.uuids
+        return (uuid.uuid4().hex, uuid.uuid4().hex)
+
+    def _fingerprint(self, record, targets):
+        """
+        Return the SHA-256 hex digest of everything that goes into record's
+        certificate, and of where it is published, for the manifest
+
+        A certificate whose fingerprint is unchanged would come out the same
+        if it were made again. The ROLLING issue date is part of it, so
+        those certificates are made again once the date changes.
+        """
+        if self.template_digest is None:
+            with open(self.template_pdf_filename, 'rb') as f:
+                self.template_digest = hashlib.sha256(f.read()).hexdigest()
+        inputs = [
+            self.course_id,
+            self.template_pdf_filename,
+            self.template_digest,
+            self.cert_data,
+            self.long_org,
+            self.long_course,
+            get_cert_date(None, self.issued_date),
+            record['name'],
+            record.get('grade'),
+            record.get('designation'),
+            settings.CERT_DOWNLOAD_URL,
+            settings.CERT_VERIFY_URL,
+            CERT_KEY_ID,
+            self.signature_mode,
+            targets,
+        ]
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=repr)).hexdigest()
 
     def _generate_certificate(
         self,
@@ -397,8 +863,7 @@ class CertificateGen(object):
     ):
         # A4 page size is 297mm x 210mm
 
-        verify_uuid = uuid.uuid4().hex
-        download_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH, uuid=download_uuid, file=filename)
@@ -408,22 +873,11 @@ class CertificateGen(object):
         overlay_pdf_buffer = StringIO.StringIO()
         c = canvas.Canvas(overlay_pdf_buffer, pagesize=landscape(A4))
 
-        # 0 0 - normal
-        # 0 1 - italic
-        # 1 0 - bold
-        # 1 1 - italic and bold
-        addMapping('OpenSans-Light', 0, 0, 'OpenSans-Light')
-        addMapping('OpenSans-Light', 0, 1, 'OpenSans-LightItalic')
-        addMapping('OpenSans-Light', 1, 0, 'OpenSans-Bold')
+        FONTS.add_mappings(FONT_MAPPINGS[1])
 
-        addMapping('OpenSans-Regular', 0, 0, 'OpenSans-Regular')
-        addMapping('OpenSans-Regular', 0, 1, 'OpenSans-Italic')
-        addMapping('OpenSans-Regular', 1, 0, 'OpenSans-Bold')
-        addMapping('OpenSans-Regular', 1, 1, 'OpenSans-BoldItalic')
-
-        styleArial = ParagraphStyle(name="arial", leading=10, fontName='Arial Unicode')
-        styleOpenSans = ParagraphStyle(name="opensans-regular", leading=10, fontName='OpenSans-Regular')
-        styleOpenSansLight = ParagraphStyle(name="opensans-light", leading=10, fontName='OpenSans-Light')
+        styleArial = paragraph_style(name="arial", leading=10, fontName='Arial Unicode')
+        styleOpenSans = paragraph_style(name="opensans-regular", leading=10, fontName='OpenSans-Regular')
+        styleOpenSansLight = paragraph_style(name="opensans-light", leading=10, fontName='OpenSans-Light')
 
         # Text is overlayed top to bottom
         #   * Issued date (top right corner)
@@ -439,59 +893,124 @@ class CertificateGen(object):
         LEFT_INDENT = 49  # mm from the left side to write the text
         RIGHT_INDENT = 49  # mm from the right side for the CERTIFICATE
 
-        # CERTIFICATE
+        def layout_course_text():
+            """Lay out everything but the student name and honor code url"""
+            course_text = []
+            # CERTIFICATE
 
-        styleOpenSansLight.fontSize = 19
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
+            style = derive(
+                styleOpenSansLight, fontSize=19, leading=10,
+                textColor=colors.Color(0.302, 0.306, 0.318), alignment=TA_LEFT,
+            )
 
-        paragraph_string = "CERTIFICATE"
+            paragraph_string = "CERTIFICATE"
 
-        # Right justified so we compute the width
-        width = stringWidth(
-            paragraph_string,
-            'OpenSans-Light',
-            19,
-        ) / mm
-        paragraph = Paragraph("{0}".format(
-            paragraph_string), styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, (WIDTH - RIGHT_INDENT - width) * mm, 163 * mm)
-
-        # Issued ..
-
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-            0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
-
-        paragraph_string = "Issued {0}".format(self.issued_date)
-
-        # Right justified so we compute the width
-        width = stringWidth(
-            paragraph_string,
-            'OpenSans-LightItalic',
-            12,
-        ) / mm
-        paragraph = Paragraph("<i>{0}</i>".format(
-            paragraph_string), styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, (WIDTH - RIGHT_INDENT - width) * mm, 155 * mm)
+            # Right justified so we compute the width
+            width = stringWidth(
+                paragraph_string,
+                'OpenSans-Light',
+                19,
+            ) / mm
+            paragraph = Paragraph("{0}".format(
+                paragraph_string), style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, (WIDTH - RIGHT_INDENT - width) * mm, 163 * mm))
 
-        # This is to certify..
+            # Issued ..
 
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-            0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
+            style = derive(
+                styleOpenSansLight, fontSize=12, leading=10,
+                textColor=colors.Color(0.302, 0.306, 0.318), alignment=TA_LEFT,
+            )
 
-        paragraph_string = "This is to certify that"
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 132.5 * mm)
+            paragraph_string = "Issued {0}".format(self.issued_date)
+
+            # Right justified so we compute the width
+            width = stringWidth(
+                paragraph_string,
+                'OpenSans-LightItalic',
+                12,
+            ) / mm
+            paragraph = Paragraph("<i>{0}</i>".format(
+                paragraph_string), style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, (WIDTH - RIGHT_INDENT - width) * mm, 155 * mm))
+
+            # This is to certify..
+
+            paragraph_string = "This is to certify that"
+            paragraph = Paragraph(paragraph_string, style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 132.5 * mm))
+
+            # Successfully completed
+
+            paragraph_string = "successfully completed"
+            if '7.00x' in self.course:
+                paragraph_string = "successfully completed the inaugural offering of"
+            else:
+                paragraph_string = "successfully completed"
+
+            paragraph = Paragraph(paragraph_string, style)
+
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 108 * mm))
+
+            # Course name
+
+            # styleOpenSans.fontName = 'OpenSans-BoldItalic'
+            if 'PH207x' in self.course:
+                font_size, leading = 18, 21
+            elif '4.01x' in self.course:
+                font_size, leading = 20, 10
+            elif 'Stat2.1x' in self.course:
+                font_size, leading = 20, 10
+            elif 'CS191x' in self.course:
+                font_size, leading = 20, 10
+            elif '6.00x' in self.course:
+                font_size, leading = 20, 21
+            elif 'PH278x' in self.course:
+                font_size, leading = 20, 10
+            else:
+                font_size, leading = 24, 10
+            style = derive(
+                styleOpenSans, fontSize=font_size, leading=leading, textColor=colors.Color(0, 0.624, 0.886),
+                alignment=TA_LEFT,
+            )
+
+            paragraph_string = u"<b><i>{0}: {1}</i></b>".format(
+                self.course, self.long_course.decode('utf-8'))
+            paragraph = Paragraph(paragraph_string, style)
+            # paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            if 'PH207x' in self.course:
+                paragraph.wrapOn(c, 180 * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, 91 * mm))
+            elif '6.00x' in self.course:
+                paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, 95 * mm))
+            else:
+                paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, 99 * mm))
+
+            # A course of study..
+
+            style = derive(
+                styleOpenSansLight, fontSize=12, leading=10,
+                textColor=colors.Color(0.302, 0.306, 0.318), alignment=TA_LEFT,
+            )
+
+            paragraph_string = "a course of study offered by <b>{0}</b>" \
+                               ", an online learning<br /><br />initiative of " \
+                               "<b>{1}</b> through <b>edX</b>.".format(
+                                   self.org, self.long_org.decode('utf-8'))
+
+            paragraph = Paragraph(paragraph_string, style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 78 * mm))
+
+            return course_text
+
+        self._draw_course_text(c, layout_course_text)
 
         #  Student name
 
@@ -499,7 +1018,6 @@ class CertificateGen(object):
         # will fall back to Arial if there are
         # unusual characters
         style = styleOpenSans
-        style.leading = 10
         width = stringWidth(student_name.decode('utf-8'), 'OpenSans-Bold', 34) / mm
         paragraph_string = "<b>{0}</b>".format(student_name)
 
@@ -512,104 +1030,26 @@ class CertificateGen(object):
         # We will wrap at 200mm in, so if we reach the end (200-47)
         # decrease the font size
         if width > 153:
-            style.fontSize = 18
+            font_size = 18
             nameYOffset = 121.5
         else:
-            style.fontSize = 34
+            font_size = 34
             nameYOffset = 124.5
 
-        style.textColor = colors.Color(
-            0, 0.624, 0.886)
-        style.alignment = TA_LEFT
+        style = derive(
+            style, fontSize=font_size, leading=10, textColor=colors.Color(0, 0.624, 0.886), alignment=TA_LEFT,
+        )
 
         paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, 200 * mm, 214 * mm)
         paragraph.drawOn(c, LEFT_INDENT * mm, nameYOffset * mm)
 
-        # Successfully completed
-
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-            0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
-
-        paragraph_string = "successfully completed"
-        if '7.00x' in self.course:
-            paragraph_string = "successfully completed the inaugural offering of"
-        else:
-            paragraph_string = "successfully completed"
-
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
-
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 108 * mm)
-
-        # Course name
-
-        # styleOpenSans.fontName = 'OpenSans-BoldItalic'
-        if 'PH207x' in self.course:
-            styleOpenSans.fontSize = 18
-            styleOpenSans.leading = 21
-        elif '4.01x' in self.course:
-            styleOpenSans.fontSize = 20
-            styleOpenSans.leading = 10
-        elif 'Stat2.1x' in self.course:
-            styleOpenSans.fontSize = 20
-            styleOpenSans.leading = 10
-        elif 'CS191x' in self.course:
-            styleOpenSans.fontSize = 20
-            styleOpenSans.leading = 10
-        elif '6.00x' in self.course:
-            styleOpenSans.fontSize = 20
-            styleOpenSans.leading = 21
-        elif 'PH278x' in self.course:
-            styleOpenSans.fontSize = 20
-            styleOpenSans.leading = 10
-        else:
-            styleOpenSans.fontSize = 24
-            styleOpenSans.leading = 10
-        styleOpenSans.textColor = colors.Color(
-            0, 0.624, 0.886)
-        styleOpenSans.alignment = TA_LEFT
-
-        paragraph_string = u"<b><i>{0}: {1}</i></b>".format(
-            self.course, self.long_course.decode('utf-8'))
-        paragraph = Paragraph(paragraph_string, styleOpenSans)
-        # paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        if 'PH207x' in self.course:
-            paragraph.wrapOn(c, 180 * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, 91 * mm)
-        elif '6.00x' in self.course:
-            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, 95 * mm)
-        else:
-            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, 99 * mm)
-
-        # A course of study..
-
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.textColor = colors.Color(
-            0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
-
-        paragraph_string = "a course of study offered by <b>{0}</b>" \
-                           ", an online learning<br /><br />initiative of " \
-                           "<b>{1}</b> through <b>edX</b>.".format(
-                               self.org, self.long_org.decode('utf-8'))
-
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 78 * mm)
-
         # Honor code
 
-        styleOpenSansLight.fontSize = 7
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-            0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_CENTER
+        style = derive(
+            styleOpenSansLight, fontSize=7, leading=10,
+            textColor=colors.Color(0.302, 0.306, 0.318), alignment=TA_CENTER,
+        )
 
         paragraph_string = "HONOR CODE CERTIFICATE<br/>" \
             "*Authenticity of this certificate can be verified at " \
@@ -620,7 +1060,7 @@ class CertificateGen(object):
             verify_url=settings.CERT_VERIFY_URL,
             verify_path=S3_VERIFY_PATH,
             verify_uuid=verify_uuid)
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
+        paragraph = Paragraph(paragraph_string, style)
 
         paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
         paragraph.drawOn(c, 0 * mm, 28 * mm)
@@ -628,25 +1068,10 @@ class CertificateGen(object):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We need a page to overlay on.
-        # So that we don't have to open the template
-        # several times, we open a blank pdf several times instead
-        # (much faster)
-        final_certificate = copy.copy(BLANK_PDFS['landscape-A4']).getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output.addPage(final_certificate)
-
-        self._ensure_dir(filename)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-A4')
 
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
 
         self._generate_verification_page(
             student_name,
@@ -675,8 +1100,7 @@ class CertificateGen(object):
         WIDTH = 279  # width in mm (8.5x11)
         HEIGHT = 216  # height in mm (8.5x11)
 
-        verify_uuid = uuid.uuid4().hex
-        download_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH, uuid=download_uuid, file=filename
@@ -687,10 +1111,10 @@ class CertificateGen(object):
         overlay_pdf_buffer = StringIO.StringIO()
         c = canvas.Canvas(overlay_pdf_buffer, pagesize=landscape(letter))
 
-        styleOpenSans = ParagraphStyle(name="opensans-regular", leading=10,
-                                       fontName='OpenSans-Regular')
-        styleArial = ParagraphStyle(name="arial", leading=10,
-                                    fontName='Arial Unicode')
+        styleOpenSans = paragraph_style(name="opensans-regular", leading=10,
+                                        fontName='OpenSans-Regular')
+        styleArial = paragraph_style(name="arial", leading=10,
+                                     fontName='Arial Unicode')
 
         # Text is overlayed top to bottom
         #   * Issued date (top right corner)
@@ -704,8 +1128,7 @@ class CertificateGen(object):
         # New things below
 
         # STYLE: typeface assets
-        addMapping('AvenirNext-Regular', 0, 0, 'AvenirNext-Regular')
-        addMapping('AvenirNext-DemiBold', 1, 0, 'AvenirNext-DemiBold')
+        FONTS.add_mappings(FONT_MAPPINGS[2])
 
         # STYLE: grid/layout
         LEFT_INDENT = 23  # mm from the left side to write the text
@@ -761,22 +1184,108 @@ class CertificateGen(object):
         html = HTMLParser()
 
         # ELEM: Metacopy
-        styleAvenirNext = ParagraphStyle(name="avenirnext-regular", fontName='AvenirNext-Regular')
+        styleAvenirNext = paragraph_style(
+            name="avenirnext-regular",
+            fontName='AvenirNext-Regular',
+            alignment=TA_LEFT,
+            fontSize=style_type_metacopy_size,
+            leading=style_type_metacopy_leading,
+            textColor=style_color_metadata,
+        )
+
+        # ELEM: Footer
+        styleAvenirFooter = paragraph_style(
+            name="avenirnext-demi",
+            fontName='AvenirNext-DemiBold',
+            alignment=TA_LEFT,
+            fontSize=style_type_footer_size,
+        )
 
-        styleAvenirNext.alignment = TA_LEFT
-        styleAvenirNext.fontSize = style_type_metacopy_size
-        styleAvenirNext.leading = style_type_metacopy_leading
-        styleAvenirNext.textColor = style_color_metadata
+        def layout_course_text():
+            """Lay out everything but the student name and verify url"""
+            course_text = []
+            # ELEM: Metacopy - Title: This is to certify that
+            if self.template_type == 'verified':
+                y_offset = pos_metacopy_title_y
 
-        # ELEM: Metacopy - Title: This is to certify that
-        if self.template_type == 'verified':
-            y_offset = pos_metacopy_title_y
+                paragraph_string = 'This is to certify that'
 
-            paragraph_string = 'This is to certify that'
+                paragraph = Paragraph(paragraph_string, styleAvenirNext)
+                paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, y_offset * mm))
+
+            # ELEM: Metacopy - Achievement: successfully completed and received a passing grade in
+            y_offset = pos_metacopy_achivement_y
+
+            paragraph_string = 'successfully completed and received a passing grade in'
+
+            paragraph = Paragraph("{0}".format(paragraph_string), styleAvenirNext)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, y_offset * mm))
+
+            # ELEM: Course Name
+            y_offset_larger = pos_course_y
+            y_offset_smaller = pos_course_small_y
+
+            color = style_color_name
+            if self.template_type == 'verified':
+                color = v_style_color_course
+
+            paragraph_string = u"{0}: {1}".format(self.course, self.long_course)
+            html_paragraph_string = html.unescape(paragraph_string)
+            larger_width = stringWidth(html_paragraph_string.decode('utf-8'),
+                                       'AvenirNext-DemiBold', style_type_course_size) / mm
+            smaller_width = stringWidth(html_paragraph_string.decode('utf-8'),
+                                        'AvenirNext-DemiBold', style_type_course_small_size) / mm
+
+            if larger_width < MAX_WIDTH:
+                font_size, leading = style_type_course_size, style_type_course_leading
+                y_offset = y_offset_larger
+            elif smaller_width < MAX_WIDTH:
+                font_size, leading = style_type_course_small_size, style_type_course_small_leading
+                y_offset = y_offset_smaller + pos_course_no_wrap_offset_y
+            else:
+                font_size, leading = style_type_course_small_size, style_type_course_small_leading
+                y_offset = y_offset_smaller
+
+            styleAvenirCourseName = paragraph_style(
+                name="avenirnext-demi",
+                fontName='AvenirNext-DemiBold',
+                textColor=color,
+                fontSize=font_size,
+                leading=leading,
+                alignment=TA_LEFT,
+            )
+
+            paragraph = Paragraph(paragraph_string, styleAvenirCourseName)
+
+            paragraph.wrapOn(c, MAX_WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, y_offset * mm))
+
+            # ELEM: Metacopy - Org: a course of study...
+            y_offset = pos_metacopy_org_y
+            paragraph_string = "{2} offered by {0}" \
+                               ", an online learning<br /><br />initiative of " \
+                               "{1} through edX.".format(
+                                   self.org, self.long_org.decode('utf-8'), self.course_association_text)
 
             paragraph = Paragraph(paragraph_string, styleAvenirNext)
             paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, y_offset * mm))
+
+            # ELEM: Footer - Issued on Date
+            x_offset = pos_footer_date_x
+            y_offset = pos_footer_date_y
+            paragraph_string = "Issued {0}".format(self.issued_date)
+            # Right justified so we compute the width
+            paragraph = Paragraph("{0}".format(
+                paragraph_string), styleAvenirFooter)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, y_offset * mm))
+
+            return course_text
+
+        self._draw_course_text(c, layout_course_text)
 
         # ELEM: Student Name
         # default is to use Avenir for the name,
@@ -786,8 +1295,9 @@ class CertificateGen(object):
         y_offset_name_med = pos_name_med_y
         y_offset_name_small = pos_name_small_y
 
-        styleAvenirStudentName = ParagraphStyle(name="avenirnext-demi", fontName='AvenirNext-DemiBold')
-        styleAvenirStudentName.leading = style_type_name_small_size
+        styleAvenirStudentName = paragraph_style(
+            name="avenirnext-demi", fontName='AvenirNext-DemiBold', leading=style_type_name_small_size,
+        )
 
         style = styleAvenirStudentName
 
@@ -817,96 +1327,20 @@ class CertificateGen(object):
 
         # if the name is too long, shrink the font size
         if larger_width < MAX_WIDTH:
-            style.fontSize = style_type_name_size
-            style.leading = style_type_name_leading
+            font_size, leading = style_type_name_size, style_type_name_leading
             y_offset = y_offset_name
         elif smaller_width < MAX_WIDTH:
             y_offset = y_offset_name_med + pos_name_no_wrap_offset_y
-            style.fontSize = style_type_name_med_size
-            style.leading = style_type_name_med_leading
+            font_size, leading = style_type_name_med_size, style_type_name_med_leading
         else:
             y_offset = y_offset_name_small
-            style.fontSize = style_type_name_small_size
-            style.leading = style_type_name_small_leading
-        style.textColor = style_color_name
-        style.alignment = TA_LEFT
+            font_size, leading = style_type_name_small_size, style_type_name_small_leading
+        style = derive(style, fontSize=font_size, leading=leading, textColor=style_color_name, alignment=TA_LEFT)
 
         paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, MAX_WIDTH * mm, HEIGHT * mm)
         paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
 
-        # ELEM: Metacopy - Achievement: successfully completed and received a passing grade in
-        y_offset = pos_metacopy_achivement_y
-
-        paragraph_string = 'successfully completed and received a passing grade in'
-
-        paragraph = Paragraph("{0}".format(paragraph_string), styleAvenirNext)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
-
-        # ELEM: Course Name
-        y_offset_larger = pos_course_y
-        y_offset_smaller = pos_course_small_y
-
-        styleAvenirCourseName = ParagraphStyle(name="avenirnext-demi", fontName='AvenirNext-DemiBold')
-        styleAvenirCourseName.textColor = style_color_name
-        if self.template_type == 'verified':
-            styleAvenirCourseName.textColor = v_style_color_course
-
-        paragraph_string = u"{0}: {1}".format(self.course, self.long_course)
-        html_paragraph_string = html.unescape(paragraph_string)
-        larger_width = stringWidth(html_paragraph_string.decode('utf-8'),
-                                   'AvenirNext-DemiBold', style_type_course_size) / mm
-        smaller_width = stringWidth(html_paragraph_string.decode('utf-8'),
-                                    'AvenirNext-DemiBold', style_type_course_small_size) / mm
-
-        if larger_width < MAX_WIDTH:
-            styleAvenirCourseName.fontSize = style_type_course_size
-            styleAvenirCourseName.leading = style_type_course_leading
-            y_offset = y_offset_larger
-        elif smaller_width < MAX_WIDTH:
-            styleAvenirCourseName.fontSize = style_type_course_small_size
-            styleAvenirCourseName.leading = style_type_course_small_leading
-            y_offset = y_offset_smaller + pos_course_no_wrap_offset_y
-        else:
-            styleAvenirCourseName.fontSize = style_type_course_small_size
-            styleAvenirCourseName.leading = style_type_course_small_leading
-            y_offset = y_offset_smaller
-
-        styleAvenirCourseName.alignment = TA_LEFT
-
-        paragraph = Paragraph(paragraph_string, styleAvenirCourseName)
-
-        paragraph.wrapOn(c, MAX_WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
-
-        # ELEM: Metacopy - Org: a course of study...
-        y_offset = pos_metacopy_org_y
-        paragraph_string = "{2} offered by {0}" \
-                           ", an online learning<br /><br />initiative of " \
-                           "{1} through edX.".format(
-                               self.org, self.long_org.decode('utf-8'), self.course_association_text)
-
-        paragraph = Paragraph(paragraph_string, styleAvenirNext)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
-
-        # ELEM: Footer
-        styleAvenirFooter = ParagraphStyle(name="avenirnext-demi", fontName='AvenirNext-DemiBold')
-
-        styleAvenirFooter.alignment = TA_LEFT
-        styleAvenirFooter.fontSize = style_type_footer_size
-
-        # ELEM: Footer - Issued on Date
-        x_offset = pos_footer_date_x
-        y_offset = pos_footer_date_y
-        paragraph_string = "Issued {0}".format(self.issued_date)
-        # Right justified so we compute the width
-        paragraph = Paragraph("{0}".format(
-            paragraph_string), styleAvenirFooter)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, y_offset * mm)
-
         # ELEM: Footer - Verify Authenticity URL
         y_offset = pos_footer_url_y
         x_offset = pos_footer_url_x
@@ -924,26 +1358,10 @@ class CertificateGen(object):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We need a page to overlay on.
-        # So that we don't have to open the template
-        # several times, we open a blank pdf several times instead
-        # (much faster)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-letter')
 
-        final_certificate = copy.copy(BLANK_PDFS['landscape-letter']).getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output.addPage(final_certificate)
-
-        self._ensure_dir(filename)
-
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
 
         self._generate_verification_page(
             student_name,
@@ -971,8 +1389,7 @@ class CertificateGen(object):
         WIDTH = 279  # width in mm (8.5x11)
         HEIGHT = 216  # height in mm (8.5x11)
 
-        download_uuid = uuid.uuid4().hex
-        verify_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH, uuid=download_uuid, file=filename
@@ -1019,9 +1436,10 @@ class CertificateGen(object):
         y_offset_name_med = pos_name_med_y
         y_offset_name_small = pos_name_small_y
 
-        styleUnicode = ParagraphStyle(name="arial", leading=10, fontName='Arial Unicode')
-        styleGaramondStudentName = ParagraphStyle(name="garamond", fontName='Garamond-Bold')
-        styleGaramondStudentName.leading = style_type_name_small_size
+        styleUnicode = paragraph_style(name="arial", leading=10, fontName='Arial Unicode')
+        styleGaramondStudentName = paragraph_style(
+            name="garamond", fontName='Garamond-Bold', leading=style_type_name_small_size,
+        )
 
         style = styleGaramondStudentName
 
@@ -1043,19 +1461,15 @@ class CertificateGen(object):
 
         # if the name is too long, shrink the font size
         if larger_width < MAX_WIDTH:
-            style.fontSize = style_type_name_size
-            style.leading = style_type_name_leading
+            font_size, leading = style_type_name_size, style_type_name_leading
             y_offset = y_offset_name
         elif smaller_width < MAX_WIDTH:
             y_offset = y_offset_name_med + pos_name_no_wrap_offset_y
-            style.fontSize = style_type_name_med_size
-            style.leading = style_type_name_med_leading
+            font_size, leading = style_type_name_med_size, style_type_name_med_leading
         else:
             y_offset = y_offset_name_small
-            style.fontSize = style_type_name_small_size
-            style.leading = style_type_name_small_leading
-        style.textColor = style_color_name
-        style.alignment = TA_CENTER
+            font_size, leading = style_type_name_small_size, style_type_name_small_leading
+        style = derive(style, fontSize=font_size, leading=leading, textColor=style_color_name, alignment=TA_CENTER)
 
         paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, MAX_WIDTH * mm, HEIGHT * mm)
@@ -1065,41 +1479,22 @@ class CertificateGen(object):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We need a page to overlay on.
-        # So that we don't have to open the template
-        # several times, we open a blank pdf several times instead
-        # (much faster)
-
-        blank_pdf = PdfFileReader(
-            file("{0}/blank-letter.pdf".format(TEMPLATE_DIR), "rb")
-        )
-
-        final_certificate = blank_pdf.getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output.addPage(final_certificate)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-letter')
 
-        self._ensure_dir(filename)
-
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
         return (download_uuid, verify_uuid, download_url)
 
     def _generate_verification_page(self, name, filename, output_dir, verify_uuid, download_url):
         """
-        This generates the gpg signature and the
-        verification files including
+        This queues the certificate to have its gpg
+        signature and verification files made, including
         the static html files that will be seen when
-        the user clicks the verification link.
+        the user clicks the verification link, by
+        _sign_batch along with the rest of its batch.
 
         name - full name of the student
-        filename - path on the local filesystem to the certificate pdf
+        filename - path of the certificate pdf, as saved with _save_artifact
         output_dir - where to write the verification files
         verify_uuid - UUID for the verification files
         download_url - link to the pdf download (for the verifcation page)"""
@@ -1108,22 +1503,67 @@ class CertificateGen(object):
         if not CERT_KEY_ID:
             return
 
+        # Signed along with the rest of its batch by _sign_batch
+        self.pending_verification = (name, filename, output_dir, verify_uuid, download_url)
+
+    def _sign_batch(self, batch):
+        """
+        Sign a batch of certificates and save the verification files of each
+
+        Detached signatures of the PDFs are made with the signer's
+        sign_many, several at once. Merkle signatures are a single signature
+        of the Merkle root of the PDFs' SHA-256 digests, with a proof for
+        each certificate.
+
+        batch is a list of (uuids, artifacts, digests, pending_verification,
+        fingerprint) as kept by create_and_upload_many.
+        """
+        pending = [
+            (artifacts, digests, verification)
+            for (uuids, artifacts, digests, verification, fingerprint) in batch if verification is not None
+        ]
+        if not pending:
+            return
+        if self.signature_mode == 'detached':
+            signatures = get_signer().sign_many(
+                artifacts[verification[1]] for (artifacts, digests, verification) in pending
+            )
+            for (artifacts, digests, verification), signed_data in itertools.izip(pending, signatures):
+                (name, filename, output_dir, verify_uuid, download_url) = verification
+                self.artifacts = artifacts
+                self.digests = digests
+                self._save_verification_files(
+                    name, filename, output_dir, verify_uuid, download_url, '.sig', signed_data
+                )
+            return
+        tree = merkle.MerkleTree([digests[verification[1]][0] for (artifacts, digests, verification) in pending])
+        root_signature = get_signer().sign(tree.root)
+        for index, (artifacts, digests, verification) in enumerate(pending):
+            (name, filename, output_dir, verify_uuid, download_url) = verification
+            self.artifacts = artifacts
+            self.digests = digests
+            proof = merkle.proof_file(digests[filename][0], tree.proof(index), tree.root, root_signature)
+            self._save_verification_files(name, filename, output_dir, verify_uuid, download_url, '.proof', proof)
+
+    def _save_verification_files(self, name, filename, output_dir, verify_uuid, download_url, extension, signed_data):
+        """
+        Save signed_data, the signature (or proof) of the certificate
+        filename, as the filename + extension verification file, and the
+        validation pages that show and link to it
+        """
         prefix = ''
         if self.template_version == 2:
             prefix = 'v2/'
-        valid_template = prefix + 'valid.html'
-        verify_template = prefix + 'verify.html'
-
-        # generate signature
-        signature_filename = os.path.basename(filename) + ".sig"
+        # Proofs are checked differently from signatures, and have pages of their own
+        suffix = ''
+        if extension == '.proof':
+            suffix = '-proof'
+        valid_template = prefix + 'valid' + suffix + '.html'
+        verify_template = prefix + 'verify' + suffix + '.html'
+
+        signature_filename = os.path.basename(filename) + extension
         signature_filename = os.path.join(output_dir, verify_uuid, signature_filename)
-        self._ensure_dir(signature_filename)
-        gpg = gnupg.GPG(homedir=settings.CERT_GPG_DIR)
-        gpg.encoding = 'utf-8'
-        with open(filename) as f:
-            signed_data = gpg.sign(data=f, default_key=CERT_KEY_ID, clearsign=False, detach=True).data
-        with open(signature_filename, 'w') as f:
-            f.write(signed_data.encode('utf-8'))
+        self._save_artifact(signature_filename, signed_data.encode('utf-8'))
 
         # create the validation page
         signature_download_url = "{verify_url}/{verify_path}/{verify_uuid}/{verify_filename}".format(
@@ -1137,78 +1577,167 @@ class CertificateGen(object):
             verify_path=S3_VERIFY_PATH,
             verify_uuid=verify_uuid)
 
-        type_map = {
-            'verified': {'type': 'idverified', 'type_name': 'Verified'},
-            'honor': {'type': 'honorcode', 'type_name': 'Honor Code'},
-        }
-
-        type_map['verified']['explanation'] = (
-            "An ID verified certificate signifies that an edX user has "
-            "agreed to abide by edX's honor code and completed all of the "
-            "required tasks of this course under its guidelines, as well "
-            "as having their photo ID checked to verify their identity."
+        valid_page = self._verification_template(valid_template).render(
+            NAME=name.decode('utf-8'),
+            CERTIFICATE_ID=verify_uuid,
+            SIGNATURE=signed_data,
+            SIG_URL=signature_download_url,
+            VERIFY_URL=verify_page_url,
         )
-        type_map['verified']['img'] = '''
-            <div class="wrapper--img">
-                <img
-                    class="img--idverified"
-                    src="/v2/static/images/logo-idverified.png"
-                    alt="ID Verified Certificate Logo"
-                />
-            </div>
-        '''
-        type_map['honor']['explanation'] = (
-            "An honor code certificate signifies that an edX user has "
-            "agreed to abide by edX's honor code and completed all of the "
-            "required tasks of this course under its guidelines."
+
+        self._save_artifact(os.path.join(output_dir, verify_uuid, "valid.html"), valid_page.encode('utf-8'))
+
+        verify_page = self._verification_template(verify_template).render(
+            NAME=name.decode('utf-8'),
+            SIG_URL=signature_download_url,
+            SIG_FILE=os.path.basename(signature_download_url),
+            VERIFY_URL=verify_page_url,
+            PDF_FILE=os.path.basename(download_url)
         )
-        type_map['honor']['img'] = ""
 
-        with open("{0}/{1}".format(TEMPLATE_DIR, valid_template)) as f:
-            valid_page = f.read().decode('utf-8')
-        valid_page = valid_page.format(
+        self._save_artifact(os.path.join(output_dir, verify_uuid, "verify.html"), verify_page.encode('utf-8'))
+
+    def _draw_course_text(self, page, layout, static_key=None):
+        """
+        Draw the course text laid out by layout() on the page canvas
+
+        layout returns the wrapped paragraphs that are the same on every
+        certificate of the course, as (paragraph, x, y) to draw them at.
+        Picking their fonts, fitting and wrapping them is done once and kept
+        in course_text, so a certificate only draws them; they are laid out
+        again when static_key changes, e.g. when a ROLLING issue date rolls
+        over.
+        """
+        if self.course_text is None or self.course_text[0] != static_key:
+            self.course_text = (static_key, layout())
+        for paragraph, x, y in self.course_text[1]:
+            paragraph.drawOn(page, x, y)
+
+    def _verification_template(self, template_name):
+        """
+        Return the verification page template_name with this course's fields filled in
+
+        The page templates themselves are cached per process by load_template;
+        the course's copy is filled in again only when the template changes.
+        """
+        template = load_template("{0}/{1}".format(TEMPLATE_DIR, template_name))
+        cached = self.verification_templates.get(template_name)
+        if cached is not None and cached[0] is template:
+            return cached[1]
+        cert_type = CERT_TYPES[self.template_type]
+        course_template = template.partial(
             COURSE=self.course.decode('utf-8'),
             COURSE_LONG=self.long_course.decode('utf-8'),
             ORG=self.org.decode('utf-8'),
             ORG_LONG=self.long_org.decode('utf-8'),
-            NAME=name.decode('utf-8'),
-            CERTIFICATE_ID=verify_uuid,
-            SIGNATURE=signed_data,
-            SIG_URL=signature_download_url,
-            VERIFY_URL=verify_page_url,
-            TYPE=type_map[self.template_type]['type'],
-            TYPE_NAME=type_map[self.template_type]['type_name'],
+            TYPE=cert_type['type'],
+            TYPE_NAME=cert_type['type_name'],
             ISSUE_DATE=self.issued_date,
-            IMG=type_map[self.template_type]['img'],
+            IMG=cert_type['img'],
+            CERT_KEY_ID=CERT_KEY_ID,
             CERTS_ARE_CALLED=CERTS_ARE_CALLED.title(),
             CERTS_ARE_CALLED_PLURAL=CERTS_ARE_CALLED_PLURAL.title(),
-            EXPLANATION=type_map[self.template_type]['explanation'],
+            EXPLANATION=cert_type['explanation'],
         )
+        self.verification_templates[template_name] = (template, course_template)
+        return course_template
 
-        with open(os.path.join(
-                output_dir, verify_uuid, "valid.html"), 'w') as f:
-            f.write(valid_page.encode('utf-8'))
-
-        with open("{0}/{1}".format(TEMPLATE_DIR, verify_template)) as f:
-            verify_page = f.read().decode('utf-8').format(
-                NAME=name.decode('utf-8'),
-                SIG_URL=signature_download_url,
-                SIG_FILE=os.path.basename(signature_download_url),
-                CERT_KEY_ID=CERT_KEY_ID,
-                CERTS_ARE_CALLED=CERTS_ARE_CALLED.title(),
-                CERTS_ARE_CALLED_PLURAL=CERTS_ARE_CALLED_PLURAL.title(),
-                VERIFY_URL=verify_page_url,
-                PDF_FILE=os.path.basename(download_url)
-            )
+    def _course_layer(self, blank_pdf):
+        """
+        Return the blank_pdf page with the template merged onto it, as PDF bytes
+
+        Merging the template is the expensive part of assembling a certificate,
+        so it is done once per generator and the serialized result is kept in
+        course_layers; every certificate then only parses it and adds its own
+        overlay.
+        """
+        layer = self.course_layers.get(blank_pdf)
+        if layer is None:
+            page = PdfFileReader(StringIO.StringIO(BLANK_PDFS[blank_pdf])).getPage(0)
+            page.mergePage(self.template_pdf.getPage(0))
+            if self.pdf_engine == 'xobject':
+                # The layer is copied verbatim into every certificate
+                page.compressContentStreams()
+            output = PdfFileWriter()
+            output.addPage(page)
+            layer_buffer = StringIO.StringIO()
+            output.write(layer_buffer)
+            layer = layer_buffer.getvalue()
+            self.course_layers[blank_pdf] = layer
+        return layer
+
+    def _merge_overlay(self, overlay_pdf_buffer, blank_pdf):
+        """Merge a rendered overlay onto the course layer, returning a PdfFileWriter holding the certificate"""
+        if self.pdf_engine == 'xobject':
+            return self._stamp_overlay(overlay_pdf_buffer, blank_pdf)
+        final_certificate = PdfFileReader(StringIO.StringIO(self._course_layer(blank_pdf))).getPage(0)
+        final_certificate.mergePage(PdfFileReader(overlay_pdf_buffer).getPage(0))
+        output = PdfFileWriter()
+        output.addPage(final_certificate)
+        return output
+
+    def _stamp_overlay(self, overlay_pdf_buffer, blank_pdf):
+        """
+        Draw a rendered overlay over the course layer, returning a PdfFileWriter holding the certificate
+
+        Unlike mergePage, this never tokenizes either content stream: the
+        course layer and the overlay are each copied as a Form XObject with
+        its own resources, and the page content just draws one then the other.
+        """
+        layer = PdfFileReader(StringIO.StringIO(self._course_layer(blank_pdf))).getPage(0)
+        overlay = PdfFileReader(overlay_pdf_buffer).getPage(0)
+        output = PdfFileWriter()
 
-        with open(os.path.join(
-                output_dir, verify_uuid, "verify.html"), 'w') as f:
-            f.write(verify_page.encode('utf-8'))
+        final_certificate = PageObject.createBlankPage(None, 0, 0)
+        final_certificate[NameObject('/MediaBox')] = layer.mediaBox
+        if '/Rotate' in layer:
+            final_certificate[NameObject('/Rotate')] = layer['/Rotate']
+        xobjects = DictionaryObject()
+        xobjects[NameObject('/Tpl')] = output._addObject(_form_xobject(layer, layer.mediaBox))
+        xobjects[NameObject('/Ovl')] = output._addObject(_form_xobject(overlay, layer.mediaBox))
+        final_certificate[NameObject('/Resources')][NameObject('/XObject')] = xobjects
+        contents = DecodedStreamObject()
+        contents.setData('q /Tpl Do Q q /Ovl Do Q')
+        final_certificate[NameObject('/Contents')] = output._addObject(contents)
+
+        output.addPage(final_certificate)
+        return output
+
+    def _save_pdf(self, output, filename):
+        """
+        Serialize the PdfFileWriter output as the certificate artifact filename
+
+        The PDF is serialized once and its digests taken once; signing,
+        uploading and the web root copy all share the same bytes.
+        """
+        pdf_buffer = cStringIO.StringIO()
+        output.write(pdf_buffer)
+        data = pdf_buffer.getvalue()
+        self.digests[filename] = storage.file_digests(data)
+        self._save_artifact(filename, data)
+
+    def _save_artifact(self, path, data):
+        """
+        Keep the contents of a generated file for publishing
+
+        The file is only written out to path if keep_files is set; otherwise
+        the certificate files stay in memory until they are published.
+        """
+        self.artifacts[path] = data
+        if self.keep_files:
+            self._ensure_dir(path)
+            with open(path, 'wb') as f:
+                f.write(data)
 
     def _ensure_dir(self, f):
         d = os.path.dirname(f)
         if not os.path.exists(d):
-            os.makedirs(d)
+            try:
+                os.makedirs(d)
+            except OSError:
+                # Another process made it first
+                if not os.path.isdir(d):
+                    raise
 
     def _contains_characters_above(self, string, value):
         """
@@ -1289,8 +1818,9 @@ class CertificateGen(object):
         """
 
         verify_me_p = self.cert_data.get('VERIFY', True)
-        verify_uuid = uuid.uuid4().hex if verify_me_p else ''
-        download_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
+        if not verify_me_p:
+            verify_uuid = ''
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH, uuid=download_uuid, file=filename)
@@ -1301,32 +1831,24 @@ class CertificateGen(object):
         overlay_pdf_buffer = StringIO.StringIO()
         c = canvas.Canvas(overlay_pdf_buffer, pagesize=landscape(A4))
 
-        # 0 0 - normal
-        # 0 1 - italic
-        # 1 0 - bold
-        # 1 1 - italic and bold
-        addMapping('OpenSans-Light', 0, 0, 'OpenSans-Light')
-        addMapping('OpenSans-Regular', 1, 0, 'OpenSans-Bold')
-        addMapping('SourceSansPro-Light', 0, 0, 'SourceSansPro-Light')
-        addMapping('SourceSansPro-Light', 1, 1, 'SourceSansPro-SemiboldItalic')
-        addMapping('SourceSansPro-Regular', 0, 0, 'SourceSansPro-Regular')
-
-        styleArial = ParagraphStyle(
+        FONTS.add_mappings(FONT_MAPPINGS['stanford'])
+
+        styleArial = paragraph_style(
             name="arial",
             leading=10,
             fontName='Arial Unicode',
         )
-        styleOpenSansLight = ParagraphStyle(
+        styleOpenSansLight = paragraph_style(
             name="opensans-light",
             leading=10,
             fontName='OpenSans-Light',
         )
-        styleSourceSansPro = ParagraphStyle(
+        styleSourceSansPro = paragraph_style(
             name="sourcesans-regular",
             leading=10,
             fontName='SourceSansPro-Regular',
         )
-        styleSourceSansProLight = ParagraphStyle(
+        styleSourceSansProLight = paragraph_style(
             name="sourcesans-light",
             leading=10,
             fontName='SourceSansPro-Light',
@@ -1346,38 +1868,41 @@ class CertificateGen(object):
         LEFT_INDENT = 55  # mm from the left side
         DATE_INDENT = 45  # mm from the right side for Date
 
-        # Issued ..
-        style = styleSourceSansProLight
-        style.fontSize = 12
-        style.textColor = standardgray
-        style.alignment = TA_LEFT
+        date_string = get_cert_date(generate_date, self.issued_date)
 
-        paragraph_string = get_cert_date(generate_date, self.issued_date)
+        def layout_course_text():
+            """Lay out the text that is the same on every certificate issued on date_string"""
+            course_text = []
+            # Issued ..
+            style = derive(styleSourceSansProLight, fontSize=12, textColor=standardgray, alignment=TA_LEFT)
 
-        # Right justified so we compute the width
-        width = stringWidth(paragraph_string, 'SourceSansPro-SemiboldItalic', style.fontSize) / mm
-        paragraph = Paragraph("<i><b>{0}</b></i>".format(paragraph_string), style)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, (WIDTH - DATE_INDENT - width) * mm, 159 * mm)
+            paragraph_string = date_string
 
-        # Certify That
-        styleSourceSansPro.fontSize = 14
-        styleSourceSansPro.textColor = standardgray
-        styleSourceSansPro.alignment = TA_LEFT
+            # Right justified so we compute the width
+            width = stringWidth(paragraph_string, 'SourceSansPro-SemiboldItalic', style.fontSize) / mm
+            paragraph = Paragraph("<i><b>{0}</b></i>".format(paragraph_string), style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, (WIDTH - DATE_INDENT - width) * mm, 159 * mm))
 
-        paragraph_string = "This is to certify that,"
+            # Certify That
+            style = derive(styleSourceSansPro, fontSize=14, textColor=standardgray, alignment=TA_LEFT)
 
-        paragraph = Paragraph(paragraph_string, styleSourceSansPro)
+            paragraph_string = "This is to certify that,"
 
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 135 * mm)
+            paragraph = Paragraph(paragraph_string, style)
+
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 135 * mm))
+
+            return course_text
+
+        self._draw_course_text(c, layout_course_text, date_string)
 
         #  Student name
         # default is to use the DejaVu font for the name, will fall back
         # to Arial if there are unusual characters
         style = styleOpenSansLight
-        style.fontSize = 34
-        width = stringWidth(student_name.decode('utf-8'), 'OpenSans-Bold', style.fontSize) / mm
+        width = stringWidth(student_name.decode('utf-8'), 'OpenSans-Bold', 34) / mm
         paragraph_string = "<b>{0}</b>".format(student_name)
 
         if self._use_unicode_font(student_name):
@@ -1389,20 +1914,21 @@ class CertificateGen(object):
         # We will wrap at 200mm in, so if we reach the end (200-47)
         # decrease the font size
         if width > 153:
-            style.fontSize = 18
+            font_size = 18
             nameYOffset = 121.5
         else:
-            style.fontSize = 34
+            font_size = 34
             nameYOffset = 124.5
 
-        style.textColor = standardgray
-        style.alignment = TA_LEFT
+        style = derive(style, fontSize=font_size, textColor=standardgray, alignment=TA_LEFT)
 
         paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, 200 * mm, 214 * mm)
         paragraph.drawOn(c, LEFT_INDENT * mm, nameYOffset * mm)
 
         # Successfully completed
+        style = derive(styleSourceSansPro, fontSize=14, textColor=standardgray, alignment=TA_LEFT)
+
         paragraph_string_interstitial = ' '
         successfully_completed = "has successfully completed{0}a free online offering of"
 
@@ -1414,14 +1940,13 @@ class CertificateGen(object):
             paragraph_string_interstitial = tmp
         paragraph_string = successfully_completed.format(paragraph_string_interstitial)
 
-        paragraph = Paragraph(paragraph_string, styleSourceSansPro)
+        paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
         paragraph.drawOn(c, LEFT_INDENT * mm, 104.5 * mm)
 
         # Honor code
         if verify_me_p:
-            styleSourceSansPro.fontSize = 9
-            styleSourceSansPro.alignment = TA_CENTER
+            style = derive(style, fontSize=9, alignment=TA_CENTER)
             paragraph_string = (
                 "Authenticity of this {cert_label} can be verified at "
                 "<a href='{verify_url}/{verify_path}/{verify_uuid}'>"
@@ -1433,7 +1958,7 @@ class CertificateGen(object):
                 verify_path=S3_VERIFY_PATH,
                 verify_uuid=verify_uuid,
             )
-            paragraph = Paragraph(paragraph_string, styleSourceSansPro)
+            paragraph = Paragraph(paragraph_string, style)
             paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
             # paragraph.drawOn(c, 0 * mm, 31 * mm)
             paragraph.drawOn(c, -275 * mm, 31 * mm)
@@ -1441,23 +1966,10 @@ class CertificateGen(object):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We render the final certificate by merging several rendered pages.
-        # It is fastest if the bottom layer is blank and loaded from memory
-        final_certificate = copy.copy(BLANK_PDFS['landscape-A4']).getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-A4')
 
-        output.addPage(final_certificate)
-
-        self._ensure_dir(filename)
-
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
 
         if verify_me_p:
             self._generate_verification_page(
@@ -1526,7 +2038,7 @@ class CertificateGen(object):
         # All unexplained constants below were selected because they look good
         WIDTH, HEIGHT = landscape(letter)   # values in points, multiply by mm
 
-        download_uuid = uuid.uuid4().hex
+        download_uuid = self._certificate_uuids()[0]
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH,
@@ -1534,7 +2046,6 @@ class CertificateGen(object):
             file=filename,
         )
         filename = os.path.join(download_dir, download_uuid, filename)
-        self._ensure_dir(filename)
 
         # Manipulate student titles
         gets_md_cert = False
@@ -1545,32 +2056,29 @@ class CertificateGen(object):
             student_name = u"{}, {}".format(student_name, designation.decode('utf-8'))
         gets_md_cert = designation in gets_md_cert_list
 
-        #                            0 0 - normal
-        #                            0 1 - italic
-        #                            1 0 - bold
-        #                            1 1 - italic and bold
-        addMapping('OpenSans-Light', 0, 0, 'OpenSans-Light')
-        addMapping('OpenSans-Light', 0, 1, 'OpenSans-LightItalic')
-        addMapping('OpenSans-Light', 1, 0, 'OpenSans-Bold')
-        addMapping('DroidSerif', 0, 0, 'DroidSerif')
-        addMapping('DroidSerif', 0, 1, 'DroidSerif-Italic')
-        addMapping('DroidSerif', 1, 0, 'DroidSerif-Bold')
-        addMapping('DroidSerif', 1, 1, 'DroidSerif-BoldItalic')
-
-        styleArial = ParagraphStyle(name="arial", leading=10, fontName='Arial Unicode', allowWidows=0)
-        styleOpenSansLight = ParagraphStyle(name="opensans-light", leading=10, fontName='OpenSans-Light', allowWidows=0)
-        styleDroidSerif = ParagraphStyle(name="droidserif", leading=10, fontName='DroidSerif', allowWidows=0)
+        FONTS.add_mappings(FONT_MAPPINGS['stanford_cme'])
+
+        styleArial = paragraph_style(name="arial", leading=10, fontName='Arial Unicode', allowWidows=0)
+        styleOpenSansLight = paragraph_style(
+            name="opensans-light", leading=10, fontName='OpenSans-Light', allowWidows=0,
+        )
+        styleDroidSerif = paragraph_style(name="droidserif", leading=10, fontName='DroidSerif', allowWidows=0)
 
         # This file is overlaid on the template certificate
         overlay_pdf_buffer = StringIO.StringIO()
         c = canvas.Canvas(overlay_pdf_buffer, pagesize=landscape(letter))
 
-        def draw_centered_text(text, style, height):
-            """Draw text in style, centered at height mm above origin"""
+        def centered_text(text, style, height):
+            """Return text in style placed centered at height mm above origin"""
             paragraph = Paragraph(text, style)
             # wrap sets the Flowable bounding box. Necessary voodoo.
             paragraph.wrap(WIDTH, HEIGHT)
-            paragraph.drawOn(c, 0, height * mm)
+            return (paragraph, 0, height * mm)
+
+        def draw_centered_text(text, style, height):
+            """Draw text in style, centered at height mm above origin"""
+            paragraph, x, y = centered_text(text, style, height)
+            paragraph.drawOn(c, x, y)
 
         # Text is then overlayed onto it. From top to bottom:
         #   * Student's name
@@ -1589,7 +2097,6 @@ class CertificateGen(object):
         ]
 
         (fonttag, fontfile, style) = font_for_string(fontlist, student_name)
-        style.alignment = TA_CENTER
         width = 9999             # Fencepost width is way too wide
         nameYOffset = 146        # by eye, looks good for 34 pt font
         fontsize = 36            # good default giant text size: 1/2"
@@ -1597,31 +2104,38 @@ class CertificateGen(object):
         max_width = 0.8 * WIDTH  # Keep scaling until <= 80% of page
 
         while width > max_width:
-            style.fontSize = fontsize
+            name_fontsize = fontsize
             width = stringWidth(student_name, fonttag, fontsize)
             if nameYOffset > 140:
                 nameYOffset = nameYOffset - math.floor((36 - fontsize) / 12)
             fontsize -= 1
+        style = derive(style, alignment=TA_CENTER, fontSize=name_fontsize)
 
         draw_centered_text(u"<b>{0}</b>".format(student_name), style, nameYOffset)
 
-        # Enduring material titled
-        style = styleDroidSerif
-        style.alignment = TA_CENTER
-        style.fontSize = 28
-        draw_centered_text(u"<b>{0}</b>".format(self.long_course.decode('utf-8')), style, 119)
+        date_string = get_cert_date(generate_date, self.issued_date)
+
+        def layout_course_text():
+            """Lay out the text that is the same on every certificate issued on date_string"""
+            course_text = []
+            # Enduring material titled
+            style = derive(styleDroidSerif, alignment=TA_CENTER, fontSize=28)
+            course_text.append(centered_text(u"<b>{0}</b>".format(self.long_course.decode('utf-8')), style, 119))
+
+            # Issued on date...
+            style = derive(style, fontSize=26)
+            course_text.append(centered_text(u"<b>{0}</b>".format(date_string), style, 95))
 
-        # Issued on date...
-        style.fontSize = 26
-        paragraph_string = get_cert_date(generate_date, self.issued_date)
-        draw_centered_text(u"<b>{0}</b>".format(paragraph_string), style, 95)
+            return course_text
+
+        self._draw_course_text(c, layout_course_text, date_string)
 
         # Credits statement
         # This is pretty fundamentally not internationalizable; like the rest of the certificate template renderers
         # we do text interpolation that assumes English subject/object relationships. If this language needs to be
         # varied, the best place to do that is probably a forked rendering method. There is some additional
         # information in the documentation.
-        style.fontSize = 18
+        style = derive(styleDroidSerif, alignment=TA_CENTER, fontSize=18)
         credit_info = self.cert_data.get('CREDITS', '')
         if credit_info:
             if gets_md_cert:
@@ -1635,8 +2149,7 @@ class CertificateGen(object):
             draw_centered_text(paragraph_string, style, 80)
 
         # MD/DO vs AHP tags
-        style.fontSize = 8
-        style.alignment = TA_LEFT
+        style = derive(style, fontSize=8, alignment=TA_LEFT)
         if gets_md_cert:
             paragraph_string = "MD/DO"
         else:
@@ -1649,19 +2162,9 @@ class CertificateGen(object):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We render the final certificate by merging several rendered pages.
-        # It's fastest if the bottom layer is a blank page loaded from RAM
-        final_certificate = copy.copy(BLANK_PDFS['landscape-letter']).getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output = PdfFileWriter()
-        output.addPage(final_certificate)
-        with file(filename, "wb") as ostream:
-            output.write(ostream)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-letter')
+        self._save_pdf(output, filename)
 
         return (download_uuid, 'No Verification', download_url)
 
@@ -1710,8 +2213,9 @@ class CertificateGen(object):
         """
 
         verify_me_p = self.cert_data.get('VERIFY', True)
-        verify_uuid = uuid.uuid4().hex if verify_me_p else ''
-        download_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
+        if not verify_me_p:
+            verify_uuid = ''
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
             base_url=settings.CERT_DOWNLOAD_URL,
             cert=S3_CERT_PATH,
@@ -1734,45 +2238,37 @@ class CertificateGen(object):
         STANDARD_GRAY = colors.Color(0.13, 0.14, 0.22)  # Main dark gray text color
         CARDINAL_RED = colors.Color(.55, .08, .08)  # Special red color for course title
 
-        # 0 0 - normal
-        # 0 1 - italic
-        # 1 0 - bold
-        # 1 1 - italic and bold
-        addMapping('OpenSans-Light', 0, 0, 'OpenSans-Light')
-        addMapping('OpenSans-Light', 1, 0, 'OpenSans-Bold')
-        addMapping('SourceSansPro-Regular', 0, 0, 'SourceSansPro-Regular')
-        addMapping('SourceSansPro-Regular', 1, 0, 'SourceSansPro-Bold')
-        addMapping('SourceSansPro-Regular', 1, 1, 'SourceSansPro-BoldItalic')
-
-        styleArial = ParagraphStyle(name="arial", fontName='Arial Unicode')
-        styleOpenSansLight = ParagraphStyle(name="opensans-light", fontName='OpenSans-Light')
-        styleSourceSansPro = ParagraphStyle(name="sourcesans-regular", fontName='SourceSansPro-Regular')
-
-        style_date_text = ParagraphStyle(
+        FONTS.add_mappings(FONT_MAPPINGS['3_dynamic'])
+
+        styleArial = paragraph_style(name="arial", fontName='Arial Unicode')
+        styleOpenSansLight = paragraph_style(name="opensans-light", fontName='OpenSans-Light')
+        styleSourceSansPro = paragraph_style(name="sourcesans-regular", fontName='SourceSansPro-Regular')
+
+        style_date_text = paragraph_style(
             name="date-text",
             fontSize=12,
             leading=14,
             textColor=STANDARD_GRAY,
             alignment=TA_RIGHT,
         )
-        style_big_name_text = ParagraphStyle(
+        style_big_name_text = paragraph_style(
             name="big-name-text",
             textColor=STANDARD_GRAY,
             alignment=TA_LEFT,
         )
-        style_standard_text = ParagraphStyle(
+        style_standard_text = paragraph_style(
             name="standard-text",
             fontSize=14,
             leading=18,
             textColor=STANDARD_GRAY,
             alignment=TA_LEFT,
         )
-        style_big_course_text = ParagraphStyle(
+        style_big_course_text = paragraph_style(
             name="big-course-text",
             textColor=CARDINAL_RED,
             alignment=TA_LEFT,
         )
-        style_small_text = ParagraphStyle(
+        style_small_text = paragraph_style(
             name="small-text",
             fontSize=7.5,
             leading=10,
@@ -1780,21 +2276,12 @@ class CertificateGen(object):
             alignment=TA_LEFT,
         )
 
-        # These are ordered by preference; cf. font_for_string() above
-        fontlist = [
-            ('SourceSansPro-Regular', 'SourceSansPro-Regular.ttf', None),
-            ('OpenSans-Light', 'OpenSans-Light.ttf', None),
-            ('Arial Unicode', 'Arial Unicode.ttf', None),
-        ]
-
         def fontlist_with_style(a_style):
-            """ assign 'a_style' to each font in 'fontlist' """
-            new_fontlist = []
-            for styletag, a_file, dummy_0 in fontlist:
-                new_style = copy.copy(a_style)
-                new_style.fontName = styletag
-                new_fontlist.append((styletag, a_file, new_style))
-            return new_fontlist
+            """ assign 'a_style' to each font in 'V3_FONTLIST' """
+            return [
+                (styletag, a_file, derive(a_style, fontName=styletag))
+                for styletag, a_file, dummy_0 in V3_FONTLIST
+            ]
 
         # Text is overlayed top to bottom with one exception
         #   * Issued date (top right)
@@ -1803,20 +2290,86 @@ class CertificateGen(object):
         #   * Course Title (scaled to fit and centered vertically)
         #   * optional "with *Distinction*." or some other level with optional description
         #   * honor code url at the bottom
+        # The issued date, "has successfully completed", course title and
+        # disclaimer are the same for every learner, so they are only laid out
+        # once per course.
 
         # SECTION: Issued Date
         date_string = u"{0}".format(get_cert_date(generate_date, self.issued_date))
 
-        (fonttag, fontfile, date_style) = font_for_string(fontlist_with_style(style_date_text), date_string)
-        max_width = 125
-        max_height = date_style.fontSize
+        def layout_course_text():
+            """Lay out the text that is the same on every certificate issued on date_string"""
+            course_text = []
+            (fonttag, fontfile, date_style) = font_for_string(fontlist_with_style(style_date_text), date_string)
+            max_width = 125
+            max_height = date_style.fontSize
 
-        paragraph = Paragraph(date_string, date_style)
-        width, height = paragraph.wrapOn(PAGE, max_width, max_height)
+            paragraph = Paragraph(date_string, date_style)
+            width, height = paragraph.wrapOn(PAGE, max_width, max_height)
+
+            # positioning paragraph wrapping box from its bottom left corner
+            # calculating positioning for top right corner of page
+            course_text.append((paragraph, (WIDTH - GUTTER_WIDTH - max_width), (HEIGHT - DATE_INDENT_TOP)))
+
+            # SECTION: Successfully completed
+            successfully_completed = V3_COMPLETED_TEXT
+            (fonttag, fontfile, completed_style) = font_for_string(
+                fontlist_with_style(style_standard_text),
+                successfully_completed,
+            )
+
+            max_height = completed_style.leading
+            max_width = MAX_GEN_WIDTH
+            yOffset = 390     # distance from bottom of page (in points)
+
+            paragraph = Paragraph(successfully_completed, completed_style)
+            width, height = paragraph.wrapOn(PAGE, max_width, max_height)
+
+            course_text.append((paragraph, GUTTER_WIDTH, yOffset))
+
+            # SECTION: Course Title
+            course_title = self._v3_course_title()
+
+            (fonttag, fontfile, course_style) = font_for_string(
+                fontlist_with_style(style_big_course_text), course_title
+            )
+
+            maxFontSize = 36      # good default name text size (in points)
+            max_leading = maxFontSize * 1.1
+            max_height = maxFontSize * 2.1
+            max_width = MAX_GEN_WIDTH
+            minYOffset = 305     # distance from bottom of page (in points)
+
+            paragraph = autoscale_text(
+                PAGE, course_title, maxFontSize, max_leading, max_height, max_width, course_style
+            )
+            width, height = paragraph.wrapOn(PAGE, max_width, max_height)
+
+            yOffset = minYOffset + ((max_height - height) / 2) + (paragraph.style.fontSize / 5)
+
+            course_text.append((paragraph, GUTTER_WIDTH, yOffset))
+
+            # SECTION: disclaimer text
+            print_disclaimer = not self.cert_data.get('HAS_DISCLAIMER', False)
+            disclaimer_text = getattr(settings, 'CERTS_SITE_DISCLAIMER_TEXT', '')
+            if print_disclaimer and disclaimer_text:
+                (fonttag, fontfile, disclaimer_style) = font_for_string(
+                    fontlist_with_style(style_small_text),
+                    disclaimer_text,
+                )
+
+                max_height = disclaimer_style.leading * 3  # allow for up to 9 lines of text
+                max_width = MAX_FULL_WIDTH
+                yOffset = 89  # distance from bottom of page (in points)
+
+                paragraph = Paragraph(disclaimer_text, disclaimer_style)
+                width, height = paragraph.wrapOn(PAGE, max_width, max_height)
+
+                course_text.append((paragraph, GUTTER_WIDTH, yOffset))
 
-        # positioning paragraph wrapping box from its bottom left corner
-        # calculating positioning for top right corner of page
-        paragraph.drawOn(PAGE, (WIDTH - GUTTER_WIDTH - max_width), (HEIGHT - DATE_INDENT_TOP))
+            return course_text
+
+        self._draw_course_text(PAGE, layout_course_text, date_string)
 
         # SECTION: Student name
         student_name_string = u"<b>{0}</b>".format(student_name.decode('utf-8'))
@@ -1840,49 +2393,10 @@ class CertificateGen(object):
         width, height = paragraph.wrapOn(PAGE, max_width, max_height)
 
         yOffset = minYOffset + ((max_height - height) / 2)
-        paragraph.drawOn(PAGE, GUTTER_WIDTH - (name_style.fontSize / 12), yOffset)
-
-        # SECTION: Successfully completed
-        successfully_completed = u"has successfully completed a free online offering of"
-        (fonttag, fontfile, completed_style) = font_for_string(
-            fontlist_with_style(style_standard_text),
-            successfully_completed,
-        )
-
-        max_height = completed_style.leading
-        max_width = MAX_GEN_WIDTH
-        yOffset = 390     # distance from bottom of page (in points)
-
-        paragraph = Paragraph(successfully_completed, completed_style)
-        width, height = paragraph.wrapOn(PAGE, max_width, max_height)
-
-        paragraph.drawOn(PAGE, GUTTER_WIDTH, yOffset)
-
-        # SECTION: Course Title
-        course_name_string = self.long_course.decode('utf-8')
-        course_title = u"<b>{0}</b>".format(course_name_string)
-
-        (fonttag, fontfile, course_style) = font_for_string(fontlist_with_style(style_big_course_text), course_title)
-
-        maxFontSize = 36      # good default name text size (in points)
-        max_leading = maxFontSize * 1.1
-        max_height = maxFontSize * 2.1
-        max_width = MAX_GEN_WIDTH
-        minYOffset = 305     # distance from bottom of page (in points)
-
-        paragraph = autoscale_text(PAGE, course_title, maxFontSize, max_leading, max_height, max_width, course_style)
-        width, height = paragraph.wrapOn(PAGE, max_width, max_height)
-
-        yOffset = minYOffset + ((max_height - height) / 2) + (course_style.fontSize / 5)
-
-        paragraph.drawOn(PAGE, GUTTER_WIDTH, yOffset)
+        paragraph.drawOn(PAGE, GUTTER_WIDTH - (paragraph.style.fontSize / 12), yOffset)
 
         # SECTION: Extra achievements
-        achievements_string = ""
-        achievements_description_string = self.interstitial_texts[grade]
-        if grade and grade.lower() != 'pass':
-            achievements_string = "with <b>{0}</b>.<br /><br />".format(grade)
-        achievements_paragraph = u"{0}{1}".format(achievements_string, achievements_description_string)
+        achievements_paragraph = self._v3_achievements(grade)
 
         (fonttag, fontfile, achievements_style) = font_for_string(
             fontlist_with_style(style_standard_text),
@@ -1900,24 +2414,6 @@ class CertificateGen(object):
 
         paragraph.drawOn(PAGE, GUTTER_WIDTH, yOffset)
 
-        # SECTION: disclaimer text
-        print_disclaimer = not self.cert_data.get('HAS_DISCLAIMER', False)
-        disclaimer_text = getattr(settings, 'CERTS_SITE_DISCLAIMER_TEXT', '')
-        if print_disclaimer and disclaimer_text:
-            (fonttag, fontfile, disclaimer_style) = font_for_string(
-                fontlist_with_style(style_small_text),
-                disclaimer_text,
-            )
-
-            max_height = disclaimer_style.leading * 3  # allow for up to 9 lines of text
-            max_width = MAX_FULL_WIDTH
-            yOffset = 89  # distance from bottom of page (in points)
-
-            paragraph = Paragraph(disclaimer_text, disclaimer_style)
-            width, height = paragraph.wrapOn(PAGE, max_width, max_height)
-
-            paragraph.drawOn(PAGE, GUTTER_WIDTH, yOffset)
-
         # SECTION: Honor code
         if verify_me_p:
             paragraph_string = u"Authenticity of this {cert_label} can be verified at " \
@@ -1947,23 +2443,10 @@ class CertificateGen(object):
         PAGE.showPage()
         PAGE.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We render the final certificate by merging several rendered pages.
-        # It is fastest if the bottom layer is blank and loaded from memory
-        final_certificate = copy.copy(BLANK_PDFS['landscape-A4']).getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output.addPage(final_certificate)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-A4')
 
-        self._ensure_dir(filename)
-
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
 
         # have to create the verification page seperately from the above
         # conditional because filename must have already been written.
@@ -1977,3 +2460,33 @@ class CertificateGen(object):
             )
 
         return (download_uuid, verify_uuid, download_url)
+
+    def _v3_course_title(self):
+        return u"<b>{0}</b>".format(self.long_course.decode('utf-8'))
+
+    def _v3_achievements(self, grade):
+        achievements_string = ""
+        achievements_description_string = self.interstitial_texts[grade]
+        if grade and grade.lower() != 'pass':
+            achievements_string = "with <b>{0}</b>.<br /><br />".format(grade)
+        return u"{0}{1}".format(achievements_string, achievements_description_string)
+
+    def _select_course_fonts(self):
+        """
+        Select the fonts for the 3_dynamic text that is the same for every
+        learner in the course, so that only the student name is left to do
+        for each certificate
+        """
+        texts = [
+            get_cert_date(None, self.issued_date),
+            V3_COMPLETED_TEXT,
+            self._v3_course_title(),
+            getattr(settings, 'CERTS_SITE_DISCLAIMER_TEXT', ''),
+        ]
+        texts.extend(self._v3_achievements(grade) for grade in [None] + self.interstitial_texts.keys())
+        for text in texts:
+            try:
+                font_for_string(V3_FONTLIST, text)
+            except ValueError:
+                # Left for rendering the certificate to report
+                pass
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import copy
 import datetime
 import gnupg
 import math
@@ -14,9 +13,7 @@ from reportlab.platypus import Paragraph
 from PyPDF2 import PdfFileWriter, PdfFileReader
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-from reportlab.lib.fonts import addMapping
 from reportlab.lib.pagesizes import A4, letter, landscape
-from reportlab.lib.styles import ParagraphStyle
 from reportlab.lib.units import mm
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
@@ -37,7 +34,9 @@ from bidi.algorithm import get_display
 import arabic_reshaper
 
 from gen_cert import CertificateGen, S3_CERT_PATH, TARGET_FILENAME, TMP_GEN_DIR, S3_VERIFY_PATH, TEMPLATE_DIR
+from gen_cert import FONT_MAPPINGS, FONTS
 from opaque_keys.edx.keys import CourseKey
+from openedx_certificates.styles import derive, paragraph_style
 
 reportlab.rl_config.warnOnMissingFontGlyphs = 0
 
@@ -53,11 +52,6 @@ class PokCertificateGen(CertificateGen):
                                                 dir_prefix, long_org, long_course, issued_date)
         self.cert_language = self.cert_data.get('CERT_LANGUAGE', 'IT')
 
-
-    def delete_certificate(self, delete_download_uuid, delete_verify_uuid):
-        # TODO remove/archive an existing certificate
-        raise NotImplementedError
-
     def _generate_certificate(
         self,
         student_name,
@@ -105,8 +99,7 @@ class PokCertificateGen(CertificateGen):
         """
         # A4 page size is 297mm x 210mm
         cert_language=self.cert_language
-        verify_uuid = uuid.uuid4().hex
-        download_uuid = uuid.uuid4().hex
+        (download_uuid, verify_uuid) = self._certificate_uuids()
         download_url = "{base_url}/{cert}/{uuid}/{file}".format(
            base_url=settings.CERT_DOWNLOAD_URL,
            cert=S3_CERT_PATH, uuid=download_uuid, file=filename
@@ -126,29 +119,18 @@ class PokCertificateGen(CertificateGen):
         #    font_name = os.path.basename(os.path.splitext(font_file)[0])
         #    pdfmetrics.registerFont(TTFont(font_name, font_file))
 
-        # 0 0 - normal
-        # 0 1 - italic
-        # 1 0 - bold
-        # 1 1 - italic and bold
-
-        addMapping('OpenSans-Light', 0, 0, 'OpenSans-Light')
-        addMapping('OpenSans-Light', 0, 1, 'OpenSans-LightItalic')
-        addMapping('OpenSans-Light', 1, 0, 'OpenSans-Bold')
+        # The POK template uses the version 1 fonts
+        FONTS.add_mappings(FONT_MAPPINGS[1])
 
-        addMapping('OpenSans-Regular', 0, 0, 'OpenSans-Regular')
-        addMapping('OpenSans-Regular', 0, 1, 'OpenSans-Italic')
-        addMapping('OpenSans-Regular', 1, 0, 'OpenSans-Bold')
-        addMapping('OpenSans-Regular', 1, 1, 'OpenSans-BoldItalic')
-
-        styleArial = ParagraphStyle(
+        styleArial = paragraph_style(
            name="arial", leading=10,
            fontName='Arial Unicode'
         )
-        styleOpenSans = ParagraphStyle(
+        styleOpenSans = paragraph_style(
            name="opensans-regular", leading=10,
            fontName='OpenSans-Regular'
         )
-        styleOpenSansLight = ParagraphStyle(
+        styleOpenSansLight = paragraph_style(
            name="opensans-light", leading=10,
            fontName='OpenSans-Light'
         )
@@ -167,55 +149,92 @@ class PokCertificateGen(CertificateGen):
         LEFT_INDENT = 49  # mm from the left side to write the text
         RIGHT_INDENT = 49  # mm from the right side for the CERTIFICATE
 
-        # CERTIFICATE
+        def layout_course_text():
+            """Lay out everything but the student name and honor code url"""
+            course_text = []
+            # CERTIFICATE
 
-        styleOpenSansLight.fontSize = 19
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-           0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
+            style = derive(
+               styleOpenSansLight, fontSize=19, leading=10, textColor=colors.Color(0.302, 0.306, 0.318),
+               alignment=TA_LEFT
+            )
 
-        paragraph_string = "CERTIFICATE" if cert_language == 'EN' else "ATTESTATO DI PARTECIPAZIONE"
+            paragraph_string = "CERTIFICATE" if cert_language == 'EN' else "ATTESTATO DI PARTECIPAZIONE"
 
-        # Right justified so we compute the width
-        width = stringWidth(
-           paragraph_string,
-           'OpenSans-Light', 19) / mm
-        paragraph = Paragraph("{0}".format(
-           paragraph_string), styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, (WIDTH - RIGHT_INDENT - width) * mm, 180 * mm)   # 180 con small, 200 con big
-        # Issued ..
+            # Right justified so we compute the width
+            width = stringWidth(
+               paragraph_string,
+               'OpenSans-Light', 19) / mm
+            paragraph = Paragraph("{0}".format(
+               paragraph_string), style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            # 180 con small, 200 con big
+            course_text.append((paragraph, (WIDTH - RIGHT_INDENT - width) * mm, 180 * mm))
+            # Issued ..
+
+            style = derive(
+               styleOpenSansLight, fontSize=12, leading=10, textColor=colors.Color(0.302, 0.306, 0.318),
+               alignment=TA_LEFT
+            )
+
+            paragraph_string = "{0}".format(self.issued_date)
+
+            # Right justified so we compute the width
+            width = stringWidth(
+               paragraph_string,
+               'OpenSans-LightItalic', 12) / mm
+            paragraph = Paragraph("<i>{0}</i>".format(
+               paragraph_string), style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, (WIDTH - RIGHT_INDENT - width) * mm, 170 * mm))  # 170 con small, 190 con big
 
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-           0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
+            # This is to certify..
 
-        paragraph_string = "{0}".format(self.issued_date)
+            paragraph_string = "This is to certify that" if cert_language == 'EN' else "Si attesta che"
+            paragraph = Paragraph(paragraph_string, style)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 132.5 * mm))
 
-        # Right justified so we compute the width
-        width = stringWidth(
-           paragraph_string,
-           'OpenSans-LightItalic', 12) / mm
-        paragraph = Paragraph("<i>{0}</i>".format(
-           paragraph_string), styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, (WIDTH - RIGHT_INDENT - width) * mm, 170 * mm)  # 170 con small, 190 con big
+            # Successfully completed
 
-        # This is to certify..
+            paragraph_string = ""
+            if cert_language == 'EN':
+                paragraph_string = "successfully completed the course:"
+            else:
+                paragraph_string = "ha partecipato con successo al corso:"
 
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-           0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
+            paragraph = Paragraph(paragraph_string, style)
 
-        paragraph_string = "This is to certify that" if cert_language == 'EN' else "Si attesta che"
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 132.5 * mm)
+            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            course_text.append((paragraph, LEFT_INDENT * mm, 108 * mm))
+
+            # Course name
+            len_name = len(self.long_course)
+
+            # styleOpenSans.fontName = 'OpenSans-BoldItalic'
+            if len_name > 50:
+                leading = 21
+            else:
+                leading = 10
+            style = derive(
+               styleOpenSans, fontSize=24, leading=leading, textColor=colors.Color(0, 0.624, 0.886), alignment=TA_LEFT
+            )
+
+            paragraph_string = u"<b><i>{0}</i></b>".format(
+               self.long_course.decode('utf-8'))
+            # "<b><i>{0}: {1}</i></b>".format(self.course, self.long_course)
+            paragraph = Paragraph(paragraph_string, style)
+            # paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+            if len_name > 50:
+                paragraph.wrapOn(c, 200 * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, 88 * mm))
+            else:
+                paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
+                course_text.append((paragraph, LEFT_INDENT * mm, 99 * mm))
+
+            return course_text
+
+        self._draw_course_text(c, layout_course_text)
 
         #  Student name
 
@@ -223,7 +242,6 @@ class PokCertificateGen(CertificateGen):
         # will fall back to Arial if there are
         # unusual characters
         style = styleOpenSans
-        style.leading = 10
         width = stringWidth(
            student_name.decode('utf-8'),
            'OpenSans-Bold', 34) / mm
@@ -239,72 +257,25 @@ class PokCertificateGen(CertificateGen):
         # We will wrap at 200mm in, so if we reach the end (200-47)
         # decrease the font size
         if width > 153:
-            style.fontSize = 18
+            font_size = 18
             nameYOffset = 121.5
         else:
-            style.fontSize = 34
+            font_size = 34
             nameYOffset = 124.5
 
-        style.textColor = colors.Color(
-           0, 0.624, 0.886)
-        style.alignment = TA_LEFT
+        style = derive(
+           style, fontSize=font_size, leading=10, textColor=colors.Color(0, 0.624, 0.886), alignment=TA_LEFT
+        )
 
         paragraph = Paragraph(paragraph_string, style)
         paragraph.wrapOn(c, 200 * mm, 214 * mm)
         paragraph.drawOn(c, LEFT_INDENT * mm, nameYOffset * mm)
 
-        # Successfully completed
-
-        styleOpenSansLight.fontSize = 12
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-           0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_LEFT
-
-        paragraph_string = ""
-        if cert_language == 'EN':
-            paragraph_string = "successfully completed the course:"
-        else:
-            paragraph_string = "ha partecipato con successo al corso:"
-
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
-
-        paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        paragraph.drawOn(c, LEFT_INDENT * mm, 108 * mm)
-
-        # Course name
-        len_name = len(self.long_course)
-
-        # styleOpenSans.fontName = 'OpenSans-BoldItalic'
-        if len_name > 50:
-            styleOpenSans.fontSize = 24
-            styleOpenSans.leading = 21
-        else:
-            styleOpenSans.fontSize = 24
-            styleOpenSans.leading = 10
-        styleOpenSans.textColor = colors.Color(
-           0, 0.624, 0.886)
-        styleOpenSans.alignment = TA_LEFT
-
-        paragraph_string = u"<b><i>{0}</i></b>".format(
-           self.long_course.decode('utf-8'))
-        # "<b><i>{0}: {1}</i></b>".format(self.course, self.long_course)
-        paragraph = Paragraph(paragraph_string, styleOpenSans)
-        # paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-        if len_name > 50:
-            paragraph.wrapOn(c, 200 * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, 88 * mm)
-        else:
-            paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
-            paragraph.drawOn(c, LEFT_INDENT * mm, 99 * mm)
-
         # Honor code
 
-        styleOpenSansLight.fontSize = 7
-        styleOpenSansLight.leading = 10
-        styleOpenSansLight.textColor = colors.Color(
-           0.302, 0.306, 0.318)
-        styleOpenSansLight.alignment = TA_CENTER
+        style = derive(
+           styleOpenSansLight, fontSize=7, leading=10, textColor=colors.Color(0.302, 0.306, 0.318), alignment=TA_CENTER
+        )
 
         paragraph_string = "HONOR CODE CERTIFICATE<br/>" \
                            "*Authenticity of this certificate can be verified at " \
@@ -316,7 +287,7 @@ class PokCertificateGen(CertificateGen):
            verify_path=S3_VERIFY_PATH,
            verify_uuid=verify_uuid
         )
-        paragraph = Paragraph(paragraph_string, styleOpenSansLight)
+        paragraph = Paragraph(paragraph_string, style)
 
         paragraph.wrapOn(c, WIDTH * mm, HEIGHT * mm)
         paragraph.drawOn(c, 0 * mm, 24 * mm)   # 24 con template small , 5 con big
@@ -326,31 +297,12 @@ class PokCertificateGen(CertificateGen):
         c.showPage()
         c.save()
 
-        # Merge the overlay with the template, then write it to file
-        output = PdfFileWriter()
-        overlay = PdfFileReader(overlay_pdf_buffer)
-
-        # We need a page to overlay on.
-        # So that we don't have to open the template
-        # several times, we open a blank pdf several times instead
-        # (much faster)
-
-        blank_pdf = PdfFileReader(
-           file("{0}/blank.pdf".format(TEMPLATE_DIR), "rb")
-        )
         print "pdf.documentInfo: " + str(self.template_pdf.documentInfo)
 
-        final_certificate = blank_pdf.getPage(0)
-        final_certificate.mergePage(self.template_pdf.getPage(0))
-        final_certificate.mergePage(overlay.getPage(0))
-
-        output.addPage(final_certificate)
-
-        self._ensure_dir(filename)
+        # Merge the overlay onto the blank page and template, then write it to file
+        output = self._merge_overlay(overlay_pdf_buffer, 'landscape-A4')
 
-        outputStream = file(filename, "wb")
-        output.write(outputStream)
-        outputStream.close()
+        self._save_pdf(output, filename)
 
         self._generate_verification_page(
            student_name,
@@ -0,0 +1,70 @@
+import collections
+import threading
+
+
+class LRUCache(object):
+    """
+    LRUCache is a bounded, thread-safe mapping that
+    evicts the least recently used entries first
+
+    It holds at most max_entries entries and, if
+    max_weight is set, at most max_weight total weight,
+    where each entry's weight is given when it is stored
+    (for instance an approximate size in bytes).
+
+    Lookups are counted in hits and misses.
+    """
+
+    def __init__(self, max_entries, max_weight=None):
+        self.max_entries = max_entries
+        self.max_weight = max_weight
+        self.entries = collections.OrderedDict()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the entry for key, marking it most recently used"""
+        with self.lock:
+            try:
+                value, weight = self.entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.entries[key] = (value, weight)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, weight=0):
+        """Store value under key, evicting old entries to make room"""
+        with self.lock:
+            if key in self.entries:
+                self.weight -= self.entries.pop(key)[1]
+            self.entries[key] = (value, weight)
+            self.weight += weight
+            while len(self.entries) > 1 and (
+                    len(self.entries) > self.max_entries or
+                    (self.max_weight is not None and self.weight > self.max_weight)):
+                old_key, (old_value, old_weight) = self.entries.popitem(last=False)
+                self.weight -= old_weight
+                self.evictions += 1
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """Return a dictionary of the cache's counters"""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'weight': self.weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': float(self.hits) / lookups if lookups else 0.0,
+        }
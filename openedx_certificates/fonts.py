@@ -0,0 +1,165 @@
+import hashlib
+import itertools
+import json
+import logging
+import os
+import threading
+from glob import glob
+
+from reportlab.lib.fonts import addMapping
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+
+log = logging.getLogger(__name__)
+
+
+class FontRegistry(object):
+    """
+    FontRegistry registers the TrueType fonts in font_dir with
+    reportlab the first time they are used, rather than all of
+    them up front
+
+    coverage(font_name) gives the code points a font has glyphs
+    for. Coverage is read from each font file once, when it is
+    registered, and kept in index_file (if set) as code point
+    ranges keyed by the file's SHA-1, so later processes can check
+    coverage without parsing the font at all.
+    """
+
+    def __init__(self, font_dir, index_file=None):
+        self.font_files = dict(
+            (os.path.basename(os.path.splitext(font_file)[0]), font_file)
+            for font_file in glob(os.path.join(font_dir, '*.ttf'))
+        )
+        self.index_file = index_file
+        self.index = None
+        self.registered = set()
+        self.coverages = {}
+        self.mapped = set()
+        self.lock = threading.RLock()
+
+    def __contains__(self, font_name):
+        return font_name in self.font_files
+
+    def register(self, font_name):
+        """Register font_name with reportlab if it is one of ours, returning whether it is registered"""
+        if font_name in self.registered:
+            return True
+        with self.lock:
+            if font_name in self.registered:
+                return True
+            font_file = self.font_files.get(font_name)
+            if font_file is None:
+                return False
+            font = TTFont(font_name, font_file)
+            pdfmetrics.registerFont(font)
+            self.registered.add(font_name)
+            if font_name not in self.coverages:
+                self.coverages[font_name] = frozenset(font.face.charToGlyph)
+                self._save_coverage(font_file, self.coverages[font_name])
+            return True
+
+    def coverage(self, font_name):
+        """Return the frozenset of code points font_name has glyphs for, empty if it isn't one of ours"""
+        codepoints = self.coverages.get(font_name)
+        if codepoints is not None:
+            return codepoints
+        with self.lock:
+            if font_name in self.coverages:
+                return self.coverages[font_name]
+            font_file = self.font_files.get(font_name)
+            if font_file is None:
+                return frozenset()
+            ranges = self._load_index().get(_file_digest(font_file))
+            if ranges is None:
+                self.register(font_name)
+            else:
+                self.coverages[font_name] = frozenset(
+                    itertools.chain.from_iterable(xrange(start, end + 1) for start, end in ranges)
+                )
+            return self.coverages[font_name]
+
+    def add_mappings(self, mappings):
+        """
+        Add each (family, bold, italic, font_name) of mappings to reportlab's font
+        mappings, unless the same mappings have been added already
+
+        Registering a TrueType font maps its whole family to itself, so the
+        fonts are registered before the mappings are added, or their first
+        use would undo them.
+        """
+        mappings = tuple(mappings)
+        if mappings in self.mapped:
+            return
+        with self.lock:
+            if mappings in self.mapped:
+                return
+            for family, bold, italic, font_name in mappings:
+                self.register(family)
+                self.register(font_name)
+            for mapping in mappings:
+                addMapping(*mapping)
+            self.mapped.add(mappings)
+
+    def install(self):
+        """Have reportlab register our fonts when it is first asked for one it doesn't know"""
+        find_font_and_register = pdfmetrics.findFontAndRegister
+
+        def register_on_demand(font_name):
+            if self.register(font_name):
+                return pdfmetrics.getFont(font_name)
+            return find_font_and_register(font_name)
+
+        pdfmetrics.findFontAndRegister = register_on_demand
+
+    def _load_index(self):
+        if self.index is None:
+            self.index = self._read_index()
+        return self.index
+
+    def _read_index(self):
+        if self.index_file and os.path.exists(self.index_file):
+            try:
+                with open(self.index_file) as f:
+                    return json.load(f)
+            except (IOError, ValueError) as e:
+                log.warning("Ignoring unreadable font index {0}: {1}".format(self.index_file, e))
+        return {}
+
+    def _save_coverage(self, font_file, codepoints):
+        index = self._load_index()
+        index[_file_digest(font_file)] = _ranges(codepoints)
+        if not self.index_file:
+            return
+        # Keep what other processes have added since we read the index
+        merged = self._read_index()
+        merged.update(index)
+        # Write a new file and rename it over the old one, so that other
+        # processes never read a half-written index
+        tmp_file = '{0}.{1}.tmp'.format(self.index_file, os.getpid())
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(merged, f)
+            os.rename(tmp_file, self.index_file)
+        except (IOError, OSError) as e:
+            log.warning("Unable to write font index {0}: {1}".format(self.index_file, e))
+
+
+def _file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), ''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _ranges(codepoints):
+    """Return sorted code points as a list of [start, end] runs"""
+    ranges = []
+    for codepoint in sorted(codepoints):
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return ranges
@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+
+
+log = logging.getLogger(__name__)
+
+
+class Manifest(object):
+    """
+    Manifest records what was last published for each certificate,
+    so that one whose inputs haven't changed isn't made again
+
+    Entries are small JSON documents keyed by a certificate's
+    (deterministic) download UUID, each kept in its own file under
+    root, so that processes sharing the manifest never rewrite each
+    other's entries.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def get(self, key):
+        """Return the entry for key, or None if there is none (or it can't be read)"""
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except IOError:
+            return None
+        except ValueError as e:
+            log.warning("Ignoring unreadable manifest entry {0}: {1}".format(key, e))
+            return None
+
+    def put(self, key, entry):
+        """Record entry for key"""
+        path = self._path(key)
+        # Write a new file and rename it over the old one, so that other
+        # processes never read a half-written entry
+        tmp_file = '{0}.{1}.tmp'.format(path, os.getpid())
+        if not os.path.isdir(self.root):
+            try:
+                os.makedirs(self.root)
+            except OSError:
+                # Another process may have just made it
+                pass
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump(entry, f)
+            os.rename(tmp_file, path)
+        except (IOError, OSError) as e:
+            log.warning("Unable to write manifest entry {0}: {1}".format(path, e))
+
+    def remove(self, key):
+        """Forget the entry for key, if there is one"""
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def _path(self, key):
+        return os.path.join(self.root, '{0}.json'.format(key))
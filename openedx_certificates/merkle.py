@@ -0,0 +1,84 @@
+import hashlib
+import json
+
+
+# Leaves and nodes are hashed with different prefixes, so that a node can't
+# be passed off as a leaf
+LEAF_PREFIX = '\x00'
+NODE_PREFIX = '\x01'
+
+
+class MerkleTree(object):
+    """
+    MerkleTree is a SHA-256 hash tree over a list of SHA-256 hex digests,
+    such as the digests of a batch of certificate PDFs
+
+    Each leaf is SHA-256(0x00 || digest) and each node SHA-256(0x01 ||
+    left || right); the last node of a level with an odd number of them
+    is carried up to the next level as it is. Signing the root vouches
+    for every digest in the tree, and proof(index) gives the sibling
+    hashes that lead from one of them to the root.
+    """
+
+    def __init__(self, digests):
+        if not digests:
+            raise ValueError("A Merkle tree needs at least one digest")
+        level = [_hash(LEAF_PREFIX, digest.decode('hex')) for digest in digests]
+        self.levels = [level]
+        while len(level) > 1:
+            level = [
+                _hash(NODE_PREFIX, *level[i:i + 2]) if i + 1 < len(level) else level[i]
+                for i in xrange(0, len(level), 2)
+            ]
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        """The hex digest of the root of the tree"""
+        return self.levels[-1][0].encode('hex')
+
+    def proof(self, index):
+        """Return the path from the index'th digest to the root, as a list of ('left' or 'right', sibling hex digest)"""
+        proof = []
+        for level in self.levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append(('left' if sibling < index else 'right', level[sibling].encode('hex')))
+            index //= 2
+        return proof
+
+
+def proof_root(digest, proof):
+    """Return the hex digest of the root that proof leads to from digest"""
+    node = _hash(LEAF_PREFIX, digest.decode('hex'))
+    for side, sibling in proof:
+        if side == 'left':
+            node = _hash(NODE_PREFIX, sibling.decode('hex'), node)
+        else:
+            node = _hash(NODE_PREFIX, node, sibling.decode('hex'))
+    return node.encode('hex')
+
+
+def proof_file(digest, proof, root, root_signature):
+    """
+    Return the JSON document that shows the file with SHA-256 digest was
+    signed as part of the tree with root, whose detached signature (of the
+    root hex digest) is root_signature
+    """
+    return json.dumps(
+        {
+            'sha256': digest,
+            'proof': proof,
+            'root': root,
+            'root_signature': root_signature,
+        },
+        indent=2,
+        sort_keys=True,
+    )
+
+
+def _hash(prefix, *parts):
+    digest = hashlib.sha256(prefix)
+    for part in parts:
+        digest.update(part)
+    return digest.digest()
@@ -0,0 +1,76 @@
+import os
+import string
+import threading
+
+
+_formatter = string.Formatter()
+
+
+class PageTemplate(object):
+    """
+    PageTemplate is a str.format template split up front into
+    literal chunks and substitution fields
+
+    render(**fields) gives the same result as text.format(**fields)
+    without parsing the template again. partial(**fields) fills in
+    some of the fields and returns a smaller template for the rest,
+    for values that are the same for many pages.
+    """
+
+    def __init__(self, text=None, chunks=None):
+        if chunks is None:
+            chunks = list(_formatter.parse(text))
+        self.chunks = chunks
+
+    def partial(self, **fields):
+        """Return a template with the given fields filled in and the others left as slots"""
+        chunks = []
+        pending = []
+        for literal, field_name, format_spec, conversion in self.chunks:
+            pending.append(literal)
+            if field_name is None:
+                continue
+            if field_name.split('.')[0].split('[')[0] in fields:
+                pending.append(self._field(fields, field_name, format_spec, conversion))
+            else:
+                chunks.append((u''.join(pending), field_name, format_spec, conversion))
+                pending = []
+        if pending:
+            chunks.append((u''.join(pending), None, None, None))
+        return PageTemplate(chunks=chunks)
+
+    def render(self, **fields):
+        """Return the template with every field filled in"""
+        parts = []
+        for literal, field_name, format_spec, conversion in self.chunks:
+            parts.append(literal)
+            if field_name is not None:
+                parts.append(self._field(fields, field_name, format_spec, conversion))
+        return u''.join(parts)
+
+    def _field(self, fields, field_name, format_spec, conversion):
+        value = _formatter.get_field(field_name, (), fields)[0]
+        value = _formatter.convert_field(value, conversion)
+        return _formatter.format_field(value, format_spec)
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def load_template(path):
+    """
+    Return the PageTemplate for the utf-8 file at path
+
+    Templates are read and parsed once per process, and read again
+    only when the file's mtime changes.
+    """
+    mtime = os.stat(path).st_mtime
+    cached = _templates.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path) as f:
+        template = PageTemplate(f.read().decode('utf-8'))
+    with _templates_lock:
+        _templates[path] = (mtime, template)
+    return template
@@ -0,0 +1,102 @@
+import collections
+import logging
+import random
+import time
+
+from requests.exceptions import ConnectionError, Timeout
+
+from openedx_certificates.queue_xqueue import QueueEmpty
+
+
+log = logging.getLogger(__name__)
+
+
+class PollScheduler(object):
+    """
+    PollScheduler decides when to ask the xqueue server for work
+
+    While submissions keep coming back it pulls them directly, without
+    asking for the queue length first. Once the queue runs dry it falls
+    back to polling the queue length, waiting exponentially longer
+    (with jitter) between polls up to max_interval, and goes back to
+    pulling directly as soon as work shows up again. Connection
+    problems are backed off from the same way instead of stopping
+    the agent.
+
+    With prefetch > 1, an empty local buffer is refilled with up to
+    prefetch submissions at once (see XQueuePullManager.get_submissions),
+    spending at most prefetch_timeout seconds on it.
+
+    The time from the queue going idle to the next submission being
+    picked up is recorded in idle_latencies (most recent last).
+    """
+
+    def __init__(self, manager, min_interval, max_interval, jitter=0.2, clock=time.time,
+                 prefetch=1, prefetch_timeout=2):
+        self.manager = manager
+        self.prefetch = prefetch
+        self.prefetch_timeout = prefetch_timeout
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.clock = clock
+        self.busy = False
+        self.idle_polls = 0
+        self.idle_since = clock()
+        self.idle_latencies = collections.deque(maxlen=100)
+
+    def get_submission(self):
+        """
+        Return the next submission, or None if the queue is idle
+
+        When None is returned the caller should wait delay() seconds
+        before trying again.
+        """
+        try:
+            return self._next_submission()
+        except (ConnectionError, Timeout) as e:
+            log.error("Unable to reach {0}, backing off: {1}".format(str(self.manager), e))
+            self.busy = False
+            self.idle_polls += 1
+            return None
+
+    def _next_submission(self):
+        if not self.busy:
+            if self.manager.get_length() == 0:
+                self.idle_polls += 1
+                log.debug("{0} has no jobs".format(str(self.manager)))
+                return None
+            self.busy = True
+
+        certdata = self._pull()
+        if certdata is None:
+            self.busy = False
+            self.idle_polls = 0
+            self.idle_since = self.clock()
+            return None
+
+        if self.idle_since is not None:
+            latency = self.clock() - self.idle_since
+            self.idle_latencies.append(latency)
+            log.info("{0} picked up work {1:.2f}s after going idle".format(str(self.manager), latency))
+            self.idle_since = None
+            self.idle_polls = 0
+        return certdata
+
+    def _pull(self):
+        """Pull the next submission, returning None if the queue is empty"""
+        if self.prefetch > 1 and not self.manager.buffer:
+            deadline = self.clock() + self.prefetch_timeout
+            if self.manager.get_submissions(self.prefetch, deadline) == 0:
+                return None
+        try:
+            return self.manager.get_submission()
+        except QueueEmpty:
+            return None
+
+    def delay(self):
+        """Seconds to wait before the next poll"""
+        if self.busy:
+            return 0
+        interval = min(self.max_interval, self.min_interval * (2 ** min(self.idle_polls, 16)))
+        return interval * random.uniform(1 - self.jitter, 1)
@@ -1,30 +1,56 @@
+import collections
 import json
 import logging
+import os
+import Queue
+import threading
+import time
+from multiprocessing.pool import ThreadPool
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, Timeout
 
 
 log = logging.getLogger(__name__)
 
 
+class QueueEmpty(Exception):
+    """Raised by get_submission when the queue has nothing to hand out"""
+    pass
+
+
 class XQueuePullManager(object):
     """
     XQueuePullManager provides an interface to
     the xqueue server for the pull interface
 
     Methods for getting the queue length,
-    retrieving a single item from the queue
-    and posting a response.
+    retrieving a single item (or prefetching
+    several) from the queue and posting a response.
+
+    Requests go through a pooled session with
+    connect and read timeouts (in seconds), and
+    the manager logs in again if the xqueue
+    session expires.
     """
 
-    def __init__(self, queue_url, queue_name, queue_auth_user, queue_auth_pass, queue_user, queue_pass):
+    def __init__(self, queue_url, queue_name, queue_auth_user, queue_auth_pass, queue_user, queue_pass,
+                 prefetch_threads=4, pool_size=10, keep_alive=True, connect_timeout=5, read_timeout=30):
         self.url = queue_url
         self.queue_name = queue_name
         self.auth_user = queue_auth_user
         self.auth_pass = queue_auth_pass
         self.queue_user = queue_user
         self.queue_pass = queue_pass
+        self.prefetch_threads = prefetch_threads
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.login_lock = threading.Lock()
+        self.prefetch_pool = None
+        # submissions pulled by get_submissions but not yet handed out
+        self.buffer = collections.deque()
         self._login()
 
     def _login(self):
@@ -33,27 +59,70 @@ class XQueuePullManager(object):
         """
 
         try:
-            self.session = requests.Session()
-            self.session.auth = (self.auth_user, self.auth_pass)
-            request = self.session.post('{0}/xqueue/login/'.format(self.url),
-                                        data={'username': self.queue_user,
-                                              'password': self.queue_pass})
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if not self.keep_alive:
+                session.headers['Connection'] = 'close'
+            session.auth = (self.auth_user, self.auth_pass)
+            request = session.post('{0}/xqueue/login/'.format(self.url),
+                                   data={'username': self.queue_user,
+                                         'password': self.queue_pass},
+                                   timeout=self.timeout)
             response = json.loads(request.text)
             if response['return_code'] != 0:
                 raise Exception("Invalid return code in reply resp:{0}".format(
                     str(response)))
+            self.session = session
         except (Exception, ConnectionError, Timeout) as e:
             log.critical("Unable to connect to queue xqueue: {0}".format(e))
             raise
 
+    def _request(self, method, path, **kwargs):
+        """
+        Make a request to the xqueue server, logging
+        in again once if the session has expired
+        """
+
+        session = self.session
+        request = session.request(method, '{0}{1}'.format(self.url, path),
+                                  timeout=self.timeout, **kwargs)
+        if not self._login_required(request):
+            return request
+
+        with self.login_lock:
+            # Another thread may already have logged in again
+            if self.session is session:
+                log.warning("xqueue session expired, logging in again")
+                self._login()
+        return self.session.request(method, '{0}{1}'.format(self.url, path),
+                                    timeout=self.timeout, **kwargs)
+
+    @staticmethod
+    def _login_required(request):
+        """
+        Whether xqueue turned the request away for lack of a session
+
+        Expired sessions are redirected to the login view,
+        which answers a GET with a 'login_required' reply.
+        """
+
+        try:
+            response = json.loads(request.text)
+            return response['return_code'] != 0 and response['content'] == 'login_required'
+        except (ValueError, KeyError, TypeError):
+            return False
+
     def get_length(self):
         """
-        Returns the length of the queue
+        Returns the length of the queue, including
+        submissions already buffered locally
         """
 
         try:
-            request = self.session.get('{0}/xqueue/get_queuelen/'.format(
-                self.url), params={'queue_name': self.queue_name})
+            request = self._request('get', '/xqueue/get_queuelen/',
+                                    params={'queue_name': self.queue_name})
             response = json.loads(request.text)
             if response['return_code'] != 0:
                 raise Exception("Invalid return code in reply")
@@ -62,17 +131,79 @@ class XQueuePullManager(object):
             log.critical("Unable to get queue length: {0}".format(e))
             raise
 
-        return length
+        return length + len(self.buffer)
 
     def get_submission(self):
         """
         Gets a single submission from the xqueue
         server and returns the payload as a dictionary
+
+        Submissions buffered by get_submissions are
+        handed out first.
+
+        Raises QueueEmpty if there was nothing to get.
+        """
+
+        if self.buffer:
+            return self.buffer.popleft()
+        return self._pull_submission()
+
+    def get_submissions(self, max_items, deadline=None):
+        """
+        Fills the local buffer with up to max_items submissions
+
+        Submissions are pulled with up to prefetch_threads
+        concurrent requests over the session, until the queue
+        is empty, the buffer holds max_items or time.time()
+        passes deadline. Returns the number of buffered
+        submissions.
+
+        Buffered submissions have already been handed out
+        by the xqueue server; if the agent dies before
+        replying they are only retried once xqueue gives
+        up on them.
+        """
+
+        if self.prefetch_pool is None:
+            self.prefetch_pool = ThreadPool(self.prefetch_threads)
+
+        while len(self.buffer) < max_items:
+            if deadline is not None and time.time() >= deadline:
+                break
+            wanted = min(max_items - len(self.buffer), self.prefetch_threads)
+            pulled = self.prefetch_pool.map(self._try_pull_submission, range(wanted))
+            # Keep everything that was pulled before reporting any failure,
+            # those submissions have already left the server
+            self.buffer.extend(certdata for certdata, error in pulled if certdata is not None)
+            errors = [error for certdata, error in pulled if error is not None]
+            if errors:
+                raise errors[0]
+            if any(certdata is None for certdata, error in pulled):
+                break
+
+        return len(self.buffer)
+
+    def _try_pull_submission(self, dummy_index):
+        """
+        Pull a single submission for get_submissions
+
+        Returns a (submission, exception) tuple, submission
+        is None if the queue was empty or the pull failed.
         """
 
         try:
-            request = self.session.get('{0}/xqueue/get_submission/'.format(
-                self.url), params={'queue_name': self.queue_name})
+            return (self._pull_submission(), None)
+        except QueueEmpty:
+            return (None, None)
+        except Exception as e:
+            return (None, e)
+
+    def _pull_submission(self):
+        """Gets a single submission from the xqueue server"""
+
+        try:
+            request = self._request('get', '/xqueue/get_submission/',
+                                    params={'queue_name': self.queue_name})
         except (ConnectionError, Timeout) as e:
             log.critical("Unable to get submission from queue xqueue: {0}".format(e))
             raise
@@ -80,12 +211,16 @@ class XQueuePullManager(object):
         try:
             response = json.loads(request.text)
             log.debug('response from get_submission: {0}'.format(response))
+            if response['return_code'] != 0 and 'is empty' in response['content']:
+                raise QueueEmpty(response['content'])
             if response['return_code'] != 0:
                 log.critical("response: {0}".format(request.text))
                 raise Exception("Invalid return code in reply")
 
             return json.loads(response['content'])
 
+        except QueueEmpty:
+            raise
         except (Exception, ValueError, KeyError) as e:
             log.critical("Unable to parse xqueue message: {0} response: {1}".format(e, request.text))
             raise
@@ -94,8 +229,7 @@ class XQueuePullManager(object):
         """Post xqueue_reply to qserver for posting back to LMS"""
 
         try:
-            request = self.session.post('{0}/xqueue/put_result/'.format(
-                self.url), data=xqueue_reply)
+            request = self._request('post', '/xqueue/put_result/', data=xqueue_reply)
             log.info('Response: {0}'.format(request.text))
 
         except (ConnectionError, Timeout) as e:
@@ -108,3 +242,138 @@ class XQueuePullManager(object):
 
     def __str__(self):
         return self.url
+
+
+class XQueueReplySender(object):
+    """
+    XQueueReplySender posts replies to the xqueue
+    server from a background thread
+
+    send() puts a reply in a bounded outbox and only
+    blocks while the outbox is full. Replies that fail
+    with ConnectionError or Timeout are retried with
+    exponential backoff; replies still unsent when the
+    sender is closed are appended to the journal file,
+    and replay() posts them on the next start.
+
+    xqueue takes a single reply per put_result request,
+    so the outbox is drained one request at a time.
+    """
+
+    _STOP = object()
+
+    def __init__(self, manager, journal=None, outbox_size=100, retries=5, backoff=1):
+        self.manager = manager
+        self.journal = journal
+        self.retries = retries
+        self.backoff = backoff
+        self.outbox = Queue.Queue(outbox_size)
+        self.unsent = []
+        # Guards unsent and closed: once closed, a reply the thread
+        # still fails to post is journaled by the thread itself
+        self.lock = threading.Lock()
+        self.closed = False
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._run, name='xqueue-replies')
+        self.thread.daemon = True
+
+    def start(self):
+        """Start posting queued replies"""
+        self.thread.start()
+
+    def send(self, xqueue_reply):
+        """Queue xqueue_reply for posting back to the LMS"""
+        self.outbox.put(xqueue_reply)
+
+    def close(self, timeout=30):
+        """
+        Stop the sender once the outbox has drained, giving
+        up on retries after timeout seconds, and journal
+        anything that could not be posted
+        """
+        if self.thread.is_alive():
+            self.outbox.put(self._STOP)
+            self.thread.join(timeout)
+            self.stopping.set()
+            self.thread.join(max(self.backoff, 1))
+
+        with self.lock:
+            self.closed = True
+            while True:
+                try:
+                    xqueue_reply = self.outbox.get_nowait()
+                except Queue.Empty:
+                    break
+                if xqueue_reply is not self._STOP:
+                    self.unsent.append(xqueue_reply)
+            if self.thread.is_alive():
+                # Let the thread stop once it is done with its last reply
+                self.outbox.put_nowait(self._STOP)
+
+            if self.unsent:
+                log.critical("Journaling {0} unsent replies to {1}".format(len(self.unsent), self.journal))
+                self._write_journal(self.unsent, 'a')
+                self.unsent = []
+
+    def replay(self):
+        """
+        Post the replies journaled by a previous run
+
+        Replies that still can't be posted because of
+        connection problems stay in the journal.
+        """
+        if not self.journal or not os.path.exists(self.journal):
+            return
+
+        with open(self.journal) as f:
+            replies = [json.loads(line) for line in f if line.strip()]
+        log.info("Replaying {0} journaled replies from {1}".format(len(replies), self.journal))
+
+        unsent = [xqueue_reply for xqueue_reply in replies if not self._post(xqueue_reply)]
+        if unsent:
+            self._write_journal(unsent, 'w')
+        else:
+            os.remove(self.journal)
+
+    def _run(self):
+        while True:
+            xqueue_reply = self.outbox.get()
+            if xqueue_reply is self._STOP:
+                break
+            if not self._post(xqueue_reply):
+                with self.lock:
+                    if self.closed:
+                        # close() gave up waiting for us and has journaled the rest
+                        log.critical("Journaling unsent reply to {0}".format(self.journal))
+                        self._write_journal([xqueue_reply], 'a')
+                    else:
+                        self.unsent.append(xqueue_reply)
+
+    def _post(self, xqueue_reply):
+        """
+        Post a single reply, retrying connection problems
+
+        Returns False if the reply should be tried again
+        later; replies xqueue rejects are logged and dropped.
+        """
+        for attempt in range(self.retries + 1):
+            if attempt:
+                if self.stopping.wait(self.backoff * 2 ** (attempt - 1)):
+                    return False
+            try:
+                self.manager.respond(xqueue_reply)
+                return True
+            except (ConnectionError, Timeout) as e:
+                log.warning("Attempt {0} to post reply failed: {1}".format(attempt + 1, e))
+            except Exception as e:
+                log.critical("Dropping reply rejected by xqueue: {0} reply: {1}".format(e, xqueue_reply))
+                return True
+        return False
+
+    def _write_journal(self, replies, mode):
+        if not self.journal:
+            log.critical("No journal configured, dropping replies: {0}".format(replies))
+            return
+        with open(self.journal, mode) as f:
+            for xqueue_reply in replies:
+                f.write(json.dumps(xqueue_reply) + '\n')
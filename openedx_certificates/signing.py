@@ -0,0 +1,74 @@
+import cStringIO
+import logging
+from multiprocessing.pool import ThreadPool
+
+import gnupg
+
+
+log = logging.getLogger(__name__)
+
+
+class GnuPGSigner(object):
+    """
+    GnuPGSigner makes detached signatures with gpg, reusing
+    one GPG handle (and so one keyring load) for every signature
+
+    With use_agent, gpg asks gpg-agent for the secret key, so a
+    passphrase-protected key is only unlocked once for the life of
+    the agent. The signing key is looked up when the signer is
+    created, so a missing key shows up at startup rather than
+    on the first certificate.
+
+    sign_many signs a batch of documents with up to workers gpg
+    processes running at once.
+
+    Documents are given to gnupg as a stream over their bytes: it copies
+    a string into a stream of its own, and puts its repr in a log message
+    first, which for a PDF costs more than the rest of signing it.
+    """
+
+    def __init__(self, homedir, key_id, use_agent=False, workers=4, binary=None):
+        self.key_id = key_id
+        self.workers = workers
+        self.gpg = gnupg.GPG(binary=binary, homedir=homedir, use_agent=use_agent)
+        self.gpg.encoding = 'utf-8'
+        self.pool = None
+        secret_keys = self.gpg.list_keys(secret=True)
+        if not any(key['fingerprint'].endswith(key_id.upper()) for key in secret_keys):
+            log.warning("Signing key {0} not found in {1}".format(key_id, homedir))
+
+    def sign(self, data):
+        """Return an armored detached signature of data (a string or file)"""
+        if isinstance(data, str):
+            data = cStringIO.StringIO(data)
+        return self.gpg.sign(data=data, default_key=self.key_id, clearsign=False, detach=True).data
+
+    def sign_many(self, documents):
+        """Return detached signatures for each of documents, in order"""
+        documents = list(documents)
+        if len(documents) < 2 or self.workers < 2:
+            return [self.sign(data) for data in documents]
+        if self.pool is None:
+            self.pool = ThreadPool(self.workers)
+        return self.pool.map(self.sign, documents)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+# Signing backends by name, for CERT_SIGNER
+SIGNERS = {
+    'gnupg': GnuPGSigner,
+}
+
+
+def make_signer(backend, **options):
+    """Return a signer of the given backend, created with options"""
+    try:
+        signer_class = SIGNERS[backend]
+    except KeyError:
+        raise ValueError("Unknown signing backend {0}".format(backend))
+    return signer_class(**options)
@@ -0,0 +1,338 @@
+import base64
+import collections
+import errno
+import hashlib
+import httplib
+import logging
+import mimetypes
+import os
+import socket
+import threading
+import time
+from multiprocessing.pool import ThreadPool
+
+import boto
+from boto.exception import S3ResponseError
+from boto.s3.key import Key
+
+
+log = logging.getLogger(__name__)
+
+# Content types that mimetypes does not know about
+CONTENT_TYPES = {
+    '.sig': 'application/pgp-signature',
+    '.proof': 'application/json',
+}
+
+
+def content_type(path):
+    """Return the Content-Type to publish the file at path with"""
+    extension = os.path.splitext(path)[1]
+    return CONTENT_TYPES.get(extension) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def file_digests(data):
+    """
+    Return the digests of data as (sha256 hexdigest, md5), where md5 is
+    the (hexdigest, base64 digest) pair boto takes as a Content-MD5
+    """
+    md5 = hashlib.md5(data)
+    return (hashlib.sha256(data).hexdigest(), (md5.hexdigest(), base64.b64encode(md5.digest())))
+
+
+class Storage(object):
+    """
+    Storage is where certificate files are published
+
+    Files are given as a path relative to the storage root and
+    their contents, and optionally their file_digests() if they are
+    already known. put_many stores a batch of files, up to
+    concurrency of them at once.
+
+    Files are deleted by path with delete_many, in as few requests
+    as the backend allows. queue_delete coalesces the deletes of
+    many callers: they are made once delete_batch_size paths are
+    queued, or delete_delay seconds after the first of them was, or
+    on flush_deletes(). Putting a queued path cancels its delete, and
+    a put of a path being deleted waits for the delete to finish.
+
+    Every put is timed; stats() reports the count, bytes and
+    latencies so far.
+    """
+
+    def __init__(self, concurrency=1, delete_batch_size=1000, delete_delay=5):
+        self.concurrency = concurrency
+        self.pool = None
+        self.pool_pid = None
+        self.puts = 0
+        self.bytes = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.deletes = 0
+        self.lock = threading.Lock()
+        self.delete_batch_size = delete_batch_size
+        self.delete_delay = delete_delay
+        self.pending_deletes = collections.OrderedDict()
+        self.delete_timer = None
+        # Paths being deleted right now; a put of one of them waits for
+        # the delete to finish, so that it can't undo the put. They are
+        # marked with the lock held, so a put sees them before any of
+        # them is deleted.
+        self.deleting = set()
+        self.deleted = threading.Condition(self.lock)
+
+    def put(self, path, data, digests=None):
+        """Store data at path"""
+        with self.lock:
+            self.pending_deletes.pop(path, None)
+            while path in self.deleting:
+                self.deleted.wait()
+        start = time.time()
+        self._put(path, data, digests)
+        latency = time.time() - start
+        with self.lock:
+            self.puts += 1
+            self.bytes += len(data)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def put_many(self, files):
+        """Store each (path, data) or (path, data, digests) of files"""
+        files = list(files)
+        if len(files) < 2 or self.concurrency < 2:
+            for item in files:
+                self.put(*item)
+            return
+        if self.pool is None or self.pool_pid != os.getpid():
+            self.pool = ThreadPool(self.concurrency)
+            self.pool_pid = os.getpid()
+        self.pool.map(lambda item: self.put(*item), files)
+
+    def exists(self, path):
+        """Return whether a file is stored at path"""
+        return self._exists(path)
+
+    def delete_many(self, paths):
+        """Delete each of paths that exists"""
+        paths = list(paths)
+        with self.lock:
+            self.deleting.update(paths)
+        self._delete(paths)
+
+    def queue_delete(self, paths):
+        """Delete each of paths that exists, along with the paths other callers queue"""
+        with self.lock:
+            for path in paths:
+                self.pending_deletes[path] = True
+            if len(self.pending_deletes) < self.delete_batch_size:
+                if self.delete_timer is None and self.pending_deletes:
+                    self.delete_timer = threading.Timer(self.delete_delay, self._flush_deletes_later)
+                    self.delete_timer.daemon = True
+                    self.delete_timer.start()
+                return
+            paths = self._take_deletes()
+        self._delete(paths)
+
+    def flush_deletes(self):
+        """Make the queued deletes now"""
+        with self.lock:
+            paths = self._take_deletes()
+        self._delete(paths)
+
+    def _flush_deletes_later(self):
+        """flush_deletes, on the delete timer's thread, where an error would otherwise go unseen"""
+        with self.lock:
+            paths = self._take_deletes()
+        try:
+            self._delete(paths)
+        except Exception:
+            log.exception("Unable to delete {0} queued paths: {1}".format(len(paths), ' '.join(paths)))
+
+    def stats(self):
+        return {
+            'puts': self.puts,
+            'bytes': self.bytes,
+            'mean_latency': self.total_latency / self.puts if self.puts else 0.0,
+            'max_latency': self.max_latency,
+            'deletes': self.deletes,
+        }
+
+    def _take_deletes(self):
+        """Return the queued deletes and mark them as being deleted, with the lock held"""
+        paths = list(self.pending_deletes)
+        self.pending_deletes.clear()
+        self.deleting.update(paths)
+        if self.delete_timer is not None:
+            self.delete_timer.cancel()
+            self.delete_timer = None
+        return paths
+
+    def _delete(self, paths):
+        if not paths:
+            return
+        try:
+            self._delete_many(paths)
+        finally:
+            with self.lock:
+                self.deleting.difference_update(paths)
+                self.deleted.notify_all()
+        with self.lock:
+            self.deletes += len(paths)
+
+    def _put(self, path, data, digests):
+        raise NotImplementedError
+
+    def _exists(self, path):
+        raise NotImplementedError
+
+    def _delete_many(self, paths):
+        raise NotImplementedError
+
+
+class S3Storage(Storage):
+    """
+    S3Storage publishes public-read files to an S3 bucket
+
+    The connection and bucket are made once per thread (boto
+    connections are not safe to share between threads) and per
+    process, and the bucket is not validated with a request of its
+    own: a missing bucket fails the first put instead. On a
+    connection or authentication error the connection is made
+    again and the put retried once.
+
+    Deletes are made with S3's multi-object delete, up to
+    MAX_DELETE_KEYS keys per request.
+    """
+
+    # The most keys S3 deletes in one request
+    MAX_DELETE_KEYS = 1000
+
+    def __init__(self, bucket, aws_id=None, aws_key=None, concurrency=4, **options):
+        super(S3Storage, self).__init__(concurrency, **options)
+        self.bucket_name = bucket
+        self.aws_id = aws_id
+        self.aws_key = aws_key
+        self.local = threading.local()
+
+    def get_bucket(self):
+        if getattr(self.local, 'pid', None) != os.getpid():
+            s3_conn = boto.connect_s3(self.aws_id, self.aws_key)
+            self.local.bucket = s3_conn.get_bucket(self.bucket_name, validate=False)
+            self.local.pid = os.getpid()
+        return self.local.bucket
+
+    def reset(self):
+        """Drop this thread's S3 connection, so the next put makes a new one"""
+        self.local.pid = None
+
+    def _put(self, path, data, digests):
+        headers = {'Content-Type': content_type(path)}
+        md5 = (digests or file_digests(data))[1]
+        try:
+            key = Key(self.get_bucket(), name=path)
+            key.set_contents_from_string(data, headers=headers, md5=md5, policy='public-read')
+        except (S3ResponseError, socket.error, httplib.HTTPException) as e:
+            if isinstance(e, S3ResponseError) and e.status not in (400, 401, 403):
+                raise
+            log.warning("Reconnecting to S3 after error uploading {0}: {1}".format(path, e))
+            self.reset()
+            key = Key(self.get_bucket(), name=path)
+            key.set_contents_from_string(data, headers=headers, md5=md5, policy='public-read')
+        log.info("uploaded {s3path}".format(s3path=path))
+
+    def _exists(self, path):
+        return self.get_bucket().get_key(path) is not None
+
+    def _delete_many(self, paths):
+        for start in xrange(0, len(paths), self.MAX_DELETE_KEYS):
+            keys = paths[start:start + self.MAX_DELETE_KEYS]
+            try:
+                result = self.get_bucket().delete_keys(keys, quiet=True)
+            except (S3ResponseError, socket.error, httplib.HTTPException) as e:
+                if isinstance(e, S3ResponseError) and e.status not in (400, 401, 403):
+                    raise
+                log.warning("Reconnecting to S3 after error deleting {0} keys: {1}".format(len(keys), e))
+                self.reset()
+                result = self.get_bucket().delete_keys(keys, quiet=True)
+            for error in result.errors:
+                log.error("Unable to delete {0}: {1} {2}".format(error.key, error.code, error.message))
+            log.info("deleted {0} keys".format(len(keys)))
+
+
+class LocalStorage(Storage):
+    """LocalStorage publishes files into a directory, such as the web root"""
+
+    def __init__(self, root, concurrency=1, **options):
+        super(LocalStorage, self).__init__(concurrency, **options)
+        self.root = root
+
+    def _put(self, path, data, digests):
+        local_path = os.path.join(self.root, path)
+        dirname = os.path.dirname(local_path)
+        if not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another thread made it first
+                if not os.path.isdir(dirname):
+                    raise
+        with open(local_path, 'wb') as f:
+            f.write(data)
+        log.info("published {path} to {local}".format(path=path, local=local_path))
+
+    def _exists(self, path):
+        return os.path.isfile(os.path.join(self.root, path))
+
+    def _delete_many(self, paths):
+        for path in paths:
+            local_path = os.path.join(self.root, path)
+            try:
+                os.remove(local_path)
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                continue
+            log.info("deleted {local}".format(local=local_path))
+            # Remove the directories the file leaves empty, up to the root
+            dirname = os.path.dirname(local_path)
+            while os.path.normpath(dirname) != os.path.normpath(self.root):
+                try:
+                    os.rmdir(dirname)
+                except OSError:
+                    break
+                dirname = os.path.dirname(dirname)
+
+
+class MemoryStorage(Storage):
+    """MemoryStorage keeps published files in its files dict, for tests and load tests"""
+
+    def __init__(self, concurrency=1, **options):
+        super(MemoryStorage, self).__init__(concurrency, **options)
+        self.files = {}
+
+    def _put(self, path, data, digests):
+        self.files[path] = data
+
+    def _exists(self, path):
+        return path in self.files
+
+    def _delete_many(self, paths):
+        for path in paths:
+            self.files.pop(path, None)
+
+
+# Storage backends by name, for CERT_STORAGE_BACKEND
+STORAGE_BACKENDS = {
+    's3': S3Storage,
+    'local': LocalStorage,
+    'memory': MemoryStorage,
+}
+
+
+def make_storage(backend, **options):
+    """Return a storage of the given backend, created with options"""
+    try:
+        storage_class = STORAGE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown storage backend {0}".format(backend))
+    return storage_class(**options)
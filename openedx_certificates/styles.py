@@ -0,0 +1,76 @@
+import threading
+
+from reportlab.lib.styles import ParagraphStyle
+
+from openedx_certificates.cache import LRUCache
+
+
+class FrozenParagraphStyle(ParagraphStyle):
+    """
+    FrozenParagraphStyle is a ParagraphStyle that can't be changed
+    once it is made
+
+    Frozen styles are shared by every certificate (and thread) that
+    uses them, so a style with different attributes is made with
+    derive() rather than by setting them. Copies of a frozen style
+    are ordinary styles, which reportlab is free to change.
+    """
+
+    def __init__(self, name, **attributes):
+        ParagraphStyle.__init__(self, name, **attributes)
+        self.__dict__['_frozen'] = True
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get('_frozen'):
+            raise AttributeError("Paragraph style {0} is frozen, derive() one with {1} changed".format(self.name, name))
+        self.__dict__[name] = value
+
+    def __copy__(self):
+        return ParagraphStyle(self.name, **attributes(self))
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+
+# Most styles a process keeps interned. Autoscaled text derives a style per
+# size it is fitted at, so the least recently used ones are let go; a style
+# that is still in use keeps working, it just isn't shared any more.
+MAX_STYLES = 1024
+
+_styles = LRUCache(MAX_STYLES)
+_styles_lock = threading.Lock()
+
+
+def paragraph_style(name, **attributes):
+    """
+    Return the frozen ParagraphStyle called name with attributes
+
+    Styles are interned: the same name and attributes give back the
+    same style every time, rather than a new one per certificate, for
+    as long as the style is among the MAX_STYLES most recently used.
+    """
+    key = (name, tuple(sorted(attributes.items())))
+    style = _styles.get(key)
+    if style is not None:
+        return style
+    with _styles_lock:
+        style = _styles.get(key)
+        if style is None:
+            style = FrozenParagraphStyle(name, **attributes)
+            _styles.put(key, style)
+        return style
+
+
+def derive(style, **changes):
+    """Return the frozen style that is style with changes made to its attributes"""
+    derived = attributes(style)
+    derived.update(changes)
+    return paragraph_style(style.name, **derived)
+
+
+def attributes(style):
+    """Return the attributes of style, without its name or parent"""
+    return dict(
+        (key, value) for key, value in style.__dict__.items()
+        if key not in ('name', 'parent', '_frozen')
+    )
@@ -49,6 +49,34 @@ CERT_KEY_ID = 'FEF8D954'
 # or leave blank to skip gpg signing
 # CERT_KEY_ID = ''
 
+# Certificates are signed by a long-lived CERT_SIGNER ('gnupg'), which can
+# use gpg-agent for the key. Batches of certificates are signed
+# CERT_SIGNER_WORKERS at a time, with that many gpg processes running at once
+CERT_SIGNER = 'gnupg'
+CERT_SIGNER_USE_AGENT = False
+CERT_SIGNER_WORKERS = 4
+
+# With CERT_SIGNATURE_MODE 'merkle', batches of up to CERT_MERKLE_BATCH_SIZE
+# certificates are signed at once: the SHA-256 digests of their PDFs go into
+# a Merkle tree, only its root is signed, and each certificate gets a .proof
+# of its place in the tree instead of a .sig. The default, 'detached', signs
+# every certificate on its own.
+CERT_SIGNATURE_MODE = 'detached'
+CERT_MERKLE_BATCH_SIZE = 256
+
+# With CERT_DETERMINISTIC_IDS, a certificate's download and verify UUIDs are
+# derived from its course, the student's username and a salt: the course's
+# ID_SALT in cert-data.yml, or else CERT_ID_SALT (set in auth.json). Keep the
+# salt secret, or anyone could work out a student's certificate URLs. Making a
+# certificate again then replaces it in place, and one already published from
+# the same inputs, as recorded in CERT_MANIFEST_DIR (None to always make
+# them) and still in storage, isn't made again at all. Hosts may share the
+# manifest directory or each keep their own. Clear the manifest when the
+# certificate layout changes.
+CERT_DETERMINISTIC_IDS = False
+CERT_ID_SALT = ''
+CERT_MANIFEST_DIR = '/var/tmp/certificate-manifest'
+
 # Specify the default name of the certificate PDF
 CERT_FILENAME = 'Certificate.pdf'
 
@@ -66,6 +94,21 @@ CERT_WEB_ROOT = '/var/tmp'
 # server
 COPY_TO_WEB_ROOT = False
 S3_UPLOAD = True
+# Uploaded certificates are published to CERT_STORAGE_BACKEND: 's3' (the
+# CERT_BUCKET), 'local' (a CERT_STORAGE_ROOT directory) or 'memory' (for
+# load tests), storing up to CERT_STORAGE_CONCURRENCY files at once
+CERT_STORAGE_BACKEND = 's3'
+CERT_STORAGE_ROOT = CERT_WEB_ROOT
+CERT_STORAGE_CONCURRENCY = 4
+# Files of removed and regenerated certificates are deleted in batches: once
+# CERT_DELETE_BATCH_SIZE files are queued, or CERT_DELETE_DELAY seconds after
+# the first of them was. Publishing a file again cancels its queued delete only
+# within the same process, so certificate_agent.py --workers makes each
+# submission's deletes at once. Between hosts sharing the storage, a certificate
+# published again within CERT_DELETE_DELAY of its removal on another host can
+# still lose its files.
+CERT_DELETE_BATCH_SIZE = 1000
+CERT_DELETE_DELAY = 5
 S3_VERIFY_PATH = 'cert'
 
 # A knob to control what certs are called, some places have restrictions on the
@@ -76,6 +119,49 @@ CERTS_ARE_CALLED_PLURAL = 'certificates'
 # Programmatic disclaimer text
 CERTS_SITE_DISCLAIMER_TEXT = ''
 
+# Connections to the xqueue server: at most QUEUE_POOL_SIZE pooled
+# connections, kept alive between requests unless QUEUE_KEEP_ALIVE is
+# False; requests time out after the connect and read timeouts (seconds)
+QUEUE_POOL_SIZE = 10
+QUEUE_KEEP_ALIVE = True
+QUEUE_CONNECT_TIMEOUT = 5
+QUEUE_READ_TIMEOUT = 30
+
+# Number of processes the certificate agent generates certificates with;
+# 1 generates them in the agent process itself
+CERT_WORKERS = 1
+
+# Each agent process keeps up to CERT_GENERATOR_CACHE_SIZE certificate
+# generators (one per course and template) around, holding at most about
+# CERT_GENERATOR_CACHE_BYTES of parsed templates
+CERT_GENERATOR_CACHE_SIZE = 32
+CERT_GENERATOR_CACHE_BYTES = 256 * 1024 * 1024
+
+# Number of (fonts, text) font selections remembered per process
+FONT_SELECTION_CACHE_SIZE = 4096
+# Where the code points each font covers are kept between runs, so fonts
+# are only parsed when they are used; None keeps them in memory only
+FONT_COVERAGE_INDEX = '/var/tmp/certificate-font-coverage.json'
+
+# The agent polls an idle queue every QUEUE_POLL_MIN_INTERVAL seconds at
+# first, backing off exponentially to QUEUE_POLL_MAX_INTERVAL seconds
+QUEUE_POLL_MIN_INTERVAL = 0.25
+QUEUE_POLL_MAX_INTERVAL = 5
+
+# With more than one worker, the agent buffers up to QUEUE_PREFETCH
+# submissions at a time (default: one per worker), spending at most
+# QUEUE_PREFETCH_TIMEOUT seconds per refill
+QUEUE_PREFETCH = None
+QUEUE_PREFETCH_TIMEOUT = 2
+
+# Results are posted back to xqueue in the background; up to
+# QUEUE_REPLY_OUTBOX_SIZE of them wait to be posted, each is retried
+# QUEUE_REPLY_RETRIES times on connection errors, and those still unsent
+# at shutdown are kept in QUEUE_REPLY_JOURNAL for the next start
+QUEUE_REPLY_OUTBOX_SIZE = 100
+QUEUE_REPLY_RETRIES = 5
+QUEUE_REPLY_JOURNAL = '/var/tmp/certificate-agent-replies.journal'
+
 # These are initialized below, after the environment is read
 CERT_URL = ''
 CERT_DOWNLOAD_URL = ''
@@ -90,6 +176,13 @@ if os.path.isfile(ENV_ROOT / "env.json"):
     QUEUE_URL = ENV_TOKENS.get('QUEUE_URL', 'https://stage-xqueue.edx.org')
     CERT_GPG_DIR = ENV_TOKENS.get('CERT_GPG_DIR', CERT_GPG_DIR)
     CERT_KEY_ID = ENV_TOKENS.get('CERT_KEY_ID', CERT_KEY_ID)
+    CERT_SIGNER = ENV_TOKENS.get('CERT_SIGNER', CERT_SIGNER)
+    CERT_SIGNER_USE_AGENT = ENV_TOKENS.get('CERT_SIGNER_USE_AGENT', CERT_SIGNER_USE_AGENT)
+    CERT_SIGNER_WORKERS = ENV_TOKENS.get('CERT_SIGNER_WORKERS', CERT_SIGNER_WORKERS)
+    CERT_SIGNATURE_MODE = ENV_TOKENS.get('CERT_SIGNATURE_MODE', CERT_SIGNATURE_MODE)
+    CERT_MERKLE_BATCH_SIZE = ENV_TOKENS.get('CERT_MERKLE_BATCH_SIZE', CERT_MERKLE_BATCH_SIZE)
+    CERT_DETERMINISTIC_IDS = ENV_TOKENS.get('CERT_DETERMINISTIC_IDS', CERT_DETERMINISTIC_IDS)
+    CERT_MANIFEST_DIR = ENV_TOKENS.get('CERT_MANIFEST_DIR', CERT_MANIFEST_DIR)
     CERT_BUCKET = ENV_TOKENS.get('CERT_BUCKET', CERT_BUCKET)
     CERT_FILENAME = ENV_TOKENS.get('CERT_FILENAME', CERT_FILENAME)
     CERT_URL = ENV_TOKENS.get('CERT_URL', '')
@@ -98,10 +191,31 @@ if os.path.isfile(ENV_ROOT / "env.json"):
     CERT_WEB_ROOT = ENV_TOKENS.get('CERT_WEB_ROOT', CERT_WEB_ROOT)
     COPY_TO_WEB_ROOT = ENV_TOKENS.get('COPY_TO_WEB_ROOT', COPY_TO_WEB_ROOT)
     S3_UPLOAD = ENV_TOKENS.get('S3_UPLOAD', S3_UPLOAD)
+    CERT_STORAGE_BACKEND = ENV_TOKENS.get('CERT_STORAGE_BACKEND', CERT_STORAGE_BACKEND)
+    CERT_STORAGE_ROOT = ENV_TOKENS.get('CERT_STORAGE_ROOT', CERT_WEB_ROOT)
+    CERT_STORAGE_CONCURRENCY = ENV_TOKENS.get('CERT_STORAGE_CONCURRENCY', CERT_STORAGE_CONCURRENCY)
+    CERT_DELETE_BATCH_SIZE = ENV_TOKENS.get('CERT_DELETE_BATCH_SIZE', CERT_DELETE_BATCH_SIZE)
+    CERT_DELETE_DELAY = ENV_TOKENS.get('CERT_DELETE_DELAY', CERT_DELETE_DELAY)
     S3_VERIFY_PATH = ENV_TOKENS.get('S3_VERIFY_PATH', S3_VERIFY_PATH)
     CERTS_ARE_CALLED = ENV_TOKENS.get('CERTS_ARE_CALLED', CERTS_ARE_CALLED)
     CERTS_ARE_CALLED_PLURAL = ENV_TOKENS.get('CERTS_ARE_CALLED_PLURAL', CERTS_ARE_CALLED_PLURAL)
     CERTS_SITE_DISCLAIMER_TEXT = ENV_TOKENS.get('CERT_SITE_DISCLAIMER_TEXT', CERTS_SITE_DISCLAIMER_TEXT)
+    QUEUE_POOL_SIZE = ENV_TOKENS.get('QUEUE_POOL_SIZE', QUEUE_POOL_SIZE)
+    QUEUE_KEEP_ALIVE = ENV_TOKENS.get('QUEUE_KEEP_ALIVE', QUEUE_KEEP_ALIVE)
+    QUEUE_CONNECT_TIMEOUT = ENV_TOKENS.get('QUEUE_CONNECT_TIMEOUT', QUEUE_CONNECT_TIMEOUT)
+    QUEUE_READ_TIMEOUT = ENV_TOKENS.get('QUEUE_READ_TIMEOUT', QUEUE_READ_TIMEOUT)
+    CERT_WORKERS = ENV_TOKENS.get('CERT_WORKERS', CERT_WORKERS)
+    CERT_GENERATOR_CACHE_SIZE = ENV_TOKENS.get('CERT_GENERATOR_CACHE_SIZE', CERT_GENERATOR_CACHE_SIZE)
+    CERT_GENERATOR_CACHE_BYTES = ENV_TOKENS.get('CERT_GENERATOR_CACHE_BYTES', CERT_GENERATOR_CACHE_BYTES)
+    FONT_SELECTION_CACHE_SIZE = ENV_TOKENS.get('FONT_SELECTION_CACHE_SIZE', FONT_SELECTION_CACHE_SIZE)
+    FONT_COVERAGE_INDEX = ENV_TOKENS.get('FONT_COVERAGE_INDEX', FONT_COVERAGE_INDEX)
+    QUEUE_POLL_MIN_INTERVAL = ENV_TOKENS.get('QUEUE_POLL_MIN_INTERVAL', QUEUE_POLL_MIN_INTERVAL)
+    QUEUE_POLL_MAX_INTERVAL = ENV_TOKENS.get('QUEUE_POLL_MAX_INTERVAL', QUEUE_POLL_MAX_INTERVAL)
+    QUEUE_PREFETCH = ENV_TOKENS.get('QUEUE_PREFETCH', QUEUE_PREFETCH)
+    QUEUE_PREFETCH_TIMEOUT = ENV_TOKENS.get('QUEUE_PREFETCH_TIMEOUT', QUEUE_PREFETCH_TIMEOUT)
+    QUEUE_REPLY_OUTBOX_SIZE = ENV_TOKENS.get('QUEUE_REPLY_OUTBOX_SIZE', QUEUE_REPLY_OUTBOX_SIZE)
+    QUEUE_REPLY_RETRIES = ENV_TOKENS.get('QUEUE_REPLY_RETRIES', QUEUE_REPLY_RETRIES)
+    QUEUE_REPLY_JOURNAL = ENV_TOKENS.get('QUEUE_REPLY_JOURNAL', QUEUE_REPLY_JOURNAL)
     LOG_DIR = ENV_TOKENS.get('LOG_DIR', '/var/tmp')
     local_loglevel = ENV_TOKENS.get('LOCAL_LOGLEVEL', 'INFO')
     LOGGING_DEV_ENV = ENV_TOKENS.get('LOGGING_DEV_ENV', True)
@@ -132,6 +246,7 @@ if os.path.isfile(ENV_ROOT / "auth.json"):
     QUEUE_AUTH_PASS = ENV_TOKENS.get('QUEUE_AUTH_PASS', '')
     CERT_AWS_KEY = ENV_TOKENS.get('CERT_AWS_KEY', CERT_AWS_KEY)
     CERT_AWS_ID = ENV_TOKENS.get('CERT_AWS_ID', CERT_AWS_ID)
+    CERT_ID_SALT = ENV_TOKENS.get('CERT_ID_SALT', CERT_ID_SALT)
     DEFAULT_ORG = ENV_TOKENS.get('DEFAULT_ORG', DEFAULT_ORG)
 
 
@@ -0,0 +1,27 @@
+from nose.tools import assert_equal, assert_false, assert_true
+
+from openedx_certificates.cache import LRUCache
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert_equal(cache.get('a'), 1)
+    cache.put('c', 3)
+    assert_false('b' in cache)
+    assert_true('a' in cache and 'c' in cache)
+    assert_equal(cache.get('b'), None)
+    assert_equal((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+
+def test_evicts_by_weight():
+    """Total weight is bounded, but the newest entry is always kept"""
+    cache = LRUCache(10, max_weight=100)
+    cache.put('a', 1, 60)
+    cache.put('b', 2, 30)
+    cache.put('c', 3, 30)
+    assert_equal(sorted(cache.entries.keys()), ['b', 'c'])
+    cache.put('d', 4, 500)
+    assert_equal(cache.entries.keys(), ['d'])
+    assert_equal(cache.stats()['evictions'], 3)
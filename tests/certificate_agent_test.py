@@ -0,0 +1,117 @@
+import multiprocessing
+import multiprocessing.dummy
+import os
+import shutil
+import tempfile
+import time
+
+from mock import Mock, patch
+from nose.tools import assert_equal, assert_false, assert_raises, assert_true
+
+import certificate_agent
+from openedx_certificates import storage
+
+
+class OutOfSubmissions(Exception):
+    pass
+
+
+class FakeScheduler(object):
+    """Hands out submissions, then stops run_pool, noting how many were in flight at most"""
+
+    def __init__(self, submissions, replies):
+        self.submissions = list(submissions)
+        self.replies = replies
+        self.pulled = 0
+        self.most_in_flight = 0
+
+    def get_submission(self):
+        if not self.submissions:
+            raise OutOfSubmissions()
+        self.pulled += 1
+        self.most_in_flight = max(self.most_in_flight, self.pulled - len(self.replies))
+        return self.submissions.pop(0)
+
+    def delay(self):
+        return 0.01
+
+
+def slow_process_submission(submission, respond):
+    """Reply to submission, the even ones taking longer so that they finish out of order"""
+    time.sleep(0.05 if submission['id'] % 2 == 0 else 0.01)
+    if submission.get('fail'):
+        raise ValueError('generation failed')
+    respond({'id': submission['id']})
+
+
+def deleting_process_submission(submission, respond):
+    """Queue the delete of submission's path, and reply"""
+    certificate_agent.get_storage().queue_delete([submission['path']])
+    respond({'id': submission['id']})
+
+
+def run_pool(submissions, pool, workers):
+    replies = []
+    scheduler = FakeScheduler(submissions, replies)
+    with patch('certificate_agent.read_submission', side_effect=lambda certdata: certdata):
+        with assert_raises(OutOfSubmissions):
+            certificate_agent.run_pool(scheduler, replies.append, pool, workers)
+    return (scheduler, replies)
+
+
+@patch('certificate_agent.process_submission', slow_process_submission)
+def test_run_pool_replies_in_order():
+    """Replies are posted in the order of their submissions, with at most two per worker in flight"""
+    pool = multiprocessing.dummy.Pool(2)
+    (scheduler, replies) = run_pool([{'id': i} for i in range(10)], pool, 2)
+    # Those still in flight when the submissions ran out were finished and posted too
+    assert_equal(replies, [{'id': i} for i in range(10)])
+    assert_equal(scheduler.most_in_flight, 4)
+
+
+@patch('certificate_agent.process_submission', slow_process_submission)
+def test_run_pool_raises_worker_errors():
+    """A worker's traceback (with settings.DEBUG) is raised after the replies before it are posted"""
+    pool = multiprocessing.dummy.Pool(2)
+    replies = []
+    scheduler = FakeScheduler([{'id': 0}, {'id': 1}, {'id': 2, 'fail': True}, {'id': 3}], replies)
+    with patch('certificate_agent.read_submission', side_effect=lambda certdata: certdata):
+        with assert_raises(RuntimeError) as raised:
+            certificate_agent.run_pool(scheduler, replies.append, pool, 2)
+    assert_true('generation failed' in str(raised.exception))
+    assert_equal(replies, [{'id': 0}, {'id': 1}])
+
+
+def test_run_pool_workers_make_queued_deletes():
+    """Workers are let exit when the pool stops, making the deletes they have queued"""
+    root = tempfile.mkdtemp()
+    try:
+        local = storage.make_storage('local', root=root, delete_delay=600)
+        paths = ['cert/{0}/valid.html'.format(i) for i in range(4)]
+        local.put_many([(path, '<html>') for path in paths])
+        with patch('certificate_agent.get_storage', return_value=local):
+            with patch('certificate_agent.process_submission', deleting_process_submission):
+                pool = multiprocessing.Pool(2, initializer=certificate_agent.init_worker)
+                (scheduler, replies) = run_pool([{'id': i, 'path': path} for i, path in enumerate(paths)], pool, 2)
+        assert_equal(replies, [{'id': i} for i in range(4)])
+        assert_false(any(os.path.exists(os.path.join(root, path)) for path in paths))
+    finally:
+        shutil.rmtree(root)
+
+
+@patch('certificate_agent.flush_deletes')
+@patch('certificate_agent.get_generator')
+def test_worker_deletes_at_once(get_generator, flush_deletes):
+    """A pool worker makes a removed certificate's deletes at once, as another worker may publish it again"""
+    submission = {
+        'username': u'jsmith', 'course_id': u'edX/DemoX/Demo_Course', 'name': u'John Smith', 'grade': None,
+        'action': 'remove', 'delete_download_uuid': 'a' * 32, 'delete_verify_uuid': 'b' * 32,
+    }
+    respond = Mock()
+    certificate_agent.process_submission(submission, respond)
+    assert_true(get_generator.return_value.delete_certificate.called)
+    assert_false(flush_deletes.called)
+    with patch('certificate_agent.IN_WORKER', True):
+        certificate_agent.process_submission(submission, respond)
+    assert_equal(flush_deletes.call_count, 1)
+    assert_false(respond.called)
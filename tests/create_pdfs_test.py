@@ -0,0 +1,56 @@
+import argparse
+import csv
+import multiprocessing.dummy
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from mock import patch
+from nose.tools import assert_equal
+
+import create_pdfs
+from gen_cert import S3_CERT_PATH, TARGET_FILENAME
+
+
+class FakeGenerator(object):
+    """Publishes an empty PDF for each record, the first names taking longest"""
+
+    def __init__(self, dir_prefix):
+        self.dir_prefix = dir_prefix
+
+    def create_and_upload_many(self, records, **kwargs):
+        for record in records:
+            time.sleep(0.02 * (6 - int(record['name'].split()[-1])))
+            download_uuid = uuid.uuid4().hex
+            os.makedirs(os.path.join(self.dir_prefix, S3_CERT_PATH, download_uuid))
+            with open(os.path.join(self.dir_prefix, S3_CERT_PATH, download_uuid, TARGET_FILENAME), 'wb') as f:
+                f.write('%PDF')
+            yield (download_uuid, uuid.uuid4().hex, 'https://certs.example.com/' + download_uuid)
+
+
+def test_jobs_report_in_order():
+    """With --jobs, the names are generated by a pool, and reported in the order they were given"""
+    gen_dir = tempfile.mkdtemp()
+    names = ['Student {0}'.format(i) for i in range(6)]
+    try:
+        with open(os.path.join(gen_dir, 'names.txt'), 'w') as f:
+            f.write('\n'.join(names))
+        args = argparse.Namespace(
+            course_id='edX/DemoX/Demo_Course', name=None, input_file=os.path.join(gen_dir, 'names.txt'),
+            assign_title=False, grade_text=None, no_upload=True, jobs=3, no_report=False,
+            report_file=os.path.join(gen_dir, 'report.csv'), long_org='', long_course='',
+        )
+        pdf_dir = os.path.join(gen_dir, 'generated')
+        with patch.object(create_pdfs, 'args', args, create=True), \
+                patch.object(create_pdfs, 'TMP_GEN_DIR', pdf_dir), \
+                patch('create_pdfs.get_generator', side_effect=lambda course, pdf_dir: FakeGenerator(pdf_dir)), \
+                patch('create_pdfs.multiprocessing.Pool', multiprocessing.dummy.Pool):
+            create_pdfs.main()
+        with open(args.report_file) as f:
+            rows = list(csv.reader(f))
+        assert_equal([row[0] for row in rows], names)
+        assert_equal(len(os.listdir(pdf_dir + '+copy')), len(names))
+    finally:
+        shutil.rmtree(gen_dir)
@@ -0,0 +1,38 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+from nose.tools import assert_equal, assert_false, assert_true
+
+import settings
+from openedx_certificates.fonts import FontRegistry
+
+
+FONT_DIR = '{0}/fonts'.format(settings.TEMPLATE_DIR)
+
+
+def test_coverage_index():
+    """Coverage is kept in the index, so a new registry doesn't parse the font to check it"""
+    index_dir = tempfile.mkdtemp()
+    try:
+        index_file = os.path.join(index_dir, 'fonts.json')
+        fonts = FontRegistry(FONT_DIR, index_file)
+        codepoints = fonts.coverage('OpenSans-Regular')
+        assert_true(ord(u'e') in codepoints)
+        assert_true(os.path.exists(index_file))
+
+        fonts = FontRegistry(FONT_DIR, index_file)
+        with patch('openedx_certificates.fonts.TTFont', side_effect=AssertionError('font parsed')):
+            assert_equal(fonts.coverage('OpenSans-Regular'), codepoints)
+        assert_false('OpenSans-Regular' in fonts.registered)
+        assert_equal(fonts.coverage('No-Such-Font'), frozenset())
+    finally:
+        shutil.rmtree(index_dir)
+
+
+def test_registers_on_demand():
+    fonts = FontRegistry(FONT_DIR)
+    assert_true(fonts.register('OpenSans-Light'))
+    assert_true('OpenSans-Light' in fonts.registered)
+    assert_false(fonts.register('No-Such-Font'))
@@ -1,17 +1,28 @@
 # -*- coding: utf-8 -*-
 import gnupg
+import hashlib
+import json
 import os
 import shutil
+import StringIO
 import tempfile
 import urllib2
-from mock import patch
+from mock import Mock, patch
 
 from nose.plugins.skip import SkipTest
-from nose.tools import assert_true, assert_false
+from nose.tools import assert_equal, assert_true, assert_false, assert_raises
+from PyPDF2 import PdfFileReader
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph
 
 import settings
-from gen_cert import CertificateGen
-from gen_cert import S3_CERT_PATH, S3_VERIFY_PATH
+from gen_cert import CertificateGen, FONT_SELECTIONS, V3_COMPLETED_TEXT, V3_FONTLIST
+from gen_cert import autoscale_text, covers, font_for_string
+from gen_cert import S3_CERT_PATH, S3_VERIFY_PATH, certificate_paths, certificate_uuids
+from openedx_certificates import storage
+from openedx_certificates.merkle import proof_root
+from openedx_certificates.styles import paragraph_style
 from test_data import NAMES
 
 
@@ -96,6 +107,211 @@ def test_cert_names():
         (download_uuid, verify_uuid, download_url) = cert.create_and_upload(name, upload=False)
 
 
+def test_cert_gen_many():
+    """A batch yields one published certificate per record, in order"""
+    course_id = settings.CERT_DATA.keys()[0]
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen(course_id)
+        records = [{'name': 'John Smith'}, {'name': 'Jane Doe', 'grade': 'Distinction'}, {'name': 'Joe Bloggs'}]
+        results = list(cert.create_and_upload_many(
+            records, upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True))
+        assert_equal(len(results), len(records))
+        for (download_uuid, verify_uuid, download_url) in results:
+            assert_true(os.path.exists(os.path.join(gen_dir, S3_CERT_PATH, download_uuid, CERT_FILENAME)))
+        # Nothing is written to the working directory when it is cleaned up
+        assert_false(os.path.exists(os.path.join(cert.dir_prefix, S3_CERT_PATH)))
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_xobject_engine():
+    """The xobject engine stamps the course layer and overlay as Form XObjects"""
+    course_id = settings.CERT_DATA.keys()[0]
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen(course_id)
+        cert.pdf_engine = 'xobject'
+        (download_uuid, verify_uuid, download_url) = cert.create_and_upload(
+            'John Smith', upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True)
+        with open(os.path.join(gen_dir, S3_CERT_PATH, download_uuid, CERT_FILENAME), 'rb') as f:
+            page = PdfFileReader(f).getPage(0)
+            xobjects = page['/Resources']['/XObject']
+            assert_equal(sorted(xobjects.keys()), ['/Ovl', '/Tpl'])
+            assert_equal(xobjects['/Tpl'].getObject()['/Subtype'], '/Form')
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_course_text():
+    """Text that is the same on every certificate is laid out once and drawn on each"""
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen('edX/DemoX_v3/Demo_Course_v3')
+        course_text = None
+        for name in ['John Smith', 'Jane Doe']:
+            (download_uuid, verify_uuid, download_url) = cert.create_and_upload(
+                name, upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True)
+            if course_text is not None:
+                assert_true(cert.course_text is course_text)
+            course_text = cert.course_text
+            with open(os.path.join(gen_dir, S3_CERT_PATH, download_uuid, CERT_FILENAME), 'rb') as f:
+                text = PdfFileReader(f).getPage(0).extractText()
+            assert_true(name.split()[0] in text)
+            assert_true('Computer' in text)
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_detached_signatures_in_batches():
+    """Detached signatures of a batch are made together, CERT_SIGNER_WORKERS at a time"""
+    batches = []
+    signer = Mock(sign_many=lambda documents: batches.append(list(documents)) or ['sig'] * len(batches[-1]))
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen('edX/DemoX_v3/Demo_Course_v3')
+        records = [{'name': 'John Smith'}, {'name': 'Jane Doe'}, {'name': 'Joe Bloggs'}]
+        with patch('gen_cert.get_signer', return_value=signer), patch.object(settings, 'CERT_SIGNER_WORKERS', 2):
+            results = list(cert.create_and_upload_many(
+                records, upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True))
+        assert_equal([len(documents) for documents in batches], [2, 1])
+        assert_false(signer.sign.called)
+        for (download_uuid, verify_uuid, download_url), document in zip(results, sum(batches, [])):
+            with open(os.path.join(gen_dir, S3_CERT_PATH, download_uuid, CERT_FILENAME), 'rb') as f:
+                assert_equal(f.read(), document)
+            with open(os.path.join(gen_dir, S3_VERIFY_PATH, verify_uuid, CERT_FILESIG)) as f:
+                assert_equal(f.read(), 'sig')
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_failed_record_in_batch():
+    """The certificates made before a failing record of a batch are published before it fails"""
+    signer = Mock(sign_many=lambda documents: ['sig' for document in documents])
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen('edX/DemoX_v3/Demo_Course_v3')
+        records = [{'name': 'John Smith'}, {'name': 'Jane Doe'}, {}, {'name': 'Joe Bloggs'}]
+        results = []
+        with patch('gen_cert.get_signer', return_value=signer), patch.object(settings, 'CERT_SIGNER_WORKERS', 4):
+            with assert_raises(KeyError):
+                for result in cert.create_and_upload_many(
+                        records, upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True):
+                    results.append(result)
+        assert_equal(len(results), 2)
+        assert_equal(sorted(os.listdir(os.path.join(gen_dir, S3_CERT_PATH))), sorted(result[0] for result in results))
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_merkle_signatures():
+    """With merkle signatures a batch is signed once, and each certificate gets a proof of its PDF"""
+    signed = []
+    signer = Mock(sign=lambda data: signed.append(data) or 'root signature')
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen('edX/DemoX_v3/Demo_Course_v3')
+        cert.signature_mode = 'merkle'
+        records = [{'name': 'John Smith'}, {'name': 'Jane Doe'}, {'name': 'Joe Bloggs'}]
+        with patch('gen_cert.get_signer', return_value=signer):
+            results = list(cert.create_and_upload_many(
+                records, upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True))
+        assert_equal(len(signed), 1)
+        for (download_uuid, verify_uuid, download_url) in results:
+            with open(os.path.join(gen_dir, S3_CERT_PATH, download_uuid, CERT_FILENAME), 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            verify_dir = os.path.join(gen_dir, S3_VERIFY_PATH, verify_uuid)
+            assert_equal(set(os.listdir(verify_dir)), set(['valid.html', 'verify.html', CERT_FILENAME + '.proof']))
+            with open(os.path.join(verify_dir, CERT_FILENAME + '.proof')) as f:
+                proof = json.load(f)
+            assert_equal(proof['sha256'], digest)
+            assert_equal(proof_root(digest, proof['proof']), signed[0])
+            assert_equal(proof['root_signature'], 'root signature')
+            # The pages explain how to check the proof, then the root's signature
+            with open(os.path.join(verify_dir, 'verify.html')) as f:
+                verify_page = f.read()
+            assert_true('python3 check_proof.py {0} {0}.proof'.format(CERT_FILENAME) in verify_page)
+            assert_true('gpg --verify root.sig root.txt' in verify_page)
+            assert_false('gpg --verify {0}.proof'.format(CERT_FILENAME) in verify_page)
+            with open(os.path.join(verify_dir, 'valid.html')) as f:
+                assert_true('Download this proof' in f.read())
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_deterministic_ids():
+    """With deterministic IDs a certificate keeps its UUIDs, and isn't made again from the same inputs"""
+    course_id = settings.CERT_DATA.keys()[0]
+    gen_dir = tempfile.mkdtemp()
+    try:
+        with patch.multiple(settings, CERT_DETERMINISTIC_IDS=True, CERT_ID_SALT='salt',
+                            CERT_MANIFEST_DIR=os.path.join(gen_dir, 'manifest')):
+            cert = CertificateGen(course_id)
+        publish = {'upload': False, 'copy_to_webroot': True, 'cert_web_root': gen_dir, 'cleanup': True}
+        first = cert.create_and_upload('John Smith', username='jsmith', **publish)
+        assert_equal(first[:2], certificate_uuids(course_id, 'jsmith', 'salt'))
+        assert_true(os.path.exists(os.path.join(gen_dir, S3_CERT_PATH, first[0], CERT_FILENAME)))
+
+        with patch.object(cert, '_generate_certificate') as generate:
+            assert_equal(cert.create_and_upload('John Smith', username='jsmith', **publish), first)
+            assert_false(generate.called)
+        # A changed name is a new certificate, published in the same place
+        assert_equal(cert.create_and_upload('John A. Smith', username='jsmith', **publish), first)
+        # Without a username the UUIDs are random as ever
+        assert_true(cert.create_and_upload('John Smith', **publish)[0] != first[0])
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_regenerate_certificate():
+    """Deleting a certificate and making it again, as the agent does, publishes it again in place"""
+    course_id = settings.CERT_DATA.keys()[0]
+    gen_dir = tempfile.mkdtemp()
+    memory = storage.make_storage('memory', delete_delay=60)
+    try:
+        with patch.multiple(settings, CERT_DETERMINISTIC_IDS=True, CERT_ID_SALT='salt',
+                            CERT_MANIFEST_DIR=os.path.join(gen_dir, 'manifest'), S3_UPLOAD=True,
+                            COPY_TO_WEB_ROOT=False), patch('gen_cert.get_storage', return_value=memory):
+            cert = CertificateGen(course_id)
+            first = cert.create_and_upload('John Smith', username='jsmith', upload=True, cleanup=True)
+            paths = [path for path in certificate_paths(*first[:2]) if path in memory.files]
+            assert_equal(len(paths), 4)
+
+            cert.delete_certificate(*first[:2])
+            with patch.object(cert, '_generate_certificate', wraps=cert._generate_certificate) as generate:
+                assert_equal(cert.create_and_upload('John Smith', username='jsmith', upload=True, cleanup=True),
+                             first)
+                assert_true(generate.called)
+            # Publishing the files again cancelled their queued delete
+            memory.flush_deletes()
+            assert_equal(sorted(path for path in paths if path in memory.files), sorted(paths))
+
+            # Deleted by another host, which this host's manifest doesn't know about
+            memory.delete_many(paths)
+            with patch.object(cert, '_generate_certificate', wraps=cert._generate_certificate) as generate:
+                cert.create_and_upload('John Smith', username='jsmith', upload=True, cleanup=True)
+                assert_true(generate.called)
+            assert_true(all(path in memory.files for path in paths))
+    finally:
+        shutil.rmtree(gen_dir)
+
+
+def test_delete_certificate():
+    """Deleting a certificate removes its published files"""
+    gen_dir = tempfile.mkdtemp()
+    try:
+        cert = CertificateGen(settings.CERT_DATA.keys()[0])
+        (download_uuid, verify_uuid, download_url) = cert.create_and_upload(
+            'John Smith', upload=False, copy_to_webroot=True, cert_web_root=gen_dir, cleanup=True)
+        assert_equal(sorted(os.listdir(gen_dir)), [S3_VERIFY_PATH, S3_CERT_PATH])
+        with patch.multiple(settings, S3_UPLOAD=False, COPY_TO_WEB_ROOT=True, CERT_WEB_ROOT=gen_dir):
+            cert.delete_certificate(download_uuid, verify_uuid)
+            assert_raises(ValueError, cert.delete_certificate, '../..', '')
+        assert_equal(os.listdir(gen_dir), [])
+    finally:
+        shutil.rmtree(gen_dir)
+
+
 def test_cert_upload():
     """Check here->S3->http round trip."""
     if not settings.CERT_AWS_ID or not settings.CERT_AWS_KEY:
@@ -105,3 +321,45 @@ def test_cert_upload():
     r = urllib2.urlopen(download_url)
     with tempfile.NamedTemporaryFile(delete=True) as f:
         f.write(r.read())
+
+
+def test_covers():
+    """covers() finds the first character a font has no glyph for"""
+    assert_equal(covers('OpenSans-Regular', u'John Smith'), None)
+    assert_equal(covers('OpenSans-Regular', u'John 张伟'), u'张')
+    assert_equal(covers('No-Such-Font', u'John'), u'J')
+
+
+def test_course_font_selections():
+    """A 3_dynamic generator selects the fonts for its course text up front"""
+    course_id = [key for key, data in settings.CERT_DATA.items() if data.get('VERSION') == '3_dynamic'][0]
+    cert = CertificateGen(course_id)
+    hits = FONT_SELECTIONS.hits
+    font_for_string(V3_FONTLIST, cert._v3_course_title())
+    font_for_string(V3_FONTLIST, V3_COMPLETED_TEXT)
+    assert_equal(FONT_SELECTIONS.hits, hits + 2)
+
+
+def test_autoscale_text():
+    """autoscale_text finds the same size as lowering it a point at a time"""
+    page = canvas.Canvas(StringIO.StringIO())
+    texts = [
+        u'<b>John Smith</b>',
+        u'<b>{0}</b>'.format(u'A Very Long Course Title ' * 6),
+        u'',
+        u'<b>O&#39;Brien &amp; &quot;Sons&quot;&nbsp;Ltd</b>',
+    ]
+    for text in texts:
+        style = ParagraphStyle(name='autoscale', fontName='OpenSans-Light')
+        fontsize, leading = 36, 36 * 1.1
+        while True:
+            style.fontSize, style.leading = fontsize, leading
+            width, height = Paragraph(text, style).wrapOn(page, 400, 36 * 2.1)
+            if width <= 400 and height <= 36 * 2.1:
+                break
+            fontsize -= 1
+            leading -= 1
+        for attempt in range(2):
+            style = paragraph_style(name='autoscale', fontName='OpenSans-Light')
+            paragraph = autoscale_text(page, text, 36, 36 * 1.1, 36 * 2.1, 400, style)
+            assert_equal((paragraph.style.fontSize, paragraph.style.leading), (fontsize, leading))
@@ -0,0 +1,20 @@
+import shutil
+import tempfile
+
+from nose.tools import assert_equal
+
+from openedx_certificates.manifest import Manifest
+
+
+def test_entries_persist():
+    root = tempfile.mkdtemp()
+    try:
+        manifest = Manifest(root + '/manifest')
+        assert_equal(manifest.get('abc'), None)
+        manifest.put('abc', {'fingerprint': 'f', 'result': ['abc', 'def', 'url']})
+        assert_equal(Manifest(root + '/manifest').get('abc'), {'fingerprint': 'f', 'result': ['abc', 'def', 'url']})
+        manifest.remove('abc')
+        manifest.remove('abc')
+        assert_equal(manifest.get('abc'), None)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,26 @@
+import hashlib
+import json
+
+from nose.tools import assert_equal, assert_not_equal, assert_raises
+
+from openedx_certificates.merkle import MerkleTree, proof_file, proof_root
+
+
+def test_proofs_lead_to_root():
+    for size in range(1, 10):
+        digests = [hashlib.sha256(str(i)).hexdigest() for i in range(size)]
+        tree = MerkleTree(digests)
+        for index, digest in enumerate(digests):
+            assert_equal(proof_root(digest, tree.proof(index)), tree.root)
+        # A digest that isn't in the tree doesn't lead to the root
+        assert_not_equal(proof_root(hashlib.sha256('other').hexdigest(), tree.proof(0)), tree.root)
+    assert_equal(len(MerkleTree(digests).proof(0)), 4)
+    assert_raises(ValueError, MerkleTree, [])
+
+
+def test_proof_file():
+    digest = hashlib.sha256('%PDF').hexdigest()
+    tree = MerkleTree([digest])
+    document = json.loads(proof_file(digest, tree.proof(0), tree.root, 'signature'))
+    assert_equal(proof_root(document['sha256'], document['proof']), document['root'])
+    assert_equal(document['root_signature'], 'signature')
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+
+from nose.tools import assert_equal, assert_true
+
+from openedx_certificates.page_template import PageTemplate, load_template
+
+
+TEXT = u'<p>{NAME} passed {COURSE} ({ORG}) {{literal}} {COUNT:03d}</p>'
+FIELDS = dict(NAME=u'Jos\xe9', COURSE=u'CS101', ORG=u'edX', COUNT=7)
+
+
+def test_render_matches_format():
+    assert_equal(PageTemplate(TEXT).render(**FIELDS), TEXT.format(**FIELDS))
+
+
+def test_partial():
+    course = PageTemplate(TEXT).partial(COURSE=u'CS101', ORG=u'edX')
+    assert_equal(len(course.chunks), 3)
+    assert_equal(course.render(NAME=u'Jos\xe9', COUNT=7), TEXT.format(**FIELDS))
+
+
+def test_reloads_when_changed():
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write('{NAME} v1')
+        first = load_template(path)
+        assert_true(load_template(path) is first)
+        with open(path, 'w') as f:
+            f.write('{NAME} v2')
+        os.utime(path, (0, 0))
+        assert_equal(load_template(path).render(NAME='x'), 'x v2')
+    finally:
+        os.remove(path)
@@ -0,0 +1,47 @@
+from nose.tools import assert_equal, assert_true
+
+from openedx_certificates.poll_scheduler import PollScheduler
+from openedx_certificates.queue_xqueue import QueueEmpty
+
+
+class FakeManager(object):
+    """Stand-in for XQueuePullManager serving a fixed list of submissions"""
+
+    def __init__(self, submissions):
+        self.submissions = list(submissions)
+        self.length_calls = 0
+
+    def get_length(self):
+        self.length_calls += 1
+        return len(self.submissions)
+
+    def get_submission(self):
+        if not self.submissions:
+            raise QueueEmpty("Queue 'test' is empty")
+        return self.submissions.pop(0)
+
+
+def test_busy_queue_skips_length_polls():
+    """Only the first submission of a run of work costs a get_length call"""
+    manager = FakeManager(['a', 'b', 'c'])
+    scheduler = PollScheduler(manager, 1, 8, jitter=0)
+    assert_equal([scheduler.get_submission() for _ in range(3)], ['a', 'b', 'c'])
+    assert_equal(manager.length_calls, 1)
+    assert_equal(len(scheduler.idle_latencies), 1)
+
+
+def test_idle_queue_backs_off():
+    """Empty polls double the delay up to max_interval, and work resets it"""
+    manager = FakeManager([])
+    scheduler = PollScheduler(manager, 1, 8, jitter=0)
+    delays = []
+    for _ in range(5):
+        assert_true(scheduler.get_submission() is None)
+        delays.append(scheduler.delay())
+    assert_equal(delays, [2, 4, 8, 8, 8])
+
+    manager.submissions.append('a')
+    assert_equal(scheduler.get_submission(), 'a')
+    assert_equal(scheduler.delay(), 0)
+    assert_true(scheduler.get_submission() is None)
+    assert_equal(scheduler.delay(), 1)
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+from mock import Mock, patch
+from nose.tools import assert_equal, assert_false, assert_raises
+from requests.exceptions import ConnectionError
+
+from openedx_certificates.queue_xqueue import QueueEmpty, XQueuePullManager, XQueueReplySender
+
+
+class FakeResponse(object):
+    def __init__(self, return_code, content):
+        self.text = json.dumps({'return_code': return_code, 'content': content})
+
+
+class FakeSession(object):
+    """Stand-in for requests.Session talking to an xqueue holding `submissions`"""
+
+    submissions = []
+    logins = 0
+
+    def __init__(self):
+        self.headers = {}
+        self.lock = threading.Lock()
+        self.pending = list(self.submissions)
+        self.expired = False
+
+    def mount(self, prefix, adapter):
+        pass
+
+    def post(self, url, **kwargs):
+        FakeSession.logins += 1
+        return FakeResponse(0, 'ok')
+
+    def request(self, method, url, **kwargs):
+        if self.expired:
+            return FakeResponse(1, 'login_required')
+        if url.endswith('/get_queuelen/'):
+            return FakeResponse(0, len(self.pending))
+        with self.lock:
+            if not self.pending:
+                return FakeResponse(1, "Queue 'test' is empty")
+            return FakeResponse(0, json.dumps(self.pending.pop(0)))
+
+
+def make_manager(submissions):
+    FakeSession.submissions = submissions
+    FakeSession.logins = 0
+    with patch('requests.Session', FakeSession):
+        return XQueuePullManager('http://xqueue', 'test', '', '', 'lms', 'password')
+
+
+def test_get_submissions_buffers():
+    """Prefetched submissions (pulled concurrently, so in any order) are handed out before pulling again"""
+    manager = make_manager([{'n': n} for n in range(6)])
+    assert_equal(manager.get_submissions(4), 4)
+    assert_equal(manager.get_length(), 6)
+    assert_equal(sorted(manager.get_submission()['n'] for _ in range(4)), [0, 1, 2, 3])
+    assert_equal(manager.get_submissions(10), 2)
+    assert_equal(len([manager.get_submission(), manager.get_submission()]), 2)
+    assert_raises(QueueEmpty, manager.get_submission)
+
+
+def test_expired_session_logs_in_again():
+    """A 'login_required' reply triggers a single new login and a retry"""
+    manager = make_manager([{'n': 0}])
+    manager.session.expired = True
+    with patch('requests.Session', FakeSession):
+        assert_equal(manager.get_length(), 1)
+    assert_equal(FakeSession.logins, 2)
+
+
+def test_reply_sender_journals_and_replays():
+    """Replies that can't be posted are journaled on close and posted by replay"""
+    tmpdir = tempfile.mkdtemp()
+    journal = os.path.join(tmpdir, 'replies.journal')
+    try:
+        manager = Mock()
+        manager.respond.side_effect = ConnectionError('xqueue is down')
+        sender = XQueueReplySender(manager, journal, retries=1, backoff=0.01)
+        sender.start()
+        sender.send({'xqueue_header': '{}', 'xqueue_body': '{"n": 1}'})
+        sender.send({'xqueue_header': '{}', 'xqueue_body': '{"n": 2}'})
+        sender.close()
+        with open(journal) as f:
+            assert_equal(len(f.readlines()), 2)
+
+        manager = Mock()
+        XQueueReplySender(manager, journal).replay()
+        assert_equal([call[0][0]['xqueue_body'] for call in manager.respond.call_args_list],
+                     ['{"n": 1}', '{"n": 2}'])
+        assert_false(os.path.exists(journal))
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_reply_sender_journals_replies_failing_after_close():
+    """A reply still being posted when close() gives up is journaled once its post fails"""
+    tmpdir = tempfile.mkdtemp()
+    journal = os.path.join(tmpdir, 'replies.journal')
+    try:
+        posting = threading.Event()
+        release = threading.Event()
+
+        def respond(xqueue_reply):
+            posting.set()
+            release.wait()
+            raise ConnectionError('xqueue is down')
+
+        sender = XQueueReplySender(Mock(respond=respond), journal, retries=1, backoff=0.01)
+        sender.start()
+        sender.send({'xqueue_header': '{}', 'xqueue_body': '{"n": 1}'})
+        posting.wait()
+        sender.close(timeout=0.01)
+        assert_false(os.path.exists(journal))
+        release.set()
+        sender.thread.join()
+        with open(journal) as f:
+            assert_equal([json.loads(line)['xqueue_body'] for line in f], ['{"n": 1}'])
+    finally:
+        shutil.rmtree(tmpdir)
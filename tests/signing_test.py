@@ -0,0 +1,42 @@
+import collections
+
+from mock import patch
+from nose.tools import assert_equal, assert_raises
+
+from openedx_certificates import signing
+
+
+Signature = collections.namedtuple('Signature', 'data')
+
+
+class FakeGPG(object):
+    """Stands in for gnupg.GPG, counting how many handles are made"""
+    created = 0
+
+    def __init__(self, **kwargs):
+        FakeGPG.created += 1
+        self.options = kwargs
+
+    def list_keys(self, secret=False):
+        return [{'keyid': 'F00DFEF8D954', 'fingerprint': 'ABCDF00DFEF8D954'}]
+
+    def sign(self, data, **kwargs):
+        return Signature('sig:' + data.read())
+
+
+@patch('gnupg.GPG', FakeGPG)
+def test_sign_many_reuses_handle():
+    FakeGPG.created = 0
+    signer = signing.make_signer('gnupg', homedir='/tmp', key_id='FEF8D954', use_agent=True, workers=3)
+    try:
+        documents = ['doc{0}'.format(i) for i in range(10)]
+        assert_equal(signer.sign_many(documents), ['sig:' + doc for doc in documents])
+        assert_equal(signer.sign('one'), 'sig:one')
+        assert_equal(FakeGPG.created, 1)
+        assert_equal(signer.gpg.options['use_agent'], True)
+    finally:
+        signer.close()
+
+
+def test_unknown_backend():
+    assert_raises(ValueError, signing.make_signer, 'carrier-pigeon')
@@ -0,0 +1,170 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from mock import Mock, patch
+from nose.tools import assert_equal, assert_false, assert_raises
+
+from openedx_certificates import storage
+
+
+FILES = [
+    ('downloads/a/Certificate.pdf', '%PDF'),
+    ('cert/b/valid.html', '<html>'),
+    ('cert/b/Certificate.pdf.sig', 'sig'),
+]
+
+
+def test_memory_put_many():
+    memory = storage.make_storage('memory', concurrency=2)
+    memory.put_many(FILES)
+    assert_equal(memory.files, dict(FILES))
+    stats = memory.stats()
+    assert_equal((stats['puts'], stats['bytes']), (3, 13))
+
+
+def test_local_put_many():
+    root = tempfile.mkdtemp()
+    try:
+        storage.make_storage('local', root=root, concurrency=3).put_many(FILES)
+        for path, data in FILES:
+            with open(os.path.join(root, path)) as f:
+                assert_equal(f.read(), data)
+    finally:
+        shutil.rmtree(root)
+
+
+def test_queued_deletes_coalesce():
+    """Queued deletes are made together, unless the file is put again first"""
+    memory = storage.make_storage('memory', delete_batch_size=4, delete_delay=60)
+    memory.put_many(FILES)
+    memory.queue_delete([FILES[0][0]])
+    memory.queue_delete([FILES[1][0], 'cert/b/verify.html'])
+    assert_equal(len(memory.files), 3)
+    memory.put(*FILES[1])
+    memory.flush_deletes()
+    assert_equal(sorted(memory.files), sorted([FILES[1][0], FILES[2][0]]))
+    # A full batch is deleted at once
+    memory.queue_delete(['a', 'b', 'c', FILES[2][0]])
+    assert_equal(sorted(memory.files), [FILES[1][0]])
+    assert_equal(memory.stats()['deletes'], 6)
+
+
+def test_put_waits_for_delete():
+    """A put of a path being deleted is made after the delete, not undone by it"""
+    memory = storage.make_storage('memory', delete_delay=60)
+    memory.put(*FILES[0])
+    memory.queue_delete([FILES[0][0]])
+    started = threading.Event()
+    release = threading.Event()
+    delete_many = memory._delete_many
+
+    def slow_delete_many(paths):
+        started.set()
+        release.wait()
+        delete_many(paths)
+
+    memory._delete_many = slow_delete_many
+    flush = threading.Thread(target=memory.flush_deletes)
+    flush.start()
+    started.wait()
+    put = threading.Thread(target=memory.put, args=FILES[0])
+    put.start()
+    put.join(0.1)
+    assert put.is_alive()
+    release.set()
+    flush.join()
+    put.join()
+    assert_equal(memory.files, {FILES[0][0]: FILES[0][1]})
+
+
+@patch('openedx_certificates.storage.log')
+def test_timed_delete_errors_are_logged(log):
+    memory = storage.make_storage('memory', delete_delay=60)
+    memory._delete_many = Mock(side_effect=IOError('disk on fire'))
+    memory.queue_delete([FILES[0][0]])
+    # What the delete timer calls
+    memory._flush_deletes_later()
+    assert_equal(log.exception.call_count, 1)
+    assert_equal(memory.deleting, set())
+
+
+def test_local_delete_many():
+    root = tempfile.mkdtemp()
+    try:
+        local = storage.make_storage('local', root=root)
+        local.put_many(FILES)
+        local.delete_many([FILES[0][0], FILES[1][0], 'downloads/missing/Certificate.pdf'])
+        # Emptied directories go too, up to the root
+        assert_equal(os.listdir(root), ['cert'])
+        assert_equal(os.listdir(os.path.join(root, 'cert/b')), ['Certificate.pdf.sig'])
+    finally:
+        shutil.rmtree(root)
+
+
+def test_unknown_backend():
+    assert_raises(ValueError, storage.make_storage, 'floppy')
+
+
+class FakeS3Connection(object):
+    connections = 0
+
+    def __init__(self, *args):
+        FakeS3Connection.connections += 1
+
+    def get_bucket(self, name, validate=True):
+        assert_false(validate)
+        return name
+
+
+class FlakyKey(object):
+    """Fails the first upload with a connection error"""
+    uploads = []
+
+    def __init__(self, bucket, name):
+        self.name = name
+
+    def set_contents_from_string(self, data, headers=None, md5=None, policy=None):
+        assert_equal(headers['Content-Type'], storage.content_type(self.name))
+        assert_equal(md5, storage.file_digests(data)[1])
+        FlakyKey.uploads.append(self.name)
+        if len(FlakyKey.uploads) == 1:
+            raise socket.error('connection reset')
+
+
+@patch('boto.connect_s3', FakeS3Connection)
+@patch('openedx_certificates.storage.Key', FlakyKey)
+def test_s3_connection_reused():
+    """The S3 connection is kept between puts and made again after an error"""
+    s3 = storage.make_storage('s3', bucket='certs', concurrency=1)
+    s3.put_many(FILES)
+    assert_equal(FlakyKey.uploads, [FILES[0][0]] + [path for path, data in FILES])
+    assert_equal(FakeS3Connection.connections, 2)
+    assert_equal(storage.content_type('x/Certificate.pdf.sig'), 'application/pgp-signature')
+
+
+class FakeBucket(object):
+    """Records multi-object deletes"""
+    deletes = []
+
+    def __init__(self, *args):
+        pass
+
+    def get_bucket(self, name, validate=True):
+        return self
+
+    def delete_keys(self, keys, quiet=False):
+        assert_equal(quiet, True)
+        FakeBucket.deletes.append(keys)
+        return Mock(errors=[])
+
+
+@patch('boto.connect_s3', FakeBucket)
+@patch('openedx_certificates.storage.S3Storage.MAX_DELETE_KEYS', 2)
+def test_s3_delete_many():
+    """S3 deletes are made as few multi-object deletes as possible"""
+    s3 = storage.make_storage('s3', bucket='certs')
+    s3.delete_many([path for path, data in FILES])
+    assert_equal(FakeBucket.deletes, [[FILES[0][0], FILES[1][0]], [FILES[2][0]]])
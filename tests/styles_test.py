@@ -0,0 +1,31 @@
+import copy
+
+from nose.tools import assert_equal, assert_false, assert_raises, assert_true
+
+from openedx_certificates import styles
+from openedx_certificates.styles import derive, paragraph_style
+
+
+def test_styles_are_interned_and_frozen():
+    style = paragraph_style('test-sans', fontName='Helvetica', fontSize=12)
+    assert_true(paragraph_style('test-sans', fontSize=12, fontName='Helvetica') is style)
+    with assert_raises(AttributeError):
+        style.fontSize = 14
+
+    bigger = derive(style, fontSize=14, leading=16)
+    assert_false(bigger is style)
+    assert_equal((bigger.name, bigger.fontName, bigger.fontSize, bigger.leading), ('test-sans', 'Helvetica', 14, 16))
+    assert_equal(style.fontSize, 12)
+    assert_true(derive(style, fontSize=14, leading=16) is bigger)
+
+    changeable = copy.deepcopy(bigger)
+    changeable.firstLineIndent = 10
+    assert_equal(bigger.firstLineIndent, 0)
+
+
+def test_interned_styles_are_bounded():
+    style = paragraph_style('test-bounded', fontSize=10)
+    for size in range(styles.MAX_STYLES + 10):
+        derive(style, fontSize=size)
+    assert_true(len(styles._styles) <= styles.MAX_STYLES)
+    assert_equal(derive(style, fontSize=3).fontSize, 3)